@@ -461,6 +461,19 @@ app.get('/api/ml/health', async function(req, res) {
     }
 });
 
+// ML Service準備完了チェック（モデルのウォームアップ完了まで503）
+app.get('/api/ml/ready', async function(req, res) {
+    try {
+        const readiness = await mlClient.readinessCheck();
+        res.status(readiness.status === 'ready' ? 200 : 503).json(readiness);
+    } catch (error) {
+        res.status(503).json({
+            status: 'ML Service unavailable',
+            error: error.message
+        });
+    }
+});
+
 // 学習開始
 app.post('/api/ml/train', async function(req, res) {
     try {
@@ -471,13 +484,53 @@ app.post('/api/ml/train', async function(req, res) {
     }
 });
 
-// 予測実行
-app.post('/api/ml/predict', async function(req, res) {
+// 予測実行（JSON または Arrow IPC 本体）
+const ARROW_MIME_TYPES = ['application/vnd.apache.arrow.stream', 'application/vnd.apache.arrow.file'];
+
+app.post('/api/ml/predict', express.raw({ type: ARROW_MIME_TYPES, limit: '1gb', inflate: false }), async function(req, res) {
     try {
-        const result = await mlClient.predictModel(req.body);
+        let result;
+        if (Buffer.isBuffer(req.body)) {
+            // Arrow本体はデコードせずにそのまま転送する
+            result = await mlClient.predictModelArrow(req.body, req.query, {
+                'Content-Type': req.get('Content-Type'),
+                'Content-Encoding': req.get('Content-Encoding')
+            });
+        } else {
+            result = await mlClient.predictModel(req.body);
+        }
         res.json(result);
     } catch (error) {
-        res.status(500).json({ error: error.message });
+        res.status(error.status || 500).json({ error: error.message });
+    }
+});
+
+// 予測結果取得（ML Serviceのストリームをそのまま中継）
+app.get('/api/ml/predict/:runId/result', async function(req, res) {
+    try {
+        const upstream = await mlClient.streamPredictionResult(req.params.runId, req.get('Accept'));
+        res.status(upstream.status);
+        res.set('Content-Type', upstream.headers['content-type']);
+        upstream.data.on('error', function() {
+            res.destroy();
+        });
+        res.on('close', function() {
+            // クライアント切断時は上流のストリームも止める
+            if (!res.writableEnded) upstream.data.destroy();
+        });
+        upstream.data.pipe(res);
+    } catch (error) {
+        res.status(error.status || 500).json({ error: error.message });
+    }
+});
+
+// 同期予測（少量データ）
+app.post('/api/ml/predict/sync', async function(req, res) {
+    try {
+        const result = await mlClient.predictSync(req.body);
+        res.json(result);
+    } catch (error) {
+        res.status(error.status || 500).json({ error: error.message });
     }
 });
 
@@ -487,7 +540,7 @@ app.post('/api/ml/optimize', async function(req, res) {
         const result = await mlClient.optimizeModel(req.body);
         res.json(result);
     } catch (error) {
-        res.status(500).json({ error: error.message });
+        res.status(error.status || 500).json({ error: error.message });
     }
 });
 
@@ -501,6 +554,16 @@ app.get('/api/ml/status/:runId', async function(req, res) {
     }
 });
 
+// データセット統計プロファイル取得
+app.get('/api/ml/datasets/:name/profile', async function(req, res) {
+    try {
+        const profile = await mlClient.getDatasetProfile(req.params.name);
+        res.json(profile);
+    } catch (error) {
+        res.status(error.status || 500).json({ error: error.message });
+    }
+});
+
 // ========================================
 // Dataset File API
 // ========================================
@@ -603,6 +666,14 @@ app.delete('/api/datasets/:name', function(req, res) {
 
         if (fs.existsSync(filePath)) {
             fs.unlinkSync(filePath);
+
+            // ML Serviceが作成した列指向サイドカー・統計プロファイルも削除
+            [safeName + '.arrow', safeName + '.profile.json'].forEach(function(sidecar) {
+                const sidecarPath = path.join(DATASET_DIR, sidecar);
+                if (fs.existsSync(sidecarPath)) {
+                    fs.unlinkSync(sidecarPath);
+                }
+            });
             res.json({ success: true });
         } else {
             res.status(404).json({ error: 'Dataset not found' });
@@ -672,6 +743,9 @@ io.on('connection', function(socket) {
         onPredictionComplete: function(data) {
             socket.emit('prediction_complete', data);
         },
+        onPredictionShapComplete: function(data) {
+            socket.emit('prediction_shap_complete', data);
+        },
         onPredictionError: function(data) {
             socket.emit('prediction_error', data);
         },
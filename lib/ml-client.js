@@ -73,6 +73,11 @@ class MLClient {
             if (handlers.onPredictionComplete) handlers.onPredictionComplete(data);
         });
 
+        this.socket.on('prediction_shap_complete', (data) => {
+            console.log('[ML Client] Prediction SHAP complete:', data.run_id);
+            if (handlers.onPredictionShapComplete) handlers.onPredictionShapComplete(data);
+        });
+
         this.socket.on('prediction_error', (data) => {
             console.error('[ML Client] Prediction error:', data.error);
             if (handlers.onPredictionError) handlers.onPredictionError(data);
@@ -122,6 +127,21 @@ class MLClient {
         }
     }
 
+    /**
+     * 準備完了チェック（ウォームアップ中は status: 'warming' を返す）
+     */
+    async readinessCheck() {
+        try {
+            const response = await axios.get(`${ML_SERVICE_URL}/ready`, {
+                timeout: 5000,
+                validateStatus: (status) => status === 200 || status === 503
+            });
+            return response.data;
+        } catch (error) {
+            throw new Error(`ML Service readiness check failed: ${error.message}`);
+        }
+    }
+
     /**
      * 学習開始
      */
@@ -146,7 +166,76 @@ class MLClient {
             });
             return response.data;
         } catch (error) {
-            throw new Error(`Prediction request failed: ${error.message}`);
+            // dataset_idの指定誤り（400）・データセットなし（404）などはML Serviceのステータスを返す
+            const message = error.response && error.response.data && error.response.data.error
+                ? error.response.data.error
+                : error.message;
+            const wrapped = new Error(`Prediction request failed: ${message}`);
+            wrapped.status = error.response ? error.response.status : 500;
+            throw wrapped;
+        }
+    }
+
+    /**
+     * 同期予測（少量データの結果を直接返す）
+     */
+    async predictSync(params) {
+        try {
+            const response = await axios.post(`${ML_SERVICE_URL}/api/ml/predict/sync`, params, {
+                timeout: 10000
+            });
+            return response.data;
+        } catch (error) {
+            const message = error.response && error.response.data && error.response.data.error
+                ? error.response.data.error
+                : error.message;
+            const wrapped = new Error(`Synchronous prediction failed: ${message}`);
+            wrapped.status = error.response ? error.response.status : 500;
+            throw wrapped;
+        }
+    }
+
+    /**
+     * 予測実行（Arrow IPC本体をそのまま転送）
+     */
+    async predictModelArrow(body, query, headers) {
+        try {
+            const forwardHeaders = {};
+            Object.keys(headers || {}).forEach(function(name) {
+                if (headers[name]) forwardHeaders[name] = headers[name];
+            });
+            const response = await axios.post(`${ML_SERVICE_URL}/api/ml/predict`, body, {
+                params: query,
+                headers: forwardHeaders,
+                maxBodyLength: Infinity,
+                timeout: 60000
+            });
+            return response.data;
+        } catch (error) {
+            const message = error.response && error.response.data && error.response.data.error
+                ? error.response.data.error
+                : error.message;
+            const wrapped = new Error(`Prediction request failed: ${message}`);
+            wrapped.status = error.response ? error.response.status : 500;
+            throw wrapped;
+        }
+    }
+
+    /**
+     * 予測結果をストリームで取得（Acceptヘッダーで NDJSON / Arrow IPC を選択）
+     * レスポンス本体は読み込み可能なストリームとして返す
+     */
+    async streamPredictionResult(runId, accept) {
+        try {
+            return await axios.get(`${ML_SERVICE_URL}/api/ml/predict/${encodeURIComponent(runId)}/result`, {
+                headers: { Accept: accept || 'application/x-ndjson' },
+                responseType: 'stream',
+                timeout: 0
+            });
+        } catch (error) {
+            const wrapped = new Error(`Prediction result request failed: ${error.message}`);
+            wrapped.status = error.response ? error.response.status : 500;
+            throw wrapped;
         }
     }
 
@@ -160,7 +249,13 @@ class MLClient {
             });
             return response.data;
         } catch (error) {
-            throw new Error(`Optimization request failed: ${error.message}`);
+            // 設定とモデルの不一致（400）はメッセージとステータスをそのまま返す
+            const message = error.response && error.response.data && error.response.data.error
+                ? error.response.data.error
+                : error.message;
+            const wrapped = new Error(`Optimization request failed: ${message}`);
+            wrapped.status = error.response ? error.response.status : 500;
+            throw wrapped;
         }
     }
 
@@ -178,6 +273,25 @@ class MLClient {
         }
     }
 
+    /**
+     * データセット統計プロファイル取得
+     */
+    async getDatasetProfile(datasetId) {
+        try {
+            const response = await axios.get(`${ML_SERVICE_URL}/api/ml/datasets/${encodeURIComponent(datasetId)}/profile`, {
+                timeout: 60000
+            });
+            return response.data;
+        } catch (error) {
+            const message = error.response && error.response.data && error.response.data.error
+                ? error.response.data.error
+                : error.message;
+            const wrapped = new Error(`Dataset profile request failed: ${message}`);
+            wrapped.status = error.response ? error.response.status : 500;
+            throw wrapped;
+        }
+    }
+
     /**
      * イベントハンドラを登録
      */
@@ -2,19 +2,37 @@
 ML Service Flask API
 WebSocket対応のML学習・予測・最適化API
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
+import json
 import os
 import threading
 import uuid
 from datetime import datetime
 import mlflow
+import pandas as pd
 import traceback
 
-from core import train_model, predict_model, optimize_model, get_training_status
+from core import train_model, predict_model, predict_sync, optimize_model, get_training_status
+from core.optimize import compile_objective, resolve_batch_size, resolve_sweep_options
+from core.predict import get_sync_latency_stats, get_batching_stats, get_prediction_result_path
+from core.streaming import (
+    negotiate_format, iter_ndjson, iter_arrow_stream, is_arrow_mimetype, read_arrow_frame,
+    NDJSON_MIMETYPE, ARROW_STREAM_MIMETYPE
+)
+from core.cache import get_cache_stats
+from core.registry import invalidate_models
+from core.warmup import start_warmup, get_readiness, is_ready
+from core.utils import load_dataset_profile, iter_dataframe_chunks, resolve_dataset_path
 from config import *
 
+# pandas 2系ではCopy-on-Writeを有効にする（pandas 3系では常に有効）
+# load_dataframeはキャッシュ本体を共有する浅いコピーを返すため、リクエスト処理中の書き込みが
+# キャッシュ本体に波及しないようにする
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
 app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
@@ -27,6 +45,16 @@ if not is_databricks_environment():
     mlflow.set_tracking_uri("file:///tmp/mlruns")
 
 
+@app.before_request
+def ensure_warmup_started():
+    """
+    モデルの事前ロードを開始（開始済みの場合は何もしない）
+
+    WSGIサーバー経由やimportして起動した場合は__main__を通らないため、最初のリクエストで開始する。
+    """
+    start_warmup()
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """ヘルスチェック"""
@@ -34,10 +62,21 @@ def health_check():
         "status": "healthy",
         "service": "ML Service",
         "environment": ENVIRONMENT,
-        "mlflow_tracking_uri": mlflow.get_tracking_uri()
+        "mlflow_tracking_uri": mlflow.get_tracking_uri(),
+        "ready": is_ready(),
+        "caches": get_cache_stats(),
+        "predict_sync": get_sync_latency_stats(),
+        "micro_batching": get_batching_stats()
     })
 
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """準備完了チェック（起動時のモデルウォームアップ完了まで503）"""
+    readiness = get_readiness()
+    return jsonify(readiness), 200 if readiness['status'] == 'ready' else 503
+
+
 @app.route('/api/ml/train', methods=['POST'])
 def train():
     """学習・検証API"""
@@ -92,8 +131,7 @@ def train():
 
         # 非同期実行開始
         thread = threading.Thread(target=train_async, daemon=True)
-        thread.start()
-
+        # 処理中に状態を書き込むため、スレッド開始前に登録する
         active_tasks[run_id] = {
             'type': 'training',
             'status': 'running',
@@ -101,6 +139,7 @@ def train():
             'thread': thread,
             'params': data
         }
+        thread.start()
 
         return jsonify({
             "run_id": run_id,
@@ -133,9 +172,32 @@ def get_status(run_id):
 
 @app.route('/api/ml/predict', methods=['POST'])
 def predict():
-    """予測API"""
+    """
+    予測API
+
+    入力データはinput_data（行データ）またはdataset_id（保存済みデータセット）で指定する。
+    Content-TypeがArrow IPC（application/vnd.apache.arrow.stream / .file）の場合は
+    本体を入力データとして読み込み、mlflow_id・x_list（カンマ区切り、省略時は全カラム）・
+    shap（JSON）はクエリパラメータで受け取る。
+    """
     try:
-        data = request.json
+        if is_arrow_mimetype(request.mimetype):
+            try:
+                data = _parse_arrow_predict_request()
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        else:
+            data = request.json
+
+        # dataset_id指定時は保存済みデータセットをサービス側で読み込む（行データを転送しない）
+        if 'input_data' not in data and 'dataset_id' in data:
+            try:
+                dataset_path = resolve_dataset_path(data['dataset_id'])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if not os.path.exists(dataset_path):
+                return jsonify({"error": f"Dataset not found: {data['dataset_id']}"}), 404
+            data['input_data'] = dataset_path
 
         required_params = ['mlflow_id', 'x_list', 'input_data']
         for param in required_params:
@@ -146,6 +208,17 @@ def predict():
         run_id = str(uuid.uuid4())
 
         # バックグラウンドで予測開始
+        def predictions_ready(result):
+            # SHAP計算を待たずに予測結果を通知
+            socketio.emit('prediction_complete', {
+                'run_id': run_id,
+                'status': 'completed',
+                'result': result
+            })
+
+            active_tasks[run_id]['status'] = 'completed'
+            active_tasks[run_id]['result'] = result
+
         def predict_async():
             try:
                 print(f"[INFO] Prediction started: {run_id}")
@@ -154,17 +227,17 @@ def predict():
                     x_list=data['x_list'],
                     input_data=data['input_data'],
                     run_id=run_id,
-                    socketio=socketio
+                    socketio=socketio,
+                    shap_options=data.get('shap'),
+                    on_predictions=predictions_ready,
+                    stream=bool(data.get('stream', False))
                 )
 
-                socketio.emit('prediction_complete', {
-                    'run_id': run_id,
-                    'status': 'completed',
-                    'result': result
-                })
-
-                active_tasks[run_id]['status'] = 'completed'
-                active_tasks[run_id]['result'] = result
+                if 'shap' in result:
+                    socketio.emit('prediction_shap_complete', {
+                        'run_id': run_id,
+                        'shap': result['shap']
+                    })
 
             except Exception as e:
                 print(f"[ERROR] Prediction failed: {run_id}")
@@ -180,14 +253,14 @@ def predict():
                 active_tasks[run_id]['error'] = str(e)
 
         thread = threading.Thread(target=predict_async, daemon=True)
-        thread.start()
-
+        # 処理中に状態を書き込むため、スレッド開始前に登録する
         active_tasks[run_id] = {
             'type': 'prediction',
             'status': 'running',
             'started_at': datetime.now().isoformat(),
             'thread': thread
         }
+        thread.start()
 
         return jsonify({
             "run_id": run_id,
@@ -199,6 +272,71 @@ def predict():
         return jsonify({"error": str(e)}), 500
 
 
+def _parse_arrow_predict_request():
+    """Arrow IPC本体の予測リクエストをJSONリクエストと同じ形式のdictに変換"""
+    input_df = read_arrow_frame(request.get_data(cache=False), request.headers.get('Content-Encoding'))
+    data = {'input_data': input_df}
+    if 'mlflow_id' in request.args:
+        data['mlflow_id'] = request.args['mlflow_id']
+    x_list = request.args.get('x_list')
+    data['x_list'] = [col for col in x_list.split(',') if col] if x_list else list(input_df.columns)
+    if 'shap' in request.args:
+        data['shap'] = json.loads(request.args['shap'])
+    return data
+
+
+@app.route('/api/ml/predict/<run_id>/result', methods=['GET'])
+def prediction_result(run_id):
+    """
+    予測結果取得API
+
+    Acceptヘッダーで形式を選択する（既定はNDJSON）。
+    NDJSON・Arrow IPCストリームは結果CSVをチャンク単位で読み込みながら返す。
+    """
+    try:
+        result_csv = get_prediction_result_path(run_id)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    fmt = negotiate_format(request.headers.get('Accept'))
+    if fmt == 'json':
+        # 結果CSVは一度しか読まないため、データセット用のキャッシュを介さずに読み込む
+        df = pd.read_csv(result_csv, encoding='utf-8-sig')
+        return jsonify({"run_id": run_id, "predictions": df.to_dict(orient='records')})
+
+    chunks = iter_dataframe_chunks(result_csv)
+    if fmt == 'arrow':
+        return Response(stream_with_context(iter_arrow_stream(chunks)), mimetype=ARROW_STREAM_MIMETYPE)
+    return Response(stream_with_context(iter_ndjson(chunks)), mimetype=NDJSON_MIMETYPE)
+
+
+@app.route('/api/ml/predict/sync', methods=['POST'])
+def predict_sync_api():
+    """同期予測API（少量データの結果をHTTPレスポンスで返す）"""
+    try:
+        data = request.json
+
+        required_params = ['mlflow_id', 'x_list', 'input_data']
+        for param in required_params:
+            if param not in data:
+                return jsonify({"error": f"Missing required parameter: {param}"}), 400
+
+        result = predict_sync(
+            mlflow_id=data['mlflow_id'],
+            x_list=data['x_list'],
+            input_data=data['input_data']
+        )
+        return jsonify(result)
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/ml/optimize', methods=['POST'])
 def optimize():
     """最適化API"""
@@ -210,6 +348,14 @@ def optimize():
             if param not in data:
                 return jsonify({"error": f"Missing required parameter: {param}"}), 400
 
+        # 設定とモデルの説明変数・目的変数の不一致は開始前に返す
+        try:
+            compile_objective(data['mlflow_id'], data['param_configs'], data['target_param_configs'])
+            resolve_batch_size(data.get('batch_size'))
+            resolve_sweep_options(data.get('sweep'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         # Run ID生成
         run_id = str(uuid.uuid4())
 
@@ -223,7 +369,9 @@ def optimize():
                     target_param_configs=data['target_param_configs'],
                     n_trials=data.get('n_trials', 100),
                     run_id=run_id,
-                    socketio=socketio
+                    socketio=socketio,
+                    batch_size=data.get('batch_size'),
+                    sweep=data.get('sweep')
                 )
 
                 socketio.emit('optimization_complete', {
@@ -249,14 +397,14 @@ def optimize():
                 active_tasks[run_id]['error'] = str(e)
 
         thread = threading.Thread(target=optimize_async, daemon=True)
-        thread.start()
-
+        # 処理中に状態を書き込むため、スレッド開始前に登録する
         active_tasks[run_id] = {
             'type': 'optimization',
             'status': 'running',
             'started_at': datetime.now().isoformat(),
             'thread': thread
         }
+        thread.start()
 
         return jsonify({
             "run_id": run_id,
@@ -268,6 +416,27 @@ def optimize():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/ml/datasets/<dataset_id>/profile', methods=['GET'])
+def dataset_profile(dataset_id):
+    """データセット統計プロファイル取得API"""
+    try:
+        return jsonify(load_dataset_profile(dataset_id))
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/ml/models/<mlflow_id>/cache', methods=['DELETE'])
+def invalidate_model_cache(mlflow_id):
+    """ロード済みモデルのキャッシュ破棄API（mlflow_idに'all'指定で全件）"""
+    removed = invalidate_models(None if mlflow_id == 'all' else mlflow_id)
+    return jsonify({"mlflow_id": mlflow_id, "invalidated": removed})
+
+
 # WebSocketイベントハンドラ
 @socketio.on('connect')
 def handle_connect():
@@ -298,5 +467,11 @@ if __name__ == '__main__':
     print(f"MLflow Tracking URI: {mlflow.get_tracking_uri()}")
     print("=" * 60)
 
+    # モデルの事前ロード（完了するまで /ready は503を返す）
+    # 最初のリクエストを待たずに開始する。デバッグ時はリローダーの監視プロセスでロードしないよう、
+    # リクエストを処理する子プロセスでのみ実行する
+    if not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_warmup()
+
     # サーバー起動
     socketio.run(app, host='0.0.0.0', port=5000, debug=DEBUG, allow_unsafe_werkzeug=True)
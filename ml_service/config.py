@@ -80,6 +80,84 @@ def get_databricks_connection_params():
         'access_token': get_databricks_token()
     }
 
+# データセット読み込み設定
+# 文字コード判定に使用する先頭バイト数（ファイル全体ではなく先頭のみを判定対象にする）
+ENCODING_SAMPLE_BYTES = int(os.getenv("ML_ENCODING_SAMPLE_BYTES", str(1024 * 1024)))
+# CSV読み込みエンジン（auto: pyarrowがあればpyarrow / pyarrow / pandas）
+CSV_ENGINE = os.getenv("ML_CSV_ENGINE", "auto").lower()
+# pyarrow CSVリーダーのブロックサイズ（ブロック単位でマルチスレッドパースする）
+CSV_BLOCK_SIZE = int(os.getenv("ML_CSV_BLOCK_SIZE", str(16 * 1024 * 1024)))
+# データセットCSVの列指向サイドカー（Arrow IPC）を作成・利用するか
+DATASET_SIDECAR_ENABLED = os.getenv("ML_DATASET_SIDECAR", "true").lower() == "true"
+# データセット統計プロファイルのヒストグラムのビン数・カテゴリ上位件数
+PROFILE_HISTOGRAM_BINS = int(os.getenv("ML_PROFILE_HISTOGRAM_BINS", "20"))
+PROFILE_TOP_VALUES = int(os.getenv("ML_PROFILE_TOP_VALUES", "10"))
+
+# ストリーミング予測設定
+# ファイル入力をチャンク単位で予測する際の1チャンクの行数と、結果に含めるプレビュー行数
+PREDICT_CHUNK_ROWS = int(os.getenv("ML_PREDICT_CHUNK_ROWS", "50000"))
+PREDICT_PREVIEW_ROWS = int(os.getenv("ML_PREDICT_PREVIEW_ROWS", "20"))
+
+# 並列予測設定
+# 大量行の予測を分割するワーカープロセス数（1以下で無効）と、並列化する最小行数
+# 初回はワーカーの起動とモデルのロードに数秒〜十数秒かかる。ワーカー内の予測は1スレッドで実行するため、
+# LightGBM/XGBoostのマルチスレッド予測より速くなるのはCPUコアが多く、行数が十分多い場合に限る
+PARALLEL_PREDICT_WORKERS = int(os.getenv("ML_PARALLEL_PREDICT_WORKERS", "1"))
+PARALLEL_PREDICT_MIN_ROWS = int(os.getenv("ML_PARALLEL_PREDICT_MIN_ROWS", "50000"))
+
+# 同期予測設定
+# /api/ml/predict/sync で受け付ける最大行数と、処理時間統計に使う直近の呼び出し数
+SYNC_PREDICT_MAX_ROWS = int(os.getenv("ML_SYNC_PREDICT_MAX_ROWS", "1000"))
+SYNC_PREDICT_LATENCY_WINDOW = int(os.getenv("ML_SYNC_PREDICT_LATENCY_WINDOW", "1000"))
+
+# 予測リクエストのバッチ化設定
+# 同一モデルへの同時リクエストをまとめる最大行数と最大待ち時間（ミリ秒、0で無効）
+MICRO_BATCH_MAX_ROWS = int(os.getenv("ML_MICRO_BATCH_MAX_ROWS", "256"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("ML_MICRO_BATCH_MAX_WAIT_MS", "2"))
+# /api/ml/predict/sync もバッチ化するか（最大待ち時間分レイテンシが増えるため既定は無効）
+SYNC_PREDICT_MICRO_BATCH = os.getenv("ML_SYNC_PREDICT_MICRO_BATCH", "false").lower() == "true"
+
+# 予測時のSHAP設定（リクエストで指定された場合のみ計算）
+# 対象行を指定しない場合のサンプリング行数と、Explainerの背景データの行数
+SHAP_DEFAULT_SAMPLE_SIZE = int(os.getenv("ML_SHAP_DEFAULT_SAMPLE_SIZE", "100"))
+SHAP_BACKGROUND_SIZE = int(os.getenv("ML_SHAP_BACKGROUND_SIZE", "100"))
+
+# 決定木アンサンブルの配列化設定
+# ロード時に対応モデル（GBR/RF/LightGBM/XGBoost/CatBoost）をNumPyの配列表現に変換して予測するか
+# 予測値は元のモデルと相対1e-5以内で一致するが、末尾の桁まで一致させる必要がある場合は無効のままにする
+COMPILE_TREE_MODELS = os.getenv("ML_COMPILE_TREE_MODELS", "false").lower() == "true"
+# 変換後に元のモデルと予測値を照合する行数
+COMPILE_VERIFY_ROWS = int(os.getenv("ML_COMPILE_VERIFY_ROWS", "512"))
+# 配列表現で予測する最大行数（超える場合は元のライブラリで予測する）
+COMPILE_MAX_ROWS = int(os.getenv("ML_COMPILE_MAX_ROWS", "128"))
+
+# 最適化設定
+# 1回の予測でまとめて評価する候補数（Optunaのask/tell、1で1試行ずつ評価）
+OPTIMIZE_BATCH_SIZE = int(os.getenv("ML_OPTIMIZE_BATCH_SIZE", "1"))
+# 網羅評価（sweep指定時）の既定の候補数・上限、1回の予測の行数と、TPEに渡す良い候補の件数
+OPTIMIZE_SWEEP_SAMPLES = int(os.getenv("ML_OPTIMIZE_SWEEP_SAMPLES", "16384"))
+OPTIMIZE_SWEEP_MAX_SAMPLES = int(os.getenv("ML_OPTIMIZE_SWEEP_MAX_SAMPLES", "1048576"))
+OPTIMIZE_SWEEP_BATCH_ROWS = int(os.getenv("ML_OPTIMIZE_SWEEP_BATCH_ROWS", "8192"))
+OPTIMIZE_SWEEP_SEED_TRIALS = int(os.getenv("ML_OPTIMIZE_SWEEP_SEED_TRIALS", "20"))
+
+# 起動時のモデルウォームアップ設定
+# 事前ロードするmlflow_id（カンマ区切り）と、直近に登録されたモデルから事前ロードする件数（0で無効）
+WARMUP_MODEL_IDS = [m.strip() for m in os.getenv("ML_WARMUP_MODEL_IDS", "").split(",") if m.strip()]
+WARMUP_RECENT_MODELS = int(os.getenv("ML_WARMUP_RECENT_MODELS", "3"))
+# 並列予測のワーカープロセスも起動時に立ち上げてモデルをロードしておくか
+WARMUP_WORKER_POOL = os.getenv("ML_WARMUP_WORKER_POOL", "false").lower() == "true"
+
+# キャッシュ設定
+# 読み込み済みDataFrameのプロセス内キャッシュ上限（MB、0で無効）
+DATAFRAME_CACHE_MAX_BYTES = int(os.getenv("ML_DATAFRAME_CACHE_MB", "512")) * 1024 * 1024
+# ロード済みモデルのプロセス内キャッシュ上限（MB、0で無効）と有効期間（秒、0で無期限）
+MODEL_CACHE_MAX_BYTES = int(os.getenv("ML_MODEL_CACHE_MB", "1024")) * 1024 * 1024
+MODEL_CACHE_TTL = int(os.getenv("ML_MODEL_CACHE_TTL", "3600"))
+# 予測結果のプロセス内キャッシュ上限（MB、0で無効）・有効期間（秒、0で無期限）と、キャッシュ対象とする最大行数
+PREDICTION_CACHE_MAX_BYTES = int(os.getenv("ML_PREDICTION_CACHE_MB", "64")) * 1024 * 1024
+PREDICTION_CACHE_TTL = int(os.getenv("ML_PREDICTION_CACHE_TTL", "600"))
+PREDICTION_CACHE_MAX_ROWS = int(os.getenv("ML_PREDICTION_CACHE_MAX_ROWS", "10000"))
+
 # デバッグモード
 DEBUG = os.getenv("ML_DEBUG", "true").lower() == "true"
 
@@ -2,16 +2,18 @@
 ML Core Modules
 """
 from .train import train_model, get_training_status
-from .predict import predict_model
+from .predict import predict_model, predict_sync
 from .optimize import optimize_model
-from .utils import encoding_detection, save_dataframe, load_dataframe
+from .utils import encoding_detection, detect_file_encoding, save_dataframe, load_dataframe
 
 __all__ = [
     'train_model',
     'get_training_status',
     'predict_model',
+    'predict_sync',
     'optimize_model',
     'encoding_detection',
+    'detect_file_encoding',
     'save_dataframe',
     'load_dataframe'
 ]
@@ -0,0 +1,119 @@
+"""
+Micro-batching for prediction requests
+同一モデルへの同時予測リクエストをまとめて1回のpredictで処理する
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class _Batch:
+    """まとめ待ち中のリクエスト群"""
+
+    def __init__(self):
+        self.frames = []
+        self.num_rows = 0
+        self.closed = False
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    同じキー（mlflow_id・説明変数）への同時リクエストを短時間だけ待ち合わせて結合し、
+    1回の予測関数呼び出しで処理した結果を各リクエストに分配する
+
+    最初に到着したリクエストのスレッドが最大max_wait秒待ってからまとめて予測を実行し、
+    後続のリクエストはその完了を待つ（専用のワーカースレッドは持たない）。
+
+    Args:
+        predict_fn: predict_fn(key, df) -> 行数分の予測値配列のリスト（モデルごと）
+        max_batch_rows: 1バッチの最大行数（到達した時点で待たずに実行）
+        max_wait: 最初のリクエストからの最大待ち時間（秒）
+    """
+
+    def __init__(self, predict_fn, max_batch_rows, max_wait):
+        self.predict_fn = predict_fn
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._rows = 0
+
+    def submit(self, key, df):
+        """
+        予測をバッチに追加し、結果を待って返す
+
+        Args:
+            key: バッチのキー（同じキーのリクエストのみ結合する）
+            df: 説明変数のDataFrame
+
+        Returns:
+            list: このリクエスト分の予測値配列（モデルごと）
+        """
+        with self._lock:
+            batch = self._pending.get(key)
+            is_leader = batch is None
+            if is_leader:
+                batch = _Batch()
+                self._pending[key] = batch
+            start = batch.num_rows
+            batch.frames.append(df)
+            batch.num_rows += len(df)
+            end = batch.num_rows
+            if batch.num_rows >= self.max_batch_rows:
+                self._close(key, batch)
+
+        if is_leader:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                self._close(key, batch)
+            self._run(key, batch)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return [predictions[start:end] for predictions in batch.results]
+
+    def stats(self):
+        """バッチ化の統計情報"""
+        with self._lock:
+            return {
+                'batches': self._batches,
+                'requests': self._requests,
+                'rows': self._rows,
+                'avg_requests_per_batch': self._requests / self._batches if self._batches else None,
+                'max_batch_rows': self.max_batch_rows,
+                'max_wait_ms': self.max_wait * 1000
+            }
+
+    def _close(self, key, batch):
+        """新しいリクエストの受け付けを締め切る（ロック取得済みで呼ぶ）"""
+        if batch.closed:
+            return
+        batch.closed = True
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+        batch.full.set()
+
+    def _run(self, key, batch):
+        try:
+            if len(batch.frames) == 1:
+                df = batch.frames[0]
+            else:
+                df = pd.concat(batch.frames, ignore_index=True)
+            batch.results = [np.asarray(p) for p in self.predict_fn(key, df)]
+        except Exception as e:
+            batch.error = e
+        finally:
+            with self._lock:
+                self._batches += 1
+                self._requests += len(batch.frames)
+                self._rows += batch.num_rows
+            batch.done.set()
@@ -0,0 +1,128 @@
+"""
+In-process caches for ML service
+プロセス内で共有するLRUキャッシュ
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    DATAFRAME_CACHE_MAX_BYTES, MODEL_CACHE_MAX_BYTES, MODEL_CACHE_TTL,
+    PREDICTION_CACHE_MAX_BYTES, PREDICTION_CACHE_TTL
+)
+
+
+class LRUCache:
+    """
+    バイト数上限付きLRUキャッシュ（スレッドセーフ）
+
+    Args:
+        name: キャッシュ名（統計情報の表示用）
+        max_bytes: 保持するデータの合計バイト数上限（0以下で無効）
+        ttl: 格納からの有効期間（秒、None・0以下で無期限）
+    """
+
+    def __init__(self, name, max_bytes, ttl=None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key):
+        """キャッシュから取得（存在しない場合はNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry[2] is not None and entry[2] <= time.monotonic():
+                # 有効期限切れ
+                self._total_bytes -= self._entries.pop(key)[1]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        """
+        キャッシュに格納し、上限を超えた分を古い順に破棄
+
+        Returns:
+            bool: 格納した場合True（上限より大きい値は格納しない）
+        """
+        if nbytes > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self._entries[key] = (value, nbytes, expires_at)
+            self._total_bytes += nbytes
+
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_bytes, _) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_bytes
+                self._evictions += 1
+        return True
+
+    def invalidate(self, predicate=None):
+        """
+        条件に一致するキーのエントリを破棄（predicate=Noneの場合は全件）
+
+        Returns:
+            int: 破棄した件数
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate is None or predicate(key)]
+            for key in keys:
+                self._total_bytes -= self._entries.pop(key)[1]
+        return len(keys)
+
+    def stats(self):
+        """ヒット率などの統計情報"""
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'hit_rate': self._hits / requests if requests else None
+            }
+
+
+# 読み込み済みデータセットのキャッシュ
+# キー: (実パス, 更新時刻ns, ファイルサイズ, カラム指定, dtype指定)
+dataframe_cache = LRUCache('dataframe', DATAFRAME_CACHE_MAX_BYTES)
+
+# ロード済みモデルのキャッシュ（予測・最適化で共有）
+# キー: (mlflow_id, モデルindex)
+model_cache = LRUCache('model', MODEL_CACHE_MAX_BYTES, ttl=MODEL_CACHE_TTL)
+
+# 予測結果のキャッシュ
+# キー: (mlflow_id, モデル登録日時, 説明変数, 入力データのハッシュ)
+prediction_cache = LRUCache('prediction', PREDICTION_CACHE_MAX_BYTES, ttl=PREDICTION_CACHE_TTL)
+
+
+def get_cache_stats():
+    """全キャッシュの統計情報（/health用）"""
+    return {
+        cache.name: cache.stats()
+        for cache in (dataframe_cache, model_cache, prediction_cache)
+    }
@@ -0,0 +1,543 @@
+"""
+Compiled tree ensemble inference
+学習済みの決定木アンサンブル（GBR / RF / LightGBM / XGBoost / CatBoost）を
+連続したノード配列に変換し、NumPyのベクトル演算で予測する
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import COMPILE_TREE_MODELS, COMPILE_VERIFY_ROWS, COMPILE_MAX_ROWS
+
+# 欠損値の扱い（ノードごと）
+MISSING_NONE = 0   # 欠損なし（NaNは0として比較: LightGBMのmissing_type=None）
+MISSING_ZERO = 1   # 0を欠損扱い（LightGBMのmissing_type=Zero）
+MISSING_NAN = 2    # NaNを欠損扱い
+
+# LightGBMが0とみなす閾値（kZeroThreshold = 1e-35f をdoubleにした値）
+_LGBM_ZERO_THRESHOLD = float(np.float32(1e-35))
+
+# 1回の評価で展開する (木の数 x 行数) の上限（メモリ使用量を抑える）
+_MAX_EVAL_CELLS = 4 * 1024 * 1024
+
+
+class CompiledEnsemble:
+    """
+    配列で表現した決定木アンサンブル
+
+    全ての木のノードを1組の連続配列に連結して保持する。
+    内部ノードは「x[feature] <= threshold なら左、そうでなければ右」の子へ進み、
+    葉ノードは左右の子が自分自身を指す。予測値は
+    bias + scale * (葉の値の合計、average=Trueの場合は平均) で計算する。
+
+    全ての(木, 行)を深さ分だけ同時に1段ずつ進めるため、行数が少ない呼び出し（最適化の試行・同期予測）で
+    ライブラリ側の入力検証・変換のオーバーヘッドを省ける。行数が多い場合はライブラリの実装の方が速いため、
+    max_rowsを超える入力は元のモデル（model）で予測する。
+
+    予測値は元のライブラリと葉の値の加算順が異なるため、末尾の桁が一致するとは限らない
+    （照合時の許容誤差は相対1e-5）。同じ行は行数・位置によらず同じ値になるが、
+    max_rowsの前後で元のモデルに切り替わると同じ行でもこの誤差の範囲で値が変わり得る。
+
+    Attributes:
+        feature: 分岐に使う特徴量のindex（int32）
+        threshold: 分岐の閾値（float32、LightGBMのみfloat64）
+        children: 左右の子ノードのindex（int32、ノードiの左が2i・右が2i+1）
+        default_left: 欠損時に左へ進むか（bool）
+        missing_type: 欠損値の扱い（int8、MISSING_*）
+        value: 葉の値（float64）
+        roots: 各木の根ノードのindex（int32）
+        depth: 木の最大深さ
+        feature_names: 特徴量名（入力DataFrameのカラム並び替えに使用）
+        zero_threshold: 絶対値がこれ以下の入力を0とみなす（LightGBMのみ）
+        model: 変換元のモデル（max_rowsを超える入力で使用）
+    """
+
+    def __init__(self, nodes, roots, depth, feature_names, n_features, bias=0.0, scale=1.0,
+                 average=False, threshold_dtype=np.float32, zero_threshold=None, source=None):
+        self.feature = np.ascontiguousarray(nodes['feature'], dtype=np.int32)
+        self.threshold = np.ascontiguousarray(nodes['threshold'], dtype=threshold_dtype)
+        self.children = np.ascontiguousarray(
+            np.stack([nodes['left'], nodes['right']], axis=1).ravel(), dtype=np.int32
+        )
+        self.default_left = np.ascontiguousarray(nodes['default_left'], dtype=bool)
+        self.missing_type = np.ascontiguousarray(nodes['missing_type'], dtype=np.int8)
+        self.value = np.ascontiguousarray(nodes['value'], dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.depth = int(depth)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.n_features = int(n_features)
+        self.bias = float(bias)
+        self.scale = float(scale)
+        self.average = average
+        self.zero_threshold = zero_threshold
+        self.source = source
+        self.model = None
+        self.max_rows = None
+        self._has_zero_missing = bool((self.missing_type == MISSING_ZERO).any())
+
+    @property
+    def nbytes(self):
+        """ノード配列の合計サイズ（元のモデルは含まない）"""
+        return sum(a.nbytes for a in (
+            self.feature, self.threshold, self.children, self.default_left,
+            self.missing_type, self.value, self.roots
+        ))
+
+    @property
+    def is_leaf(self):
+        return self.children[0::2] == np.arange(len(self.value))
+
+    def predict(self, X):
+        """
+        予測
+
+        Args:
+            X: DataFrame（feature_namesのカラムを含む）または2次元配列
+
+        Returns:
+            numpy.ndarray: 予測値（float64）
+        """
+        if self.model is not None and self.max_rows is not None and len(X) > self.max_rows:
+            return self.model.predict(X)
+
+        X = self._as_matrix(X)
+        n_rows = X.shape[0]
+        if n_rows == 0:
+            return np.zeros(0)
+
+        block = max(1, _MAX_EVAL_CELLS // max(len(self.roots), 1))
+        if n_rows <= block:
+            return self._predict_block(X)
+        return np.concatenate([self._predict_block(X[i:i + block]) for i in range(0, n_rows, block)])
+
+    def _as_matrix(self, X):
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names is not None and list(X.columns) != self.feature_names:
+                X = X[self.feature_names]
+            X = X.to_numpy(dtype=np.float64)
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        # 元ライブラリと同じ精度で比較する（sklearn/XGBoost/CatBoostはfloat32）
+        X = np.ascontiguousarray(X, dtype=self.threshold.dtype)
+        if self.zero_threshold is not None:
+            # LightGBMは入力を疎な行に変換する際、絶対値がkZeroThreshold以下の値を0として扱う
+            X = np.where(np.abs(X) <= self.zero_threshold, 0, X)
+        return X
+
+    def _predict_block(self, X):
+        n_rows = X.shape[0]
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * self.n_features)[np.newaxis, :]
+        has_nan = bool(np.isnan(flat_X).any())
+        handle_missing = has_nan or self._has_zero_missing
+
+        # (木, 行) ごとの現在ノード
+        idx = np.repeat(self.roots.astype(np.intp)[:, np.newaxis], n_rows, axis=1)
+        for _ in range(self.depth):
+            x = flat_X.take(self.feature.take(idx) + row_offsets)
+            threshold = self.threshold.take(idx)
+            go_right = x > threshold
+
+            if handle_missing:
+                missing_type = self.missing_type.take(idx)
+                is_nan = np.isnan(x) if has_nan else None
+                if has_nan:
+                    # 欠損扱いしないノードではNaNを0として比較
+                    x = np.where(is_nan, 0, x)
+                    go_right = np.where(is_nan & (missing_type != MISSING_NAN), x > threshold, go_right)
+                    missing = is_nan & (missing_type != MISSING_NONE)
+                else:
+                    missing = np.zeros_like(go_right)
+                if self._has_zero_missing:
+                    missing |= (missing_type == MISSING_ZERO) & (np.abs(x) <= _LGBM_ZERO_THRESHOLD)
+                go_right = np.where(missing, ~self.default_left.take(idx), go_right)
+
+            idx = self.children.take(idx * 2 + go_right)
+
+        # 行ごとに連続した(行, 木)配列で合計し、同じ行はバッチの行数・位置によらず同じ順序で加算する
+        leaf_values = self.value.take(idx.T)
+        total = leaf_values.sum(axis=1)
+        if self.average:
+            total /= len(self.roots)
+        return self.bias + self.scale * total
+
+
+def compile_model(model):
+    """
+    モデルを配列表現に変換
+
+    Returns:
+        CompiledEnsemble or None: 対応していないモデルの場合はNone
+    """
+    name = type(model).__name__
+    if name == 'GradientBoostingRegressor':
+        return _compile_sklearn_gbr(model)
+    if name == 'RandomForestRegressor':
+        return _compile_sklearn_forest(model)
+    if name == 'LGBMRegressor':
+        return _compile_lightgbm(model)
+    if name == 'XGBRegressor':
+        return _compile_xgboost(model)
+    if name == 'CatBoostRegressor':
+        return _compile_catboost(model)
+    return None
+
+
+def verify_compiled(compiled, model, n_rows=COMPILE_VERIFY_ROWS, seed=0):
+    """
+    変換結果を元のモデルの予測値と照合
+
+    分岐の閾値ちょうど・その前後の値と、閾値の範囲を覆う一様乱数を入力として比較する。
+
+    Returns:
+        bool: 全行で予測値が一致した場合True
+    """
+    X = _verification_inputs(compiled, n_rows, seed)
+    if compiled.feature_names is not None:
+        X_model = pd.DataFrame(X, columns=compiled.feature_names)
+    else:
+        X_model = X
+    expected = np.asarray(model.predict(X_model), dtype=np.float64).ravel()
+    actual = compiled.predict(X)
+    atol = 1e-6 * max(1.0, float(np.abs(expected).max()) if expected.size else 1.0)
+    return bool(np.allclose(actual, expected, rtol=1e-5, atol=atol))
+
+
+def maybe_compile(model):
+    """
+    設定が有効で対応モデルの場合、変換・照合に成功した配列表現を返す（それ以外は元のモデル）
+    """
+    if not COMPILE_TREE_MODELS:
+        return model
+    try:
+        compiled = compile_model(model)
+        if compiled is None:
+            return model
+        if not verify_compiled(compiled, model):
+            print(f"[WARN] Compiled {type(model).__name__} does not match the original model, using original")
+            return model
+        print(f"[INFO] Compiled {type(model).__name__}: {len(compiled.roots)} trees, "
+              f"{len(compiled.value)} nodes, depth {compiled.depth}")
+        compiled.model = model
+        compiled.max_rows = COMPILE_MAX_ROWS
+        return compiled
+    except Exception as e:
+        print(f"[WARN] Failed to compile {type(model).__name__}: {e}")
+        return model
+
+
+def _verification_inputs(compiled, n_rows, seed):
+    """照合用の入力（特徴量ごとに閾値付近の値と一様乱数を混ぜる）"""
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_rows, compiled.n_features))
+    internal = ~compiled.is_leaf
+    for f in range(compiled.n_features):
+        thresholds = compiled.threshold[internal & (compiled.feature == f)].astype(np.float64)
+        if thresholds.size == 0:
+            X[:, f] = rng.normal(size=n_rows)
+            continue
+        low, high = thresholds.min(), thresholds.max()
+        span = max(high - low, 1.0)
+        candidates = np.concatenate([
+            thresholds,
+            np.nextafter(thresholds.astype(compiled.threshold.dtype), np.inf).astype(np.float64),
+            rng.uniform(low - 0.1 * span, high + 0.1 * span, size=thresholds.size)
+        ])
+        X[:, f] = rng.choice(candidates, size=n_rows)
+    return X
+
+
+def _fitted_feature_names(model):
+    """DataFrameで学習した場合の特徴量名（ndarrayで学習した場合はNone）"""
+    try:
+        names = model.feature_names_in_
+    except (AttributeError, ValueError):
+        return None
+    return [str(name) for name in names] if names is not None else None
+
+
+def _empty_nodes(n):
+    return {
+        'feature': np.zeros(n, dtype=np.int32),
+        'threshold': np.full(n, np.inf),
+        'left': np.zeros(n, dtype=np.int32),
+        'right': np.zeros(n, dtype=np.int32),
+        'default_left': np.ones(n, dtype=bool),
+        'missing_type': np.full(n, MISSING_NAN, dtype=np.int8),
+        'value': np.zeros(n)
+    }
+
+
+def _floor_float32(values):
+    """float64の閾値を、float32の入力に対して同じ比較結果になるfloat32に切り下げる"""
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    over = rounded.astype(np.float64) > values
+    rounded[over] = np.nextafter(rounded[over], np.float32(-np.inf))
+    return rounded
+
+
+def _concat_sklearn_trees(trees, feature_names, n_features, source, bias=0.0, scale=1.0, average=False):
+    """sklearnのDecisionTreeRegressor群を連結"""
+    parts = []
+    roots = []
+    offset = 0
+    depth = 0
+    for tree in trees:
+        t = tree.tree_
+        n = t.node_count
+        nodes = _empty_nodes(n)
+        is_leaf = t.children_left == -1
+        node_ids = np.arange(n)
+        nodes['feature'] = np.where(is_leaf, 0, t.feature)
+        nodes['threshold'] = np.where(is_leaf, np.inf, t.threshold)
+        nodes['left'] = np.where(is_leaf, node_ids, t.children_left) + offset
+        nodes['right'] = np.where(is_leaf, node_ids, t.children_right) + offset
+        missing_go_to_left = getattr(t, 'missing_go_to_left', None)
+        if missing_go_to_left is not None:
+            nodes['default_left'] = np.asarray(missing_go_to_left, dtype=bool)
+        nodes['value'] = t.value.reshape(n, -1)[:, 0]
+        parts.append(nodes)
+        roots.append(offset)
+        offset += n
+        depth = max(depth, t.max_depth)
+
+    nodes = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+    # sklearnは入力をfloat32に変換してからfloat64の閾値と比較する
+    nodes['threshold'] = _floor_float32(nodes['threshold'])
+    return CompiledEnsemble(nodes, roots, depth, feature_names, n_features, bias=bias, scale=scale,
+                            average=average, source=source)
+
+
+def _compile_sklearn_gbr(model):
+    if model.estimators_.shape[1] != 1:
+        return None
+    init = model.init_
+    if isinstance(init, str):
+        bias = 0.0
+    elif hasattr(init, 'constant_'):
+        bias = float(np.ravel(init.constant_)[0])
+    else:
+        # 任意のinit推定器は定数ではないため対応しない
+        return None
+    return _concat_sklearn_trees(
+        model.estimators_[:, 0], _fitted_feature_names(model), model.n_features_in_,
+        'GradientBoostingRegressor', bias=bias, scale=model.learning_rate
+    )
+
+
+def _compile_sklearn_forest(model):
+    return _concat_sklearn_trees(
+        model.estimators_, _fitted_feature_names(model), model.n_features_in_,
+        'RandomForestRegressor', average=True
+    )
+
+
+def _compile_lightgbm(model):
+    booster = model.booster_
+    dump = booster.dump_model()
+    if dump.get('num_tree_per_iteration', 1) != 1 or dump.get('num_class', 1) != 1:
+        return None
+    objective = str(dump.get('objective', 'regression')).split()[0]
+    if objective not in ('regression', 'regression_l1', 'huber', 'fair', 'quantile', 'mape'):
+        # 出力変換（log・sigmoidなど）を伴う目的関数は対応しない
+        return None
+
+    # ndarrayで学習したモデルの自動生成名（Column_0など）は使わない
+    feature_names = _fitted_feature_names(model)
+    n_features = dump['max_feature_idx'] + 1
+    missing_types = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+
+    records = []
+    roots = []
+    depth = 0
+
+    def add(node, level):
+        nonlocal depth
+        node_id = len(records)
+        records.append(None)
+        if 'leaf_value' in node or 'split_feature' not in node:
+            depth = max(depth, level)
+            records[node_id] = (0, np.inf, node_id, node_id, True, MISSING_NAN, node.get('leaf_value', 0.0))
+            return node_id
+        if node.get('decision_type', '<=') != '<=':
+            raise ValueError("Categorical splits are not supported")
+        left = add(node['left_child'], level + 1)
+        right = add(node['right_child'], level + 1)
+        records[node_id] = (
+            node['split_feature'], node['threshold'], left, right, node.get('default_left', True),
+            missing_types.get(node.get('missing_type', 'None'), MISSING_NONE), 0.0
+        )
+        return node_id
+
+    for tree in dump['tree_info']:
+        roots.append(add(tree['tree_structure'], 0))
+
+    columns = list(zip(*records))
+    nodes = {
+        'feature': np.array(columns[0]),
+        'threshold': np.array(columns[1], dtype=np.float64),
+        'left': np.array(columns[2]),
+        'right': np.array(columns[3]),
+        'default_left': np.array(columns[4], dtype=bool),
+        'missing_type': np.array(columns[5]),
+        'value': np.array(columns[6], dtype=np.float64)
+    }
+    # LightGBMはfloat64の入力と閾値で比較する
+    return CompiledEnsemble(nodes, roots, depth, feature_names, n_features,
+                            average=bool(dump.get('average_output', False)),
+                            threshold_dtype=np.float64, zero_threshold=_LGBM_ZERO_THRESHOLD,
+                            source='LGBMRegressor')
+
+
+def _compile_xgboost(model):
+    booster = model.get_booster()
+    config = json.loads(booster.save_config())
+    learner = config['learner']
+    if learner['objective']['name'] not in ('reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror'):
+        return None
+    if learner.get('gradient_booster', {}).get('name', 'gbtree') not in ('gbtree', 'dart'):
+        return None
+    if learner['gradient_booster']['name'] == 'dart':
+        # dartは木ごとの重みがダンプに含まれないため対応しない
+        return None
+    model_param = learner['learner_model_param']
+    if int(model_param.get('num_target', '1')) != 1 or int(model_param.get('num_class', '0')) > 1:
+        return None
+    base_score = float(str(model_param['base_score']).strip('[]').split(',')[0])
+
+    feature_names = _fitted_feature_names(model)
+    n_features = booster.num_features()
+    feature_index = {name: i for i, name in enumerate(booster.feature_names)} if booster.feature_names else None
+
+    best_iteration = getattr(model, 'best_iteration', None)
+    dumps = booster.get_dump(dump_format='json')
+    if best_iteration is not None and getattr(model, 'early_stopping_rounds', None):
+        dumps = dumps[:best_iteration + 1]
+
+    records = []
+    roots = []
+    depth = 0
+
+    def resolve_feature(split):
+        if feature_index is not None and split in feature_index:
+            return feature_index[split]
+        return int(str(split).lstrip('f'))
+
+    def add(node, level):
+        nonlocal depth
+        node_id = len(records)
+        records.append(None)
+        if 'leaf' in node:
+            depth = max(depth, level)
+            records[node_id] = (0, np.inf, node_id, node_id, True, node['leaf'])
+            return node_id
+        children = {child['nodeid']: child for child in node['children']}
+        left = add(children[node['yes']], level + 1)
+        right = add(children[node['no']], level + 1)
+        # XGBoostは x < split で左に進むため、float32で1つ小さい値以下の比較に置き換える
+        threshold = np.nextafter(np.float32(node['split_condition']), np.float32(-np.inf))
+        records[node_id] = (
+            resolve_feature(node['split']), threshold, left, right,
+            node.get('missing', node['no']) == node['yes'], 0.0
+        )
+        return node_id
+
+    for tree_dump in dumps:
+        roots.append(add(json.loads(tree_dump), 0))
+
+    columns = list(zip(*records))
+    nodes = {
+        'feature': np.array(columns[0]),
+        'threshold': np.array(columns[1], dtype=np.float32),
+        'left': np.array(columns[2]),
+        'right': np.array(columns[3]),
+        'default_left': np.array(columns[4], dtype=bool),
+        'missing_type': np.full(len(records), MISSING_NAN, dtype=np.int8),
+        'value': np.array(columns[5], dtype=np.float64)
+    }
+    return CompiledEnsemble(nodes, roots, depth, feature_names, n_features, bias=base_score,
+                            source='XGBRegressor')
+
+
+def _compile_catboost(model):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'model.json')
+        model.save_model(path, format='json')
+        with open(path, encoding='utf-8') as f:
+            dump = json.load(f)
+
+    features_info = dump.get('features_info', {})
+    if features_info.get('categorical_features') or features_info.get('text_features'):
+        return None
+    float_features = features_info.get('float_features', [])
+    flat_index = {f['feature_index']: f['flat_feature_index'] for f in float_features}
+    n_features = len(model.feature_names_) if getattr(model, 'feature_names_', None) else max(flat_index.values(), default=-1) + 1
+    feature_names = list(model.feature_names_) if getattr(model, 'feature_names_', None) else None
+    if feature_names == [str(i) for i in range(n_features)]:
+        # ndarrayで学習したモデルの自動生成名
+        feature_names = None
+    nan_left = {
+        f['flat_feature_index']: f.get('nan_value_treatment', 'AsIs') != 'AsTrue'
+        for f in float_features
+    }
+
+    parts = []
+    roots = []
+    offset = 0
+    depth = 0
+    for tree in dump['oblivious_trees']:
+        splits = tree['splits']
+        leaf_values = np.asarray(tree['leaf_values'], dtype=np.float64)
+        d = len(splits)
+        if leaf_values.size != 2 ** d:
+            # 多次元出力は対応しない
+            return None
+        if any(s.get('split_type', 'FloatFeature') != 'FloatFeature' for s in splits):
+            return None
+
+        # 対称木を完全二分木に展開する（深さjの分岐はsplits[j]、右に進むと葉indexのbit jが立つ）
+        n_internal = 2 ** d - 1
+        n = n_internal + 2 ** d
+        nodes = _empty_nodes(n)
+        for level in range(d):
+            split = splits[level]
+            feature = flat_index[split['float_feature_index']]
+            for k in range(2 ** level):
+                node = 2 ** level - 1 + k
+                nodes['feature'][node] = feature
+                nodes['threshold'][node] = split['border']
+                nodes['left'][node] = 2 * node + 1 + offset
+                nodes['right'][node] = 2 * node + 2 + offset
+                nodes['default_left'][node] = nan_left.get(feature, True)
+        for k in range(2 ** d):
+            node = n_internal + k
+            nodes['left'][node] = node + offset
+            nodes['right'][node] = node + offset
+            # 根からの経路（左=0/右=1）を上位から並べたkを、bit jが深さjの分岐になるよう反転する
+            leaf_index = int(format(k, f'0{d}b')[::-1], 2) if d else 0
+            nodes['value'][node] = leaf_values[leaf_index]
+        parts.append(nodes)
+        roots.append(offset)
+        offset += n
+        depth = max(depth, d)
+
+    nodes = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+    # CatBoostは x > border で右に進み、入力と境界値をfloat32で比較する
+    nodes['threshold'] = _floor_float32(nodes['threshold'])
+
+    scale, bias = 1.0, 0.0
+    scale_and_bias = dump.get('scale_and_bias')
+    if scale_and_bias:
+        scale = float(scale_and_bias[0])
+        bias = float(np.ravel(scale_and_bias[1])[0]) if np.size(scale_and_bias[1]) else 0.0
+    return CompiledEnsemble(nodes, roots, depth, feature_names, n_features, bias=bias, scale=scale,
+                            source='CatBoostRegressor')
@@ -0,0 +1,283 @@
+"""
+Optimization objective specification
+最適化のパラメータ設定・目的変数設定を、試行ごとに解釈し直さなくてよい
+探索空間（Optunaの分布）とスコア計算プランに事前変換する
+"""
+import numpy as np
+import pandas as pd
+from optuna.distributions import CategoricalDistribution, FloatDistribution, IntDistribution
+
+# パラメータ型・目的の指定値（日本語・英語の両方を受け付ける）
+INT_TYPES = ("整数", "int", "integer")
+FLOAT_TYPES = ("小数", "float", "number")
+CATEGORICAL_TYPES = ("カテゴリ", "categorical", "category")
+MAXIMIZE_TYPES = ("最大化", "maximize")
+MINIMIZE_TYPES = ("最小化", "minimize")
+TARGET_VALUE_TYPES = ("目標値", "target")
+
+
+class SearchSpace:
+    """
+    説明変数の探索空間
+
+    Attributes:
+        names: 学習時の説明変数の順に並べたパラメータ名
+        distributions: パラメータ名 -> Optunaの分布（study.askのfixed_distributionsに渡す）
+    """
+
+    def __init__(self, names, distributions):
+        self.names = list(names)
+        self.distributions = distributions
+
+    def to_matrix(self, params_list):
+        """試行のパラメータ（dictのリスト）を説明変数の順の行列に変換"""
+        return np.array([[params[name] for name in self.names] for params in params_list], dtype=np.float64)
+
+    def to_frame(self, matrix):
+        """行列をモデル入力のDataFrameに変換"""
+        return pd.DataFrame(matrix, columns=self.names)
+
+    def to_params(self, row):
+        """行列の1行を試行のパラメータ（dict）に変換"""
+        params = {}
+        for name, value in zip(self.names, row):
+            if isinstance(self.distributions[name], IntDistribution):
+                params[name] = int(value)
+            else:
+                params[name] = float(value)
+        return params
+
+    def from_unit(self, unit):
+        """
+        単位超立方体上の点（説明変数の順、値は[0, 1)）を探索空間の行列に変換
+
+        小数は範囲に線形に写像し、整数・カテゴリは範囲を等分した区間に割り当てる。
+        """
+        unit = np.asarray(unit, dtype=np.float64)
+        matrix = np.empty_like(unit)
+        for j, name in enumerate(self.names):
+            dist = self.distributions[name]
+            u = unit[:, j]
+            if isinstance(dist, CategoricalDistribution):
+                choices = np.asarray(dist.choices, dtype=np.float64)
+                matrix[:, j] = choices[np.minimum((u * len(choices)).astype(np.int64), len(choices) - 1)]
+            elif isinstance(dist, IntDistribution):
+                matrix[:, j] = np.minimum(dist.low + np.floor(u * (dist.high - dist.low + 1)), dist.high)
+            else:
+                matrix[:, j] = dist.low + u * (dist.high - dist.low)
+        return matrix
+
+
+class ScoringPlan:
+    """
+    予測値からOptunaに返すスコアを計算するプラン
+
+    目的変数ごとに、使用するモデルのindex・最適化方向・目標値（目標値指定でない場合はNaN）を保持し、
+    候補数 x 目的変数数のスコアを一括で計算する。
+
+    Attributes:
+        model_indices: 目的変数設定の順に使用するモデルのindex
+        directions: 'maximize' / 'minimize' のリスト
+        target_values: 目標値（float64、目標値指定でない目的変数はNaN）
+    """
+
+    def __init__(self, model_indices, directions, target_values):
+        self.model_indices = list(model_indices)
+        self.directions = list(directions)
+        self.target_values = np.asarray(target_values, dtype=np.float64)
+        self._is_target = ~np.isnan(self.target_values)
+
+    @property
+    def required_models(self):
+        """予測が必要なモデルのindex（重複なし）"""
+        return sorted(set(self.model_indices))
+
+    def score(self, predictions):
+        """
+        スコア計算
+
+        Args:
+            predictions: モデルindex -> 予測値配列（候補数分）
+
+        Returns:
+            numpy.ndarray: 候補数 x 目的変数数のスコア
+        """
+        values = np.column_stack([
+            np.asarray(predictions[idx], dtype=np.float64).ravel() for idx in self.model_indices
+        ])
+        # 目標値指定は目標値との差を最小化、それ以外は予測値をそのまま最大化/最小化
+        return np.where(self._is_target, np.abs(values - self.target_values), values)
+
+    def to_costs(self, scores):
+        """スコアを全目的変数とも小さいほど良い値に変換（最大化の目的変数は符号を反転）"""
+        signs = np.array([-1.0 if d == "maximize" else 1.0 for d in self.directions])
+        return np.asarray(scores, dtype=np.float64) * signs
+
+
+def compile_search_space(param_configs, x_list=None):
+    """
+    パラメータ設定を探索空間に変換
+
+    Args:
+        param_configs: パラメータ設定リスト（low/high または min/max）
+        x_list: 学習時の説明変数リスト（指定した場合は過不足を検証し、この順に並べる）
+
+    Returns:
+        SearchSpace
+
+    Raises:
+        ValueError: 設定が不正、または学習時の説明変数と一致しない場合
+    """
+    if not param_configs:
+        raise ValueError("param_configs must not be empty")
+
+    distributions = {}
+    for config in param_configs:
+        name = config.get("name")
+        if not name:
+            raise ValueError("Each param config requires a name")
+        if name in distributions:
+            raise ValueError(f"Duplicate param config: {name}")
+        distributions[name] = _to_distribution(name, config)
+
+    if x_list:
+        unknown = [name for name in distributions if name not in x_list]
+        if unknown:
+            raise ValueError(f"Params not used by the model: {unknown} (model features: {list(x_list)})")
+        missing = [name for name in x_list if name not in distributions]
+        if missing:
+            raise ValueError(f"Missing param configs for model features: {missing}")
+        names = list(x_list)
+    else:
+        names = list(distributions)
+
+    return SearchSpace(names, distributions)
+
+
+def compile_scoring_plan(target_param_configs, model_targets):
+    """
+    目的変数設定をスコア計算プランに変換
+
+    nameが指定された設定は同名の目的変数のモデルに、指定がない設定は順番にモデルを対応させる。
+
+    Args:
+        target_param_configs: 目的変数設定リスト
+        model_targets: モデルの順の目的変数名（不明な場合はNone）
+
+    Returns:
+        ScoringPlan
+
+    Raises:
+        ValueError: 設定が不正、またはモデルと対応付けられない場合
+    """
+    if not target_param_configs:
+        raise ValueError("target_param_configs must not be empty")
+    if len(target_param_configs) > len(model_targets):
+        raise ValueError(f"{len(target_param_configs)} target configs for {len(model_targets)} model(s)")
+
+    model_indices = []
+    directions = []
+    target_values = []
+    for i, config in enumerate(target_param_configs):
+        name = config.get("name")
+        if name and any(model_targets):
+            if name not in model_targets:
+                raise ValueError(f"Unknown target: {name} (model targets: {model_targets})")
+            model_indices.append(model_targets.index(name))
+        else:
+            model_indices.append(i)
+
+        target_type = config.get("type", config.get("direction", "maximize"))
+        target_value = config.get("value", config.get("target"))
+        if target_type in TARGET_VALUE_TYPES:
+            if target_value is None:
+                raise ValueError(f"Target value is required for target {name or i}")
+            try:
+                target_values.append(float(target_value))
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid target value for target {name or i}: {target_value}")
+            directions.append("minimize")
+        elif target_type in MAXIMIZE_TYPES:
+            target_values.append(np.nan)
+            directions.append("maximize")
+        elif target_type in MINIMIZE_TYPES:
+            target_values.append(np.nan)
+            directions.append("minimize")
+        else:
+            raise ValueError(f"Unknown target type for target {name or i}: {target_type}")
+
+    return ScoringPlan(model_indices, directions, target_values)
+
+
+def pareto_mask(costs):
+    """
+    パレート最適な行のマスク（全目的変数とも小さいほど良い値）
+
+    値が完全に一致する行は先頭の1行のみを最適とする。NaNを含む行は最適としない。
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    valid = ~np.isnan(costs).any(axis=1)
+    candidates = np.flatnonzero(valid)
+    remaining = costs[candidates]
+    i = 0
+    while i < len(remaining):
+        # i番目の点に支配されない点のみ残す
+        keep = np.any(remaining < remaining[i], axis=1)
+        keep[i] = True
+        candidates = candidates[keep]
+        remaining = remaining[keep]
+        i = int(np.count_nonzero(keep[:i])) + 1
+    mask = np.zeros(len(costs), dtype=bool)
+    mask[candidates] = True
+    return mask
+
+
+def rank_candidates(costs, k):
+    """
+    良い順に最大k行のindexを選択
+
+    単目的は値の昇順、多目的はパレートフロントを順に剥がした順（同じフロント内は第1目的変数の昇順）。
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(costs).any(axis=1))
+    if costs.shape[1] == 1:
+        return valid[np.argsort(costs[valid, 0], kind='stable')[:k]]
+
+    selected = []
+    remaining = valid
+    while len(selected) < k and len(remaining):
+        mask = pareto_mask(costs[remaining])
+        front = remaining[mask]
+        selected.extend(front[np.argsort(costs[front, 0], kind='stable')])
+        remaining = remaining[~mask]
+    return np.asarray(selected[:k], dtype=np.int64)
+
+
+def _to_distribution(name, config):
+    """パラメータ設定1件をOptunaの分布に変換"""
+    param_type = config.get("type", "float")
+
+    if param_type in CATEGORICAL_TYPES:
+        choices = config.get("choices") or []
+        if not choices:
+            raise ValueError(f"Categorical param {name} requires choices")
+        # モデルの入力は数値のため、選択肢も数値に限る
+        try:
+            choices = tuple(float(choice) for choice in choices)
+        except (TypeError, ValueError):
+            raise ValueError(f"Categorical param {name} must have numeric choices: {config.get('choices')}")
+        return CategoricalDistribution(choices)
+
+    # 複数の形式に対応 (min/max or low/high)
+    try:
+        low = float(config.get("low", config.get("min", 0)))
+        high = float(config.get("high", config.get("max", 100)))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid range for param {name}")
+    if low > high:
+        raise ValueError(f"Invalid range for param {name}: low ({low}) > high ({high})")
+
+    if param_type in INT_TYPES:
+        return IntDistribution(int(low), int(high))
+    # 小数・未指定の型はfloat
+    return FloatDistribution(low, high)
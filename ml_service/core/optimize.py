@@ -2,27 +2,31 @@
 Optimization Module using Optuna
 Streamlit最適化コードをリファクタリング
 """
-import pandas as pd
 import numpy as np
-import mlflow
-import mlflow.pyfunc
 import optuna
 from optuna.samplers import TPESampler
+from optuna.trial import TrialState, create_trial
+from scipy.stats import qmc
 import os
 from datetime import datetime
 
-import pickle
-
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import *
 from core.utils import save_dataframe
+from core.registry import load_models, lookup_models
+from core.objective import compile_search_space, compile_scoring_plan, pareto_mask, rank_candidates
 
 
-def optimize_model(mlflow_id, param_configs, target_param_configs, n_trials=100, run_id=None, socketio=None):
+def optimize_model(mlflow_id, param_configs, target_param_configs, n_trials=100, run_id=None, socketio=None,
+                   batch_size=None, sweep=None):
     """
     Optuna多目的最適化実行
 
+    ask/tellインターフェースでbatch_size件ずつ候補を取得し、全モデルでまとめて予測してから結果を返す。
+    sweepを指定した場合は、先にSobol列/ラテン超方格の多数の候補をまとめて評価し、
+    良い候補をTPEの履歴に加えてから探索する（結果は両方を合わせたパレート解）。
+
     Args:
         mlflow_id: MLflow Run ID
         param_configs: パラメータ設定リスト
@@ -32,6 +36,8 @@ def optimize_model(mlflow_id, param_configs, target_param_configs, n_trials=100,
         n_trials: 試行回数
         run_id: Optimization Run ID
         socketio: WebSocket通知用
+        batch_size: 1回の予測でまとめて評価する候補数（Noneの場合はML_OPTIMIZE_BATCH_SIZE）
+        sweep: 事前の網羅評価の設定（True または {"method": "sobol"/"lhs", "n_samples": 件数, "seed_trials": TPEに渡す件数}）
 
     Returns:
         dict: 最適化結果
@@ -50,127 +56,41 @@ def optimize_model(mlflow_id, param_configs, target_param_configs, n_trials=100,
     try:
         notify_status("最適化準備中...", 0)
 
-        # モデルロード
-        loaded_models = []
-
-        # ローカル環境ではファイルから直接読み込む
-        if not is_databricks_environment():
-            result_base = f"{get_result_path()}"
-
-            # mlflow_idからモデルを検索
-            model_path = None
-            for run_dir in os.listdir(result_base):
-                run_path = os.path.join(result_base, run_dir)
-                if os.path.isdir(run_path):
-                    mlflow_dir = os.path.join(run_path, mlflow_id)
-                    if os.path.exists(mlflow_dir):
-                        model_path = run_path
-                        break
-                    models_dir = os.path.join(run_path, "models")
-                    if os.path.isdir(models_dir):
-                        for m in os.listdir(models_dir):
-                            pkl_path = os.path.join(models_dir, m, "artifacts", "model.pkl")
-                            if os.path.exists(pkl_path):
-                                model_path = run_path
-                                break
-                    if model_path:
-                        break
-
-            if not model_path:
-                raise ValueError(f"No model found for MLflow ID: {mlflow_id}")
-
-            # モデルをロード
-            models_dir = os.path.join(model_path, "models")
-            for model_name in sorted(os.listdir(models_dir)):
-                pkl_path = os.path.join(models_dir, model_name, "artifacts", "model.pkl")
-                if os.path.exists(pkl_path):
-                    with open(pkl_path, 'rb') as f:
-                        model = pickle.load(f)
-                    loaded_models.append(model)
-        else:
-            # Databricks環境ではMLflowから読み込む
-            model_idx = 0
-            while True:
-                try:
-                    model_uri = f'runs:/{mlflow_id}/trained_model_{model_idx}'
-                    loaded_model = mlflow.pyfunc.load_model(model_uri)
-                    loaded_models.append(loaded_model)
-                    model_idx += 1
-                except Exception:
-                    break
-
-        if len(loaded_models) == 0:
-            raise ValueError(f"No models found for MLflow run: {mlflow_id}")
-
-        if len(loaded_models) != len(target_param_configs):
-            print(f"[WARN] Model count ({len(loaded_models)}) != target count ({len(target_param_configs)})")
+        # 設定を探索空間・スコア計算プランに変換（学習時の説明変数・目的変数と照合）
+        search_space, scoring_plan = compile_objective(mlflow_id, param_configs, target_param_configs)
+        directions = scoring_plan.directions
+
+        # モデル索引から目的変数の順にモデルをロード
+        _, loaded_models = load_models(mlflow_id)
 
         notify_status(f"{len(loaded_models)}個のモデルをロード完了", 10)
 
-        # Optuna目的関数定義
-        def objective(trial):
-            # パラメータ提案
-            params = {}
-            for config in param_configs:
-                name = config["name"]
-                param_type = config.get("type", "float")
-
-                # 複数の形式に対応 (min/max or low/high)
-                low = config.get("low", config.get("min", 0))
-                high = config.get("high", config.get("max", 100))
-
-                if param_type in ["整数", "int", "integer"]:
-                    params[name] = trial.suggest_int(name, int(low), int(high))
-                elif param_type in ["小数", "float", "number"]:
-                    params[name] = trial.suggest_float(name, float(low), float(high))
-                elif param_type in ["カテゴリ", "categorical", "category"]:
-                    params[name] = trial.suggest_categorical(name, config.get("choices", []))
-                else:
-                    # デフォルトはfloat
-                    params[name] = trial.suggest_float(name, float(low), float(high))
-
-            # 予測実行
-            input_df = pd.DataFrame([params])
-            scores = []
-
-            for i, target_config in enumerate(target_param_configs):
-                if i >= len(loaded_models):
-                    break
-
-                pred = loaded_models[i].predict(input_df)[0]
-
-                target_type = target_config.get("type", target_config.get("direction", "maximize"))
-                target_value = target_config.get("value", target_config.get("target"))
-
-                if target_type in ["目標値", "target"] and target_value is not None:
-                    # 目標値との差を最小化
-                    score = abs(pred - float(target_value))
-                else:
-                    # 最大化/最小化
-                    score = pred
-
-                scores.append(score)
-
-            return scores if len(scores) > 1 else scores[0]
-
-        # 最適化方向の設定
-        directions = []
-        for target_config in target_param_configs:
-            target_type = target_config.get("type", target_config.get("direction", "maximize"))
-            if target_type in ["最大化", "maximize"]:
-                directions.append("maximize")
-            else:
-                # 最小化 or 目標値
-                directions.append("minimize")
+        # 候補をまとめて評価（戻り値: 候補数 x 目的変数数のスコア）
+        def evaluate(param_rows):
+            # 予測実行（全候補を1つの行列にして各モデル1回のpredict）
+            input_df = search_space.to_frame(search_space.to_matrix(param_rows))
+            predictions = {idx: loaded_models[idx].predict(input_df) for idx in scoring_plan.required_models}
+            return scoring_plan.score(predictions)
+
+        sweep = resolve_sweep_options(sweep)
+        sweep_matrix = sweep_scores = None
+        if sweep:
+            notify_status(f"候補の網羅評価中...（{sweep['method']}, {sweep['n_samples']}件）", 20)
+            sweep_matrix, sweep_scores = _run_sweep(search_space, scoring_plan, loaded_models, sweep)
+            sweep['n_samples'] = len(sweep_matrix)
 
-        notify_status("Optuna最適化実行中...", 20)
+        batch_size = resolve_batch_size(batch_size)
+        tpe_progress_start = 40 if sweep else 20
+        notify_status(f"Optuna最適化実行中...（{batch_size}件ずつ評価）" if batch_size > 1 else "Optuna最適化実行中...", tpe_progress_start)
 
         # Optuna実行
         sampler = TPESampler(
             n_startup_trials=10,
             n_ei_candidates=24,
             multivariate=True,
-            seed=42
+            seed=42,
+            # 同じバッチの候補が評価待ちの試行と重ならないようにする
+            constant_liar=batch_size > 1
         )
 
         if len(directions) > 1:
@@ -178,12 +98,47 @@ def optimize_model(mlflow_id, param_configs, target_param_configs, n_trials=100,
         else:
             study = optuna.create_study(sampler=sampler, direction=directions[0])
 
-        # プログレスコールバック
-        def progress_callback(study, trial):
-            progress = int((trial.number / n_trials) * 70) + 20  # 20-90%
-            notify_status(f"Trial {trial.number}/{n_trials} 完了", progress)
-
-        study.optimize(objective, n_trials=n_trials, callbacks=[progress_callback])
+        if sweep:
+            # 網羅評価の良い候補（と比較用のランダムな候補）を評価済みの試行としてTPEに渡す
+            seed_rows = _select_seed_rows(scoring_plan.to_costs(sweep_scores), sweep['seed_trials'])
+            study.add_trials([
+                create_trial(
+                    params=search_space.to_params(sweep_matrix[i]),
+                    distributions=search_space.distributions,
+                    values=sweep_scores[i].tolist()
+                )
+                for i in seed_rows
+            ])
+            sweep['seeded_trials'] = len(seed_rows)
+        trial_offset = len(study.trials)
+
+        tpe_rows = []
+        tpe_scores = []
+        completed = 0
+        while completed < n_trials:
+            trials = [
+                study.ask(fixed_distributions=search_space.distributions)
+                for _ in range(min(batch_size, n_trials - completed))
+            ]
+            try:
+                scores = evaluate([trial.params for trial in trials])
+            except Exception:
+                # 評価待ちの試行を残さない
+                for trial in trials:
+                    study.tell(trial, state=TrialState.FAIL)
+                raise
+
+            for trial, trial_scores in zip(trials, scores):
+                study.tell(trial, trial_scores.tolist() if len(trial_scores) > 1 else float(trial_scores[0]))
+            completed += len(trials)
+            if sweep:
+                tpe_rows.extend(trial.params for trial in trials)
+                tpe_scores.append(scores)
+
+            # 進捗通知（バッチごと）
+            last_number = trials[-1].number - trial_offset
+            progress = int((last_number / n_trials) * (90 - tpe_progress_start)) + tpe_progress_start  # 20(40)-90%
+            notify_status(f"Trial {last_number}/{n_trials} 完了", progress)
 
         notify_status("最適化完了。結果を保存中...", 90)
 
@@ -204,10 +159,35 @@ def optimize_model(mlflow_id, param_configs, target_param_configs, n_trials=100,
             result_csv = f"{result_path}/optimization_result.csv"
             save_dataframe(optimization_result, result_csv)
 
+            if sweep:
+                sweep_result = search_space.to_frame(sweep_matrix)
+                for i in range(sweep_scores.shape[1]):
+                    sweep_result[f"values_{i}"] = sweep_scores[:, i]
+                save_dataframe(sweep_result, f"{result_path}/sweep_result.csv")
+
         notify_status("最適化完了！", 100)
 
         # ベスト試行を取得
-        if len(directions) == 1:
+        pareto_front = None
+        if sweep:
+            # 網羅評価とTPEの全候補から選ぶ
+            all_matrix = np.vstack([sweep_matrix] + ([search_space.to_matrix(tpe_rows)] if tpe_rows else []))
+            all_scores = np.vstack([sweep_scores] + tpe_scores)
+            costs = scoring_plan.to_costs(all_scores)
+            if len(directions) == 1:
+                best_idx = rank_candidates(costs, 1)[0]
+                best_params = search_space.to_params(all_matrix[best_idx])
+                best_value = float(all_scores[best_idx, 0])
+            else:
+                front = np.flatnonzero(pareto_mask(costs))
+                front = front[np.argsort(costs[front, 0], kind='stable')]
+                pareto_front = [
+                    {"params": search_space.to_params(all_matrix[i]), "values": [float(v) for v in all_scores[i]]}
+                    for i in front
+                ]
+                best_params = [p["params"] for p in pareto_front[:5]]  # 上位5件
+                best_value = [p["values"] for p in pareto_front[:5]]
+        elif len(directions) == 1:
             best_trial = study.best_trial
             best_params = best_trial.params
             best_value = float(best_trial.value) if best_trial.value is not None else None
@@ -217,15 +197,134 @@ def optimize_model(mlflow_id, param_configs, target_param_configs, n_trials=100,
             best_params = [t.params for t in best_trials[:5]]  # 上位5件
             best_value = [[float(v) for v in t.values] for t in best_trials[:5]]
 
-        return {
+        result = {
             "num_trials": n_trials,
+            "batch_size": batch_size,
             "num_objectives": len(target_param_configs),
             "best_params": best_params,
             "best_value": best_value,
             "result_path": result_path,
             "optimization_result": optimization_result.head(20).to_dict(orient='records')  # 上位20件のみ
         }
+        if sweep:
+            result["sweep"] = sweep
+            if pareto_front is not None:
+                result["pareto_front"] = pareto_front
+        return result
 
     except Exception as e:
         notify_status(f"エラー発生: {str(e)}", None)
         raise e
+
+
+def compile_objective(mlflow_id, param_configs, target_param_configs):
+    """
+    最適化設定を探索空間・スコア計算プランに変換
+
+    モデル索引に記録された学習時の説明変数・目的変数と照合し、対応しない設定は試行前にエラーとする
+    （モデルはロードしないため、リクエスト受付時の検証にも使える）。
+
+    Returns:
+        tuple: (SearchSpace, ScoringPlan)
+
+    Raises:
+        ValueError: モデルが見つからない、または設定がモデルと一致しない場合
+    """
+    entry = lookup_models(mlflow_id)
+    if entry is None or not entry['models']:
+        raise ValueError(f"No model found for MLflow ID: {mlflow_id}")
+
+    search_space = compile_search_space(param_configs, entry.get('x_list'))
+    scoring_plan = compile_scoring_plan(
+        target_param_configs,
+        [model_info.get('target') for model_info in entry['models']]
+    )
+    return search_space, scoring_plan
+
+
+def resolve_batch_size(batch_size):
+    """
+    1回の予測でまとめて評価する候補数を検証し、既定値を補完
+
+    Returns:
+        int: 候補数（Noneの場合はML_OPTIMIZE_BATCH_SIZE）
+
+    Raises:
+        ValueError: 1以上の整数でない場合
+    """
+    if batch_size is None:
+        return max(1, OPTIMIZE_BATCH_SIZE)
+    if isinstance(batch_size, bool) or not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+    return batch_size
+
+
+def resolve_sweep_options(sweep):
+    """
+    網羅評価の設定を検証し、既定値を補完
+
+    Returns:
+        dict or None: {"method", "n_samples", "seed_trials"}（網羅評価しない場合はNone）
+
+    Raises:
+        ValueError: 設定が不正な場合
+    """
+    if not sweep:
+        return None
+    if sweep is True:
+        sweep = {}
+    if not isinstance(sweep, dict):
+        raise ValueError("sweep must be true or an object with 'method', 'n_samples' and 'seed_trials'")
+
+    method = str(sweep.get("method", "sobol")).lower()
+    if method not in ("sobol", "lhs"):
+        raise ValueError(f"Unknown sweep method: {method} (sobol or lhs)")
+    try:
+        n_samples = int(sweep.get("n_samples", OPTIMIZE_SWEEP_SAMPLES))
+        seed_trials = int(sweep.get("seed_trials", OPTIMIZE_SWEEP_SEED_TRIALS))
+    except (TypeError, ValueError):
+        raise ValueError("sweep n_samples and seed_trials must be integers")
+    if not 0 < n_samples <= OPTIMIZE_SWEEP_MAX_SAMPLES:
+        raise ValueError(f"sweep n_samples must be between 1 and {OPTIMIZE_SWEEP_MAX_SAMPLES}")
+    if seed_trials < 0:
+        raise ValueError("sweep seed_trials must not be negative")
+    return {"method": method, "n_samples": n_samples, "seed_trials": seed_trials}
+
+
+def _run_sweep(search_space, scoring_plan, loaded_models, sweep):
+    """
+    探索空間全体に準乱数（Sobol列・ラテン超方格）の候補を配置し、まとめて予測・スコア計算
+
+    Sobol列は均一性が保たれるよう件数を2のべき乗に切り上げる。
+
+    Returns:
+        tuple: (候補の行列, 候補数 x 目的変数数のスコア)
+    """
+    dimension = len(search_space.names)
+    if sweep['method'] == 'sobol':
+        sampler = qmc.Sobol(d=dimension, scramble=True, seed=42)
+        unit = sampler.random_base2(m=int(np.ceil(np.log2(sweep['n_samples']))))
+    else:
+        unit = qmc.LatinHypercube(d=dimension, seed=42).random(n=sweep['n_samples'])
+    matrix = search_space.from_unit(unit)
+
+    scores = []
+    for start in range(0, len(matrix), OPTIMIZE_SWEEP_BATCH_ROWS):
+        input_df = search_space.to_frame(matrix[start:start + OPTIMIZE_SWEEP_BATCH_ROWS])
+        predictions = {idx: loaded_models[idx].predict(input_df) for idx in scoring_plan.required_models}
+        scores.append(scoring_plan.score(predictions))
+    return matrix, np.vstack(scores)
+
+
+def _select_seed_rows(costs, seed_trials):
+    """
+    TPEに渡す網羅評価の候補を選択
+
+    良い順のseed_trials件に加え、同数をそれ以外からランダムに選ぶ
+    （良い候補のみだとTPEが良い領域と悪い領域を区別できないため）。
+    """
+    best = rank_candidates(costs, seed_trials)
+    rest = np.setdiff1d(np.flatnonzero(~np.isnan(costs).any(axis=1)), best)
+    rng = np.random.default_rng(42)
+    contrast = rng.choice(rest, size=min(len(best), len(rest)), replace=False)
+    return np.concatenate([best, contrast]).astype(np.int64)
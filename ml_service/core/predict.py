@@ -2,22 +2,42 @@
 Prediction Module
 Streamlit予測コードをリファクタリング
 """
+import hashlib
 import pandas as pd
 import numpy as np
-import mlflow
-import mlflow.pyfunc
 import shap
 import pickle
 import os
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import *
-from core.utils import load_dataframe, save_dataframe
-
-
-def predict_model(mlflow_id, x_list, input_data, run_id=None, socketio=None):
+from core.utils import load_dataframe, save_dataframe, coerce_numeric_columns, iter_dataframe_chunks
+from core.registry import load_models, lookup_models, load_explainers
+from core.cache import prediction_cache
+from core.batching import MicroBatcher
+from core.sharding import predict_sharded
+
+# 同期予測の処理時間（直近分のみ保持）
+_sync_latencies = deque(maxlen=SYNC_PREDICT_LATENCY_WINDOW)
+_sync_latency_lock = threading.Lock()
+
+# 同一モデルへの同時予測リクエストのバッチ化
+_batcher = MicroBatcher(
+    lambda key, df: _predict_batch(key, df),
+    max_batch_rows=MICRO_BATCH_MAX_ROWS,
+    max_wait=MICRO_BATCH_MAX_WAIT_MS / 1000
+)
+
+
+def predict_model(mlflow_id, x_list, input_data, run_id=None, socketio=None,
+                  shap_options=None, on_predictions=None, stream=False):
     """
     予測実行
 
@@ -27,9 +47,15 @@ def predict_model(mlflow_id, x_list, input_data, run_id=None, socketio=None):
         input_data: 予測用データ（DataFrame or dict or list of dict）
         run_id: Prediction Run ID（オプション）
         socketio: WebSocket通知用
+        shap_options: SHAP計算の対象行（オプション、未指定ならSHAPは計算しない）
+            例: {"rows": [0, 5, 12]} / {"sample_size": 100, "seed": 0} / True（既定件数をサンプリング）
+        on_predictions: 予測結果の確定時（SHAP計算前）に結果dictを渡して呼ぶコールバック
+        stream: Trueの場合、ファイル入力をチャンク単位で予測して結果CSVに追記する
+            （結果の "predictions" は先頭PREDICT_PREVIEW_ROWS行のみ）
 
     Returns:
-        dict: 予測結果
+        dict: 予測結果（SHAPを計算した場合は "shap" に対象行と保存先を含む。
+            SHAPの計算に失敗しても予測結果は返し、"shap" の "error" にエラー内容を格納する）
     """
 
     def notify_status(message, progress=None):
@@ -43,120 +69,35 @@ def predict_model(mlflow_id, x_list, input_data, run_id=None, socketio=None):
             })
 
     try:
-        notify_status("予測データ準備中...", 0)
+        if stream:
+            result = _predict_file_streaming(mlflow_id, x_list, input_data, run_id, shap_options, notify_status)
+            if on_predictions:
+                on_predictions(result)
+            return result
 
-        # 入力データをDataFrameに変換
-        if isinstance(input_data, dict):
-            df = pd.DataFrame([input_data])
-        elif isinstance(input_data, list):
-            df = pd.DataFrame(input_data)
-        elif isinstance(input_data, pd.DataFrame):
-            df = input_data.copy()
-        elif isinstance(input_data, str):
-            # ファイルパスの場合
-            df = load_dataframe(input_data)
-        else:
-            raise ValueError(f"Unsupported input_data type: {type(input_data)}")
+        notify_status("予測データ準備中...", 0)
 
-        # 必要なカラムのみ抽出
-        df = df[x_list]
-        df = df.fillna(0)
+        df, engine = _prepare_input(input_data, x_list)
 
-        notify_status(f"予測データ準備完了（{len(df)}行）", 10)
+        if engine:
+            notify_status(f"予測データ準備完了（{len(df)}行, engine: {engine}）", 10)
+        else:
+            notify_status(f"予測データ準備完了（{len(df)}行）", 10)
 
-        # MLflowからモデルをロード
-        notify_status("モデルロード中...", 20)
+        # SHAP対象行は予測前に検証する（不正な指定で予測を無駄にしない）
+        shap_rows = _select_shap_rows(shap_options, len(df)) if shap_options else None
 
         # 複数の目的変数に対応
         result_df = df.copy()
-        shap_values_dict = {}
-
-        # ローカル環境ではファイルから直接読み込む
-        if not is_databricks_environment():
-            # ローカルのartifact_pathからモデルを探索
-            result_base = f"{get_result_path()}"
-
-            # mlflow_idからrun_idを検索
-            model_path = None
-            for run_dir in os.listdir(result_base):
-                run_path = os.path.join(result_base, run_dir)
-                if os.path.isdir(run_path):
-                    # mlflow_idディレクトリを確認
-                    mlflow_dir = os.path.join(run_path, mlflow_id)
-                    if os.path.exists(mlflow_dir):
-                        model_path = run_path
-                        break
-                    # modelsディレクトリ内を探索
-                    models_dir = os.path.join(run_path, "models")
-                    if os.path.isdir(models_dir):
-                        for m in os.listdir(models_dir):
-                            pkl_path = os.path.join(models_dir, m, "artifacts", "model.pkl")
-                            if os.path.exists(pkl_path):
-                                model_path = run_path
-                                break
-                    if model_path:
-                        break
-
-            if not model_path:
-                raise ValueError(f"No model found for MLflow ID: {mlflow_id}")
-
-            # モデルをロード
-            models_dir = os.path.join(model_path, "models")
-            model_idx = 0
-            for model_name in sorted(os.listdir(models_dir)):
-                pkl_path = os.path.join(models_dir, model_name, "artifacts", "model.pkl")
-                if os.path.exists(pkl_path):
-                    notify_status(f"モデル {model_idx} をロード中...", 30 + model_idx * 20)
-                    with open(pkl_path, 'rb') as f:
-                        model = pickle.load(f)
-
-                    # 予測実行
-                    predictions = model.predict(df)
-                    result_df[f"predicted_target_{model_idx}"] = predictions
-
-                    # SHAP値計算
-                    try:
-                        explainer = shap.Explainer(model.predict, df)
-                        shap_values = explainer(df)
-                        shap_values_dict[f"target_{model_idx}"] = shap_values
-                    except Exception as e:
-                        print(f"[WARN] SHAP calculation failed for model {model_idx}: {e}")
-
-                    model_idx += 1
-        else:
-            # Databricks環境ではMLflowから読み込む
-            mlflow.set_tracking_uri(get_mlflow_tracking_uri())
-            model_idx = 0
-            while True:
-                try:
-                    model_uri = f'runs:/{mlflow_id}/trained_model_{model_idx}'
-                    loaded_model = mlflow.pyfunc.load_model(model_uri)
-
-                    notify_status(f"モデル {model_idx} で予測中...", 30 + model_idx * 30)
-
-                    # 予測実行
-                    predictions = loaded_model.predict(df)
-                    result_df[f"predicted_target_{model_idx}"] = predictions
-
-                    # SHAP値計算
-                    try:
-                        explainer = shap.Explainer(loaded_model.predict, df)
-                        shap_values = explainer(df)
-                        shap_values_dict[f"target_{model_idx}"] = shap_values
-                    except Exception as e:
-                        print(f"[WARN] SHAP calculation failed for model {model_idx}: {e}")
-
-                    model_idx += 1
-
-                except Exception as e:
-                    # モデルが見つからなくなったら終了
-                    if "does not exist" in str(e) or "not found" in str(e).lower():
-                        break
-                    else:
-                        raise e
-
-        if model_idx == 0:
-            raise ValueError(f"No models found for MLflow run: {mlflow_id}")
+
+        # 予測実行（同じ入力の予測結果はキャッシュから返し、少量データは同時リクエストとまとめて予測）
+        notify_status("予測中...", 30)
+        predictions = _predict_targets(mlflow_id, x_list, df)
+
+        model_idx = 0
+        for values in predictions:
+            result_df[f"predicted_target_{model_idx}"] = values
+            model_idx += 1
 
         notify_status("予測結果保存中...", 90)
 
@@ -170,21 +111,345 @@ def predict_model(mlflow_id, x_list, input_data, run_id=None, socketio=None):
             result_csv = f"{result_path}/prediction_result.csv"
             save_dataframe(result_df, result_csv)
 
-            # SHAP保存
-            if shap_values_dict:
-                shap_path = f"{result_path}/shap_values_dict.pkl"
-                with open(shap_path, "wb") as f:
-                    pickle.dump(shap_values_dict, f)
-
         notify_status("予測完了！", 100)
 
-        return {
+        result = {
             "predictions": result_df.to_dict(orient='records'),
             "num_models": model_idx,
             "num_samples": len(result_df),
             "result_path": result_path if run_id else None
         }
+        if on_predictions:
+            on_predictions(result)
+
+        # SHAP値計算（指定された行のみ、予測結果の確定後に実施）
+        if shap_rows is not None:
+            notify_status(f"SHAP値計算中（{len(shap_rows)}行）...", None)
+            try:
+                _, models = load_models(mlflow_id)
+                shap_values_dict = _explain_rows(models, df, shap_rows, load_explainers(mlflow_id))
+
+                shap_path = None
+                if result_path and shap_values_dict:
+                    shap_path = f"{result_path}/shap_values_dict.pkl"
+                    with open(shap_path, "wb") as f:
+                        pickle.dump({'rows': shap_rows.tolist(), **shap_values_dict}, f)
+
+                result["shap"] = {
+                    "rows": shap_rows.tolist(),
+                    "targets": list(shap_values_dict.keys()),
+                    "path": shap_path
+                }
+                notify_status("SHAP値計算完了", None)
+            except Exception as e:
+                # 予測結果は確定済みのため、SHAPの失敗で予測全体を失敗にしない
+                print(f"[ERROR] SHAP calculation failed: {e}")
+                print(traceback.format_exc())
+                result["shap"] = {
+                    "rows": shap_rows.tolist(),
+                    "targets": [],
+                    "path": None,
+                    "error": str(e)
+                }
+                notify_status(f"SHAP値計算失敗: {str(e)}", None)
+
+        return result
 
     except Exception as e:
         notify_status(f"エラー発生: {str(e)}", None)
         raise e
+
+
+def predict_sync(mlflow_id, x_list, input_data):
+    """
+    少量データの同期予測（HTTPレスポンスで結果を返す用）
+
+    キャッシュ済みモデルでその場で予測し、結果ファイルの保存・SHAP計算は行わない。
+    同時リクエストとのバッチ化は待たない（ML_SYNC_PREDICT_MICRO_BATCH=trueの場合のみバッチ化する）。
+
+    Args:
+        mlflow_id: MLflow Run ID
+        x_list: 説明変数リスト
+        input_data: 予測用データ（dict or list of dict）
+
+    Returns:
+        dict: 予測結果（処理時間を含む）
+
+    Raises:
+        ValueError: 入力形式が不正、または行数が上限を超える場合
+    """
+    started = time.perf_counter()
+
+    if not isinstance(input_data, (dict, list)):
+        raise ValueError("input_data must be a dict or a list of dicts for synchronous prediction")
+    num_rows = 1 if isinstance(input_data, dict) else len(input_data)
+    if num_rows > SYNC_PREDICT_MAX_ROWS:
+        raise ValueError(
+            f"Too many rows for synchronous prediction: {num_rows} (max {SYNC_PREDICT_MAX_ROWS})"
+        )
+
+    df, _ = _prepare_input(input_data, x_list)
+    # バッチ化の待ち時間がレイテンシに加算されないよう、既定ではその場で予測する
+    predictions = _predict_targets(mlflow_id, x_list, df, batch=SYNC_PREDICT_MICRO_BATCH)
+
+    result_df = df.copy()
+    for model_idx, values in enumerate(predictions):
+        result_df[f"predicted_target_{model_idx}"] = values
+
+    latency_ms = (time.perf_counter() - started) * 1000
+    with _sync_latency_lock:
+        _sync_latencies.append(latency_ms)
+
+    return {
+        "predictions": result_df.to_dict(orient='records'),
+        "num_models": len(predictions),
+        "num_samples": len(result_df),
+        "latency_ms": latency_ms
+    }
+
+
+def get_prediction_result_path(run_id):
+    """
+    予測Runの結果CSVのパスを取得
+
+    Raises:
+        ValueError: run_idが不正な場合
+        FileNotFoundError: 結果が存在しない場合
+    """
+    if not run_id or os.path.basename(run_id) != run_id or run_id in ('.', '..'):
+        raise ValueError(f"Invalid run_id: {run_id}")
+    result_csv = f"{get_result_path()}/{run_id}/prediction_result.csv"
+    if not os.path.exists(result_csv):
+        raise FileNotFoundError(f"Prediction result not found: {run_id}")
+    return result_csv
+
+
+def get_sync_latency_stats():
+    """同期予測の処理時間統計（直近の呼び出し分、ミリ秒）"""
+    with _sync_latency_lock:
+        latencies = np.array(_sync_latencies, dtype=np.float64)
+    if latencies.size == 0:
+        return {'count': 0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'count': int(latencies.size),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(latencies.max())
+    }
+
+
+def get_batching_stats():
+    """予測リクエストのバッチ化統計"""
+    return _batcher.stats()
+
+
+def _predict_file_streaming(mlflow_id, x_list, file_path, run_id, shap_options, notify_status):
+    """
+    ファイル入力をチャンク単位で読み込み・予測し、結果CSVに順次追記
+
+    メモリ使用量はチャンクサイズのみに依存し、入力ファイルの大きさに依存しない。
+    """
+    if not isinstance(file_path, str):
+        raise ValueError("Streaming prediction requires a file path input")
+    if not run_id:
+        raise ValueError("Streaming prediction requires a run_id to write results")
+    if shap_options:
+        raise ValueError("SHAP is not supported in streaming prediction")
+
+    notify_status("モデルロード中...", 0)
+    _, models = load_models(mlflow_id)
+
+    result_path = f"{get_result_path()}/{run_id}"
+    os.makedirs(result_path, exist_ok=True)
+    result_csv = f"{result_path}/prediction_result.csv"
+    tmp_csv = f"{result_csv}.tmp"
+
+    num_samples = 0
+    num_chunks = 0
+    preview = []
+    try:
+        for chunk in iter_dataframe_chunks(file_path, columns=x_list):
+            progress = chunk.attrs.get('progress', 0)
+            df, _ = coerce_numeric_columns(chunk, x_list, fill_value=0)
+
+            result_df = df.copy()
+            for model_idx, values in enumerate(_predict_targets(mlflow_id, x_list, df)):
+                result_df[f"predicted_target_{model_idx}"] = values
+
+            # BOMは先頭チャンクのみ書き込む
+            if num_chunks == 0:
+                result_df.to_csv(tmp_csv, index=False, encoding='utf-8-sig')
+            else:
+                result_df.to_csv(tmp_csv, index=False, encoding='utf-8', mode='a', header=False)
+
+            if len(preview) < PREDICT_PREVIEW_ROWS:
+                preview.extend(result_df.head(PREDICT_PREVIEW_ROWS - len(preview)).to_dict(orient='records'))
+            num_samples += len(result_df)
+            num_chunks += 1
+            notify_status(
+                f"チャンク {num_chunks} 予測完了（累計 {num_samples}行）",
+                5 + int(progress * 90)
+            )
+
+        if num_chunks == 0:
+            raise ValueError(f"No rows in input file: {file_path}")
+        os.replace(tmp_csv, result_csv)
+    finally:
+        if os.path.exists(tmp_csv):
+            os.remove(tmp_csv)
+
+    notify_status("予測完了！", 100)
+
+    return {
+        "predictions": preview,
+        "num_models": len(models),
+        "num_samples": num_samples,
+        "num_chunks": num_chunks,
+        "streamed": True,
+        "result_path": result_path
+    }
+
+
+def _predict_targets(mlflow_id, x_list, df, batch=True):
+    """
+    全モデルで予測（目的変数の順の予測値配列のリスト）
+
+    PREDICTION_CACHE_MAX_ROWS行以下の入力は、同じモデル・説明変数・入力値の予測結果をキャッシュから返す。
+    batch=Trueかつバッチ上限未満の行数であれば、同じモデルへの同時リクエストとまとめて予測する。
+    PARALLEL_PREDICT_MIN_ROWS行以上であれば、プロセスプールで行を分割して並列に予測する。
+    """
+    cache_key = None
+    if len(df) <= PREDICTION_CACHE_MAX_ROWS:
+        entry = lookup_models(mlflow_id)
+        version = entry.get('registered_at') if entry else None
+        cache_key = (mlflow_id, version, tuple(x_list), _fingerprint(df))
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    predictions = None
+    if batch and MICRO_BATCH_MAX_WAIT_MS > 0 and len(df) < MICRO_BATCH_MAX_ROWS:
+        predictions = _batcher.submit((mlflow_id, tuple(x_list)), df)
+    elif PARALLEL_PREDICT_WORKERS > 1 and len(df) >= PARALLEL_PREDICT_MIN_ROWS:
+        try:
+            predictions = predict_sharded(mlflow_id, df)
+        except BrokenProcessPool as e:
+            print(f"[WARN] Prediction worker pool failed, predicting in-process: {e}")
+    if predictions is None:
+        _, models = load_models(mlflow_id)
+        predictions = [model.predict(df) for model in models]
+
+    predictions = [np.asarray(values) for values in predictions]
+    if cache_key is not None:
+        # キャッシュ上の配列を呼び出し元が書き換えないよう読み取り専用にする
+        for values in predictions:
+            values.setflags(write=False)
+        prediction_cache.put(cache_key, predictions, sum(values.nbytes for values in predictions))
+    return predictions
+
+
+def _fingerprint(df):
+    """入力データのハッシュ（カラム名・行数・値が同じなら一致）"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((list(df.columns), df.shape)).encode('utf-8'))
+    digest.update(np.ascontiguousarray(df.to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def _predict_batch(key, df):
+    """まとめたリクエストを1回のpredictで処理（MicroBatcherから呼ばれる）"""
+    mlflow_id, _ = key
+    _, models = load_models(mlflow_id)
+    return [model.predict(df) for model in models]
+
+
+def _select_shap_rows(shap_options, num_rows):
+    """
+    SHAP計算の対象行（昇順の行番号配列）を決定
+
+    Raises:
+        ValueError: 行番号が範囲外、または指定形式が不正な場合
+    """
+    if shap_options is True:
+        shap_options = {}
+    if not isinstance(shap_options, dict):
+        raise ValueError("shap must be true or an object with 'rows' or 'sample_size'")
+
+    if 'rows' in shap_options:
+        rows = shap_options['rows']
+        # 小数の行番号を切り捨てて別の行を計算しないよう、整数以外は受け付けない
+        if not isinstance(rows, (list, tuple)) or any(
+            isinstance(row, bool) or not isinstance(row, (int, np.integer)) for row in rows
+        ):
+            raise ValueError("SHAP rows must be a list of integer row indices")
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        if rows.size and (rows[0] < 0 or rows[-1] >= num_rows):
+            raise ValueError(f"SHAP row index out of range (0-{num_rows - 1})")
+        return rows
+
+    sample_size = int(shap_options.get('sample_size', SHAP_DEFAULT_SAMPLE_SIZE))
+    if sample_size >= num_rows:
+        return np.arange(num_rows)
+    rng = np.random.default_rng(shap_options.get('seed', 0))
+    return np.sort(rng.choice(num_rows, size=sample_size, replace=False))
+
+
+def _explain_rows(models, df, rows, explainers=None):
+    """
+    指定行のSHAP値を目的変数ごとに計算
+
+    学習時に保存したExplainerがあればそれを使い、ない場合（Explainer保存前の学習結果）のみ
+    入力全体からSHAP_BACKGROUND_SIZE行をサンプリングした背景データでExplainerを作成する。
+    """
+    target_rows = df.iloc[rows]
+    background = None
+
+    shap_values_dict = {}
+    for model_idx, model in enumerate(models):
+        try:
+            explainer = explainers[model_idx] if explainers else None
+            if explainer is None:
+                if background is None:
+                    background = df.sample(n=SHAP_BACKGROUND_SIZE, random_state=0) if len(df) > SHAP_BACKGROUND_SIZE else df
+                explainer = shap.Explainer(model.predict, background)
+            if isinstance(explainer, shap.TreeExplainer):
+                # float32で分岐するモデルでは加法性の検証が丸め誤差で失敗しうるため行わない
+                shap_values_dict[f"target_{model_idx}"] = explainer(target_rows, check_additivity=False)
+            else:
+                shap_values_dict[f"target_{model_idx}"] = explainer(target_rows)
+        except Exception as e:
+            print(f"[WARN] SHAP calculation failed for model {model_idx}: {e}")
+    return shap_values_dict
+
+
+def _prepare_input(input_data, x_list):
+    """
+    入力データを説明変数のみの数値DataFrameに変換
+
+    Returns:
+        tuple: (DataFrame, 読み込みエンジン名 or None)
+    """
+    if isinstance(input_data, dict):
+        df = pd.DataFrame([input_data])
+    elif isinstance(input_data, list):
+        df = pd.DataFrame(input_data)
+    elif isinstance(input_data, pd.DataFrame):
+        # coerce_numeric_columnsは元のDataFrameを変更しないためコピー不要
+        df = input_data
+    elif isinstance(input_data, str):
+        # ファイルパスの場合（説明変数のみ読み込む）
+        df = load_dataframe(
+            input_data,
+            columns=x_list,
+            dtype={col: 'float64' for col in x_list}
+        )
+    else:
+        raise ValueError(f"Unsupported input_data type: {type(input_data)}")
+
+    engine = df.attrs.get('load_engine')
+
+    # 必要なカラムのみ抽出（数値変換・欠損値処理）
+    df, _ = coerce_numeric_columns(df, x_list, fill_value=0)
+    return df, engine
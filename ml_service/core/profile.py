@@ -0,0 +1,145 @@
+"""
+Dataset statistics profile
+データセット保存・初回読み込み時に計算する統計プロファイル
+"""
+import json
+import numpy as np
+import pandas as pd
+import os
+import threading
+from datetime import datetime
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PROFILE_HISTOGRAM_BINS, PROFILE_TOP_VALUES
+
+# プロファイルに含める分位点
+PROFILE_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# 非欠損値のうち数値に変換できる割合がこれを超えるカラムを数値カラムとみなす（ML Appと同じ基準）
+NUMERIC_RATIO_THRESHOLD = 0.8
+
+
+def profile_path(file_path):
+    """CSVに対応するプロファイルのパス"""
+    return os.path.splitext(file_path)[0] + '.profile.json'
+
+
+def _to_float(value):
+    """JSONに出力できるfloatに変換（NaN/infはNone）"""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def _profile_column(series):
+    """1カラム分の統計情報"""
+    count = int(series.notna().sum())
+    info = {
+        'dtype': str(series.dtype),
+        'count': count,
+        'nulls': int(len(series) - count)
+    }
+
+    if series.dtype.kind in 'iufb':
+        numeric = series.astype(np.float64)
+    else:
+        numeric = pd.to_numeric(series, errors='coerce')
+    values = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+    values = values[np.isfinite(values)]
+
+    is_numeric = len(values) > count * NUMERIC_RATIO_THRESHOLD
+    info['type'] = 'numeric' if is_numeric else 'categorical'
+
+    if len(values):
+        quantiles = np.quantile(values, PROFILE_QUANTILES)
+        hist_counts, bin_edges = np.histogram(values, bins=PROFILE_HISTOGRAM_BINS)
+        info.update({
+            'numeric_count': int(len(values)),
+            'min': _to_float(values.min()),
+            'max': _to_float(values.max()),
+            'mean': _to_float(values.mean()),
+            'std': _to_float(values.std(ddof=1)) if len(values) > 1 else None,
+            'median': _to_float(np.median(values)),
+            'quantiles': {str(q): _to_float(v) for q, v in zip(PROFILE_QUANTILES, quantiles)},
+            'histogram': {
+                'bin_edges': [_to_float(v) for v in bin_edges],
+                'counts': hist_counts.tolist()
+            }
+        })
+
+    if not is_numeric:
+        value_counts = series.dropna().astype(str).value_counts()
+        info['unique'] = int(len(value_counts))
+        info['top_values'] = [
+            {'value': value, 'count': int(n)}
+            for value, n in value_counts.head(PROFILE_TOP_VALUES).items()
+        ]
+
+    return info
+
+
+def compute_profile(df):
+    """
+    DataFrameの統計プロファイルを計算
+
+    Args:
+        df: pandas DataFrame（全カラム）
+
+    Returns:
+        dict: 行数・列数とカラムごとの統計情報
+            （件数・欠損数・最小/最大/平均/中央値/分位点・ヒストグラム・数値/カテゴリ分類）
+    """
+    columns = {str(col): _profile_column(df[col]) for col in df.columns}
+    return {
+        'rows': int(len(df)),
+        'num_columns': int(len(df.columns)),
+        'numeric_columns': [col for col, info in columns.items() if info['type'] == 'numeric'],
+        'categorical_columns': [col for col, info in columns.items() if info['type'] == 'categorical'],
+        'columns': columns,
+        'created_at': datetime.now().isoformat()
+    }
+
+
+def write_profile(file_path, profile, stat):
+    """
+    プロファイルをCSVの隣に保存（失敗しても呼び出し元の処理には影響させない）
+
+    Args:
+        file_path: 元CSVのパス
+        profile: compute_profileの結果
+        stat: 計算前に取得した元CSVのos.stat結果
+    """
+    path = profile_path(file_path)
+    # 同じプロセスの別スレッドが同時に保存しても一時ファイルが衝突しないようスレッドIDも含める
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        data = dict(profile, source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        print(f"[INFO] Wrote dataset profile: {path}")
+    except Exception as e:
+        print(f"[WARN] Failed to write dataset profile {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_profile(file_path):
+    """
+    保存済みプロファイルを読み込み（存在しない・CSVが更新されている場合はNone）
+    """
+    path = profile_path(file_path)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            profile = json.load(f)
+    except Exception as e:
+        print(f"[WARN] Failed to read dataset profile {path}: {e}")
+        return None
+
+    stat = os.stat(file_path)
+    if profile.get('source_size') != stat.st_size or profile.get('source_mtime_ns') != stat.st_mtime_ns:
+        return None
+    return profile
@@ -0,0 +1,359 @@
+"""
+Model Registry Index
+学習済みモデルの索引（mlflow_id → モデル成果物パス）
+"""
+import json
+import os
+import pickle
+import threading
+from datetime import datetime
+
+import mlflow
+import mlflow.pyfunc
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import *
+from core.cache import model_cache, prediction_cache
+from core.compiled import maybe_compile
+
+# 索引ファイル名（結果保存パス直下に追記専用で保存）
+REGISTRY_FILENAME = "model_registry.jsonl"
+
+_lock = threading.Lock()
+_index = {}
+_index_path = None
+_index_offset = 0
+
+
+def _registry_path():
+    return os.path.join(get_result_path(), REGISTRY_FILENAME)
+
+
+def _refresh_index():
+    """
+    索引ファイルの追記分のみを読み込んでメモリ上の索引を更新
+
+    同じmlflow_idが複数回登録されている場合は最後の登録を有効とする。
+    ファイルが置き換えられた（小さくなった）場合は先頭から読み直す。
+    """
+    global _index, _index_path, _index_offset
+
+    path = _registry_path()
+    if path != _index_path:
+        _index, _index_path, _index_offset = {}, path, 0
+
+    if not os.path.exists(path):
+        return
+    size = os.path.getsize(path)
+    if size < _index_offset:
+        _index, _index_offset = {}, 0
+    if size == _index_offset:
+        return
+
+    with open(path, 'rb') as f:
+        f.seek(_index_offset)
+        data = f.read(size - _index_offset)
+
+    # 書き込み途中の最終行は次回に読む
+    consumed = data.rfind(b'\n') + 1
+    for line in data[:consumed].splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            print(f"[WARN] Skipping broken model registry line: {line[:100]!r}")
+            continue
+        _index[entry['mlflow_id']] = entry
+    _index_offset += consumed
+
+
+def register_models(mlflow_id, models, **metadata):
+    """
+    学習済みモデルを索引に登録
+
+    Args:
+        mlflow_id: MLflow Run ID
+        models: モデル情報のリスト（目的変数の順）
+            例: [{"index": 0, "target": "hardness", "model_uri": "models:/m-...", "local_path": ".../model.pkl"}]
+        **metadata: run_id, model_name, x_list など付加情報
+
+    Returns:
+        dict: 登録したエントリ
+    """
+    entry = dict(metadata)
+    entry.update({
+        'mlflow_id': mlflow_id,
+        'models': sorted(models, key=lambda m: m['index']),
+        'registered_at': datetime.now().isoformat()
+    })
+    line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+
+    with _lock:
+        path = _registry_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 1エントリ1行を1回のwriteで追記する
+        with open(path, 'ab') as f:
+            f.write(line)
+        _refresh_index()
+
+    # 再登録時は古いモデルと予測結果をキャッシュから破棄
+    invalidate_models(mlflow_id)
+    return entry
+
+
+def lookup_models(mlflow_id):
+    """
+    mlflow_idに対応する登録エントリを取得
+
+    索引にない場合（索引導入前の学習結果）は結果ディレクトリを探索し、見つかれば索引に追加する。
+
+    Returns:
+        dict or None: 登録エントリ
+    """
+    with _lock:
+        _refresh_index()
+        entry = _index.get(mlflow_id)
+    if entry is not None:
+        return entry
+
+    if is_databricks_environment():
+        models = _probe_mlflow_models(mlflow_id)
+    else:
+        models = _scan_local_models(mlflow_id)
+    if not models:
+        return None
+
+    print(f"[INFO] Backfilling model registry for MLflow ID: {mlflow_id}")
+    return register_models(mlflow_id, models, source='scan')
+
+
+def list_models(limit=None):
+    """登録日時の新しい順にエントリを返す"""
+    with _lock:
+        _refresh_index()
+        entries = list(_index.values())
+    entries.sort(key=lambda e: e.get('registered_at', ''), reverse=True)
+    return entries[:limit] if limit else entries
+
+
+def load_model(model_info):
+    """
+    登録エントリのモデル1件をロード
+
+    ローカルのpickleがあれば直接読み込み、なければMLflowからロードする。
+    決定木アンサンブルは照合済みの配列表現に変換して返す（ML_COMPILE_TREE_MODELS）。
+    """
+    local_path = model_info.get('local_path')
+    if local_path and os.path.exists(local_path):
+        with open(local_path, 'rb') as f:
+            return maybe_compile(pickle.load(f))
+    return mlflow.pyfunc.load_model(model_info['model_uri'])
+
+
+def load_models(mlflow_id):
+    """
+    mlflow_idの全モデルを目的変数の順にロード
+
+    ロード済みのモデルはプロセス内キャッシュから返す。
+
+    Returns:
+        tuple: (登録エントリ, モデルのリスト)
+
+    Raises:
+        ValueError: モデルが見つからない場合
+    """
+    entry = lookup_models(mlflow_id)
+    if entry is None or not entry['models']:
+        raise ValueError(f"No model found for MLflow ID: {mlflow_id}")
+
+    models = []
+    for model_info in entry['models']:
+        key = (mlflow_id, model_info['index'])
+        model = model_cache.get(key)
+        if model is None:
+            model = load_model(model_info)
+            model_cache.put(key, model, _estimate_model_bytes(model, model_info))
+        models.append(model)
+    return entry, models
+
+
+def load_explainer(model_info):
+    """
+    登録エントリのモデル1件の学習時に保存したSHAP Explainerをロード
+
+    Returns:
+        shap.Explainer or None: 保存されていない場合（Explainer保存前の学習結果）はNone
+    """
+    local_path = model_info.get('explainer_path')
+    if not (local_path and os.path.exists(local_path)):
+        if not model_info.get('explainer_uri'):
+            return None
+        local_path = mlflow.artifacts.download_artifacts(model_info['explainer_uri'])
+    with open(local_path, 'rb') as f:
+        return pickle.load(f)
+
+
+def load_explainers(mlflow_id):
+    """
+    mlflow_idの全モデルのSHAP Explainerを目的変数の順にロード
+
+    ロード済みのExplainerはモデルと同じプロセス内キャッシュから返す。
+
+    Returns:
+        list: Explainerのリスト（保存されていないモデル・ロードに失敗したモデルはNone）
+    """
+    entry = lookup_models(mlflow_id)
+    if entry is None:
+        return []
+
+    explainers = []
+    for model_info in entry['models']:
+        key = (mlflow_id, model_info['index'], 'explainer')
+        explainer = model_cache.get(key)
+        if explainer is None:
+            try:
+                explainer = load_explainer(model_info)
+            except Exception as e:
+                print(f"[WARN] Failed to load SHAP explainer for {mlflow_id}/{model_info['index']}: {e}")
+                explainer = None
+            if explainer is not None:
+                model_cache.put(key, explainer, _estimate_explainer_bytes(explainer, model_info))
+        explainers.append(explainer)
+    return explainers
+
+
+def invalidate_models(mlflow_id=None):
+    """
+    ロード済みモデル・Explainerとその予測結果をキャッシュから破棄（mlflow_id=Noneの場合は全件）
+
+    Returns:
+        int: 破棄したモデル数
+    """
+    if mlflow_id is None:
+        prediction_cache.invalidate()
+        return model_cache.invalidate()
+    prediction_cache.invalidate(lambda key: key[0] == mlflow_id)
+    return model_cache.invalidate(lambda key: key[0] == mlflow_id)
+
+
+def _estimate_model_bytes(model, model_info):
+    """キャッシュ上限の判定に使うモデルのおおよそのサイズ（pickleサイズで近似）"""
+    # 配列表現に変換したモデルは元のモデルとノード配列の両方を保持する
+    compiled_bytes = getattr(model, 'nbytes', 0)
+    local_path = model_info.get('local_path')
+    if local_path and os.path.exists(local_path):
+        return os.path.getsize(local_path) + compiled_bytes
+    try:
+        return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(model)
+
+
+def _estimate_explainer_bytes(explainer, model_info):
+    """キャッシュ上限の判定に使うExplainerのおおよそのサイズ（保存ファイルのサイズで近似）"""
+    local_path = model_info.get('explainer_path')
+    if local_path and os.path.exists(local_path):
+        return os.path.getsize(local_path)
+    try:
+        return len(pickle.dumps(explainer, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(explainer)
+
+
+def resolve_local_model_path(model_info):
+    """
+    mlflow.*.log_modelの戻り値からローカルのmodel.pklのパスを取得（ローカル環境以外はNone）
+    """
+    if is_databricks_environment():
+        return None
+
+    artifact_path = model_info.artifact_path
+    if not os.path.isabs(artifact_path):
+        # MLflow 2系: Run配下の相対パス
+        artifact_path = mlflow.get_artifact_uri(artifact_path)
+        if artifact_path.startswith('file://'):
+            artifact_path = artifact_path[len('file://'):]
+
+    pkl_path = os.path.join(artifact_path, 'model.pkl')
+    return pkl_path if os.path.exists(pkl_path) else None
+
+
+def _scan_local_models(mlflow_id):
+    """
+    結果ディレクトリから指定Runのモデルを探索（索引導入前の学習結果用）
+
+    MLflow 2系（<run_dir>/<mlflow_id>/artifacts/trained_model_N）と
+    MLflow 3系（<run_dir>/models/<model_id>/artifacts、MLmodelのrun_idで照合）の両方に対応する。
+    """
+    result_base = get_result_path()
+    if not os.path.isdir(result_base):
+        return []
+
+    for run_dir in os.listdir(result_base):
+        run_path = os.path.join(result_base, run_dir)
+        if not os.path.isdir(run_path):
+            continue
+
+        # MLflow 2系
+        legacy_dir = os.path.join(run_path, mlflow_id, "artifacts")
+        models = []
+        idx = 0
+        while os.path.exists(os.path.join(legacy_dir, f"trained_model_{idx}", "model.pkl")):
+            models.append({
+                'index': idx,
+                'model_uri': f"runs:/{mlflow_id}/trained_model_{idx}",
+                'local_path': os.path.join(legacy_dir, f"trained_model_{idx}", "model.pkl")
+            })
+            idx += 1
+        if models:
+            return models
+
+        # MLflow 3系（ログ順 = 目的変数の順）
+        models_dir = os.path.join(run_path, "models")
+        if not os.path.isdir(models_dir):
+            continue
+        found = []
+        for m in os.listdir(models_dir):
+            artifacts_dir = os.path.join(models_dir, m, "artifacts")
+            meta = _read_mlmodel(os.path.join(artifacts_dir, "MLmodel"))
+            pkl_path = os.path.join(artifacts_dir, "model.pkl")
+            if meta.get('run_id') == mlflow_id and os.path.exists(pkl_path):
+                found.append((meta.get('utc_time_created', ''), m, pkl_path))
+        if found:
+            found.sort()
+            return [
+                {'index': i, 'model_uri': f"models:/{m}", 'local_path': pkl_path}
+                for i, (_, m, pkl_path) in enumerate(found)
+            ]
+
+    return []
+
+
+def _read_mlmodel(path):
+    """MLmodelファイルからrun_id・作成日時のみを取得"""
+    meta = {}
+    if not os.path.exists(path):
+        return meta
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            for key in ('run_id', 'utc_time_created'):
+                if line.startswith(f"{key}:"):
+                    meta[key] = line.split(':', 1)[1].strip().strip("'\"")
+    return meta
+
+
+def _probe_mlflow_models(mlflow_id):
+    """MLflowからtrained_model_Nを順に探索（Databricks環境用）"""
+    models = []
+    idx = 0
+    while True:
+        model_uri = f'runs:/{mlflow_id}/trained_model_{idx}'
+        try:
+            mlflow.models.get_model_info(model_uri)
+        except Exception:
+            break
+        models.append({'index': idx, 'model_uri': model_uri, 'local_path': None})
+        idx += 1
+    return models
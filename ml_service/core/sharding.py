@@ -0,0 +1,158 @@
+"""
+Sharded parallel prediction
+大量行の予測を行単位に分割し、プロセスプールでシャードごとに並列実行する
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PARALLEL_PREDICT_WORKERS
+from core.compiled import CompiledEnsemble
+from core.registry import lookup_models, load_models, invalidate_models
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# ワーカープロセス内: mlflow_idごとにロードしたモデルの登録日時
+_worker_versions = {}
+
+# ウォームアップ時に全ワーカーへタスクが行き渡るまで待つ最大秒数（ワーカーの起動・モデルのロードを含む）
+_WARM_WORKERS_TIMEOUT = 600
+
+
+def predict_sharded(mlflow_id, df):
+    """
+    入力行をワーカー数のシャードに分割し、シャード単位で全目的変数を並列に予測
+
+    シャードは1回だけワーカーに送り、ワーカー内で全目的変数のモデルで予測する。
+    モデルは各ワーカープロセスで初回にロードし、以降はワーカー内のモデルキャッシュを使う。
+
+    Args:
+        mlflow_id: MLflow Run ID
+        df: 説明変数のDataFrame
+
+    Returns:
+        list: 目的変数の順の予測値配列
+    """
+    entry = lookup_models(mlflow_id)
+    if entry is None or not entry['models']:
+        raise ValueError(f"No model found for MLflow ID: {mlflow_id}")
+    version = entry.get('registered_at')
+
+    pool = _get_pool()
+    bounds = np.linspace(0, len(df), PARALLEL_PREDICT_WORKERS + 1, dtype=np.int64)
+    shards = [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    try:
+        futures = [pool.submit(_predict_shard, mlflow_id, version, shard) for shard in shards]
+        shard_predictions = [f.result() for f in futures]
+    except BrokenProcessPool:
+        # ワーカーが異常終了した場合はプールを作り直せるよう破棄する
+        _discard_pool(pool)
+        raise
+    return [np.concatenate(target_predictions) for target_predictions in zip(*shard_predictions)]
+
+
+def warm_workers(mlflow_id, x_list):
+    """
+    全ワーカープロセスでモデルをロードし、1行のダミー入力で予測
+
+    空いたワーカーが複数のタスクを処理するとモデルをロードしないワーカーが残るため、
+    各タスクは全ワーカーがタスクを受け取るまでバリアで待ち、ワーカーごとに1タスクずつ処理させる。
+
+    Args:
+        mlflow_id: MLflow Run ID
+        x_list: 説明変数リスト
+
+    Returns:
+        list: タスクを処理したワーカーのプロセスID
+    """
+    entry = lookup_models(mlflow_id)
+    if entry is None or not entry['models']:
+        raise ValueError(f"No model found for MLflow ID: {mlflow_id}")
+    version = entry.get('registered_at')
+    dummy = pd.DataFrame(np.zeros((1, len(x_list))), columns=x_list)
+
+    pool = _get_pool()
+    with multiprocessing.get_context('spawn').Manager() as manager:
+        barrier = manager.Barrier(PARALLEL_PREDICT_WORKERS)
+        try:
+            futures = [
+                pool.submit(_warm_worker, mlflow_id, version, dummy, barrier)
+                for _ in range(PARALLEL_PREDICT_WORKERS)
+            ]
+            return [f.result() for f in futures]
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+
+
+def shutdown_pool():
+    """プロセスプールを停止"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Flask/SocketIOのスレッドを持つ親プロセスをforkしないようspawnで起動する
+            _pool = ProcessPoolExecutor(
+                max_workers=PARALLEL_PREDICT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            print(f"[INFO] Started prediction worker pool ({PARALLEL_PREDICT_WORKERS} processes)")
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def _predict_shard(mlflow_id, version, shard):
+    """
+    ワーカープロセスで1シャードを全目的変数のモデルで予測（目的変数の順の予測値配列のリスト）
+
+    並列度はワーカー数で確保するため、LightGBM/XGBoostなどのOpenMP・BLASのスレッドは1に制限する
+    （制限しないと各ワーカーがCPUコア数分のスレッドを使い、過剰なスレッドで遅くなる）。
+    """
+    if _worker_versions.get(mlflow_id) != version:
+        # 再登録されたモデルは読み直す
+        invalidate_models(mlflow_id)
+        _worker_versions[mlflow_id] = version
+    _, models = load_models(mlflow_id)
+    with threadpool_limits(limits=1):
+        return [_predict_one(model, shard) for model in models]
+
+
+def _predict_one(model, shard):
+    """1つのモデルでシャードを1スレッドで予測"""
+    if isinstance(model, CompiledEnsemble) and model.model is not None and model.max_rows is not None \
+            and len(shard) > model.max_rows:
+        # 配列表現の最大行数を超える入力は元のモデルで予測される
+        model = model.model
+    if type(model).__name__ == 'CatBoostRegressor':
+        # CatBoostはOpenMPのスレッド数を参照しないため直接指定する
+        return np.asarray(model.predict(shard, thread_count=1))
+    return np.asarray(model.predict(shard))
+
+
+def _warm_worker(mlflow_id, version, dummy, barrier):
+    """ワーカープロセスでモデルをロード・予測し、全ワーカーがそろうまで待つ"""
+    _predict_shard(mlflow_id, version, dummy)
+    barrier.wait(_WARM_WORKERS_TIMEOUT)
+    return os.getpid()
@@ -0,0 +1,156 @@
+"""
+Streaming and columnar wire formats
+予測結果をNDJSON / Arrow IPCストリームとしてチャンク単位で返す・Arrow IPCのリクエストを読み込む
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+ARROW_FILE_MIMETYPE = 'application/vnd.apache.arrow.file'
+
+# Content-Encodingとpyarrowの圧縮コーデック名の対応
+_CONTENT_ENCODINGS = {'gzip': 'gzip', 'x-gzip': 'gzip', 'zstd': 'zstd', 'lz4': 'lz4', 'bz2': 'bz2'}
+
+
+def negotiate_format(accept_header, default='ndjson'):
+    """
+    Acceptヘッダーからストリーム形式を選択
+
+    Returns:
+        str: 'arrow' / 'ndjson' / 'json'
+    """
+    accept = (accept_header or '').lower()
+    if ARROW_STREAM_MIMETYPE in accept and pa is not None:
+        return 'arrow'
+    if NDJSON_MIMETYPE in accept or 'application/jsonl' in accept:
+        return 'ndjson'
+    if 'application/json' in accept:
+        return 'json'
+    return default
+
+
+def is_arrow_mimetype(mimetype):
+    """Arrow IPC形式のContent-Typeか"""
+    return mimetype in (ARROW_STREAM_MIMETYPE, ARROW_FILE_MIMETYPE)
+
+
+def read_arrow_frame(body, content_encoding=None):
+    """
+    Arrow IPC（ストリーム・ファイル形式）のリクエスト本体をDataFrameに変換
+
+    本体のバッファを直接参照して読み込むため、欠損のない数値カラムはコピーされない。
+    IPCのバッファ圧縮（LZ4/ZSTD）は読み込み時に自動で展開され、
+    Content-Encodingによる本体全体の圧縮（gzip/zstd/lz4/bz2）にも対応する。
+
+    Args:
+        body: リクエスト本体（bytes）
+        content_encoding: Content-Encodingヘッダーの値
+
+    Returns:
+        pandas DataFrame
+
+    Raises:
+        ValueError: 形式が不正、または未対応のContent-Encodingの場合
+    """
+    if pa is None:
+        raise ValueError("Arrow request bodies require pyarrow")
+
+    buffer = pa.py_buffer(body)
+    encoding = (content_encoding or '').strip().lower()
+    if encoding and encoding != 'identity':
+        if encoding not in _CONTENT_ENCODINGS:
+            raise ValueError(f"Unsupported Content-Encoding: {content_encoding}")
+        with pa.input_stream(buffer, compression=_CONTENT_ENCODINGS[encoding]) as stream:
+            buffer = stream.read_buffer()
+
+    try:
+        if buffer[:6].to_pybytes() == b'ARROW1':
+            table = pa.ipc.open_file(buffer).read_all()
+        else:
+            table = pa.ipc.open_stream(buffer).read_all()
+    except pa.ArrowException as e:
+        raise ValueError(f"Invalid Arrow IPC body: {e}")
+
+    return table.to_pandas(split_blocks=True)
+
+
+def iter_ndjson(chunks):
+    """
+    DataFrameのチャンクを1行1レコードのJSONとして順に出力
+
+    DataFrame.to_jsonは有効桁数が最大15桁でfloat64を復元できないため、
+    各値をPythonの値に変換し、往復で元の値に戻る最短表記で出力する。欠損はnullにする。
+    """
+    for chunk in chunks:
+        if len(chunk):
+            records = chunk.astype(object).where(chunk.notna(), None).to_dict(orient='records')
+            lines = [json.dumps(record, ensure_ascii=False, allow_nan=False, default=str) for record in records]
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def iter_arrow_stream(chunks):
+    """
+    DataFrameのチャンクをArrow IPCストリームのレコードバッチとして順に出力
+
+    チャンクごとに推論される型の違い（int/float混在など）を吸収するため、
+    数値カラムはfloat64、それ以外は文字列に揃える。
+    """
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(_normalize_chunk(chunk), preserve_index=False)
+        if writer is None:
+            schema = table.schema
+            writer = pa.ipc.new_stream(sink, schema)
+        elif table.schema != schema:
+            # 全欠損カラムなどで型が異なる場合は先頭チャンクのスキーマに揃える
+            table = table.cast(schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def _normalize_chunk(df):
+    """Arrowストリーム用にカラム型を揃える"""
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+            columns[str(col)] = values.astype(np.float64)
+        else:
+            columns[str(col)] = values.astype('string')
+    return pd.DataFrame(columns, index=df.index)
+
+
+class _ChunkSink:
+    """書き込まれたバイト列を溜め、チャンクごとに取り出すファイル風オブジェクト"""
+
+    def __init__(self):
+        self._buffers = []
+        self.closed = False
+
+    def write(self, data):
+        self._buffers.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._buffers)
+        self._buffers = []
+        return data
@@ -22,7 +22,10 @@ from datetime import datetime
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import *
-from core.utils import load_dataframe, save_dataframe, validate_columns, calculate_metrics
+from core.utils import (
+    load_dataframe, save_dataframe, resolve_dataset_path, coerce_numeric_columns, calculate_metrics
+)
+from core.registry import register_models, resolve_local_model_path
 
 # Optunaの出力を抑制
 optuna.logging.set_verbosity(optuna.logging.WARNING)
@@ -146,19 +149,29 @@ def train_model(dataset_id, x_list, target, model_name, cv_group, run_id, socket
         notify_status("データセット読み込み中...", 0)
 
         # データセット読み込み
-        dataset_path = f"{get_dataset_path()}/{dataset_id}"
-        if not dataset_path.endswith('.csv'):
-            dataset_path += '.csv'
+        dataset_path = resolve_dataset_path(dataset_id)
 
-        df = load_dataframe(dataset_path)
-        notify_status(f"データセット読み込み完了（{len(df)}行）", 10)
-
-        # カラム検証（targetが文字列の場合はリストに変換）
+        # 必要なカラム（説明変数・目的変数・CVグループ）のみ読み込む
         target_list = [target] if isinstance(target, str) else target
-        validate_columns(df, x_list, target_list)
-
-        # 欠損値処理
-        df = df.fillna(0)
+        numeric_cols = x_list + target_list
+        use_cols = numeric_cols + ([cv_group] if cv_group else [])
+        df = load_dataframe(
+            dataset_path,
+            columns=use_cols,
+            dtype={col: 'float64' for col in numeric_cols}
+        )
+        engine = df.attrs.get('load_engine', 'pandas')
+        notify_status(f"データセット読み込み完了（{len(df)}行, {len(df.columns)}列, engine: {engine}）", 10)
+
+        # カラム検証・数値変換・欠損値処理（欠損のない数値カラムはコピーしない）
+        source_df = df
+        df, column_report = coerce_numeric_columns(source_df, numeric_cols, fill_value=0)
+        for col, info in column_report.items():
+            if info['coerced']:
+                print(f"[WARN] {col}: 数値に変換できない値 {info['coerced']}件を0で補完しました")
+        if cv_group and cv_group in source_df.columns and cv_group not in df.columns:
+            df[cv_group] = source_df[cv_group].fillna(0)
+        del source_df
 
         notify_status("クロスバリデーション設定中...", 15)
 
@@ -240,9 +253,29 @@ def train_model(dataset_id, x_list, target, model_name, cv_group, run_id, socket
             mlflow_run_id = mlflow_run.info.run_id
 
             # 各目的変数のモデル保存
+            registered_models = []
             for idx, target_col in enumerate(target_list):
                 # モデル保存
-                mlflow.sklearn.log_model(final_models[target_col], f"trained_model_{idx}")
+                model_info = mlflow.sklearn.log_model(final_models[target_col], f"trained_model_{idx}")
+                model_entry = {
+                    'index': idx,
+                    'target': target_col,
+                    'model_uri': model_info.model_uri,
+                    'local_path': resolve_local_model_path(model_info)
+                }
+
+                # SHAP Explainer保存（予測時に再構築せず読み込んで使う）
+                try:
+                    explainer = create_explainer(final_models[target_col], df[x_list])
+                    explainer_path = f"{artifact_path}/explainer_{idx}.pkl"
+                    with open(explainer_path, "wb") as f:
+                        pickle.dump(explainer, f)
+                    mlflow.log_artifact(explainer_path)
+                    model_entry['explainer_uri'] = f"runs:/{mlflow_run_id}/explainer_{idx}.pkl"
+                    model_entry['explainer_path'] = os.path.abspath(explainer_path) if os.path.exists(explainer_path) else None
+                except Exception as e:
+                    print(f"[WARN] Failed to save SHAP explainer for {target_col}: {e}")
+                registered_models.append(model_entry)
 
                 # メトリクス保存
                 for metric_name, metric_value in results[target_col]['metrics'].items():
@@ -270,6 +303,19 @@ def train_model(dataset_id, x_list, target, model_name, cv_group, run_id, socket
             mlflow.log_param("target", json.dumps(target))
             mlflow.log_param("cv_group", cv_group)
 
+        # モデル索引に登録（予測・最適化時のモデル探索用）
+        register_models(
+            mlflow_run_id,
+            registered_models,
+            run_id=run_id,
+            dataset_id=dataset_id,
+            model_name=model_name,
+            x_list=x_list,
+            targets=target_list,
+            experiment_name=experiment_name,
+            artifact_path=artifact_path
+        )
+
         notify_status("学習完了！", 100)
 
         # 結果サマリー
@@ -440,6 +486,27 @@ def cv_predict_sklearn(df, x_list, target, model_name, best_params, cv_group):
     return result, shap_values_dict, final_model
 
 
+def create_explainer(model, X):
+    """
+    学習済みモデルのSHAP Explainerを作成
+
+    決定木モデルはTreeExplainer（背景データ不要）、それ以外は学習データから
+    SHAP_BACKGROUND_SIZE行をサンプリングした背景データでExplainerを作成する。
+
+    Args:
+        model: 学習済みモデル
+        X: 学習データの説明変数（DataFrame）
+
+    Returns:
+        shap.Explainer
+    """
+    try:
+        return shap.TreeExplainer(model)
+    except Exception:
+        background = shap.utils.sample(X, min(SHAP_BACKGROUND_SIZE, len(X)), random_state=0)
+        return shap.Explainer(model.predict, background)
+
+
 def get_training_status(run_id):
     """
     学習ステータス取得
@@ -1,33 +1,116 @@
 """
 Utility functions for ML service
 """
-import chardet
+import codecs
+import json
+import numpy as np
 import pandas as pd
 import os
+import threading
 from io import BytesIO
+from chardet import UniversalDetector
 
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.cache import dataframe_cache
+from core.profile import compute_profile, read_profile, write_profile
+from config import (
+    ENCODING_SAMPLE_BYTES, CSV_ENGINE, CSV_BLOCK_SIZE, DATASET_SIDECAR_ENABLED, PREDICT_CHUNK_ROWS,
+    get_dataset_path
+)
 
-def encoding_detection(byte_data):
-    """
-    文字コード自動判定（Streamlitコードから移植）
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as feather
+except ImportError:
+    # pyarrowがない環境ではサイドカーを使わず、CSVはpandasで読み込む
+    pa = None
 
-    Args:
-        byte_data: バイトデータ
+# 文字コード判定時の読み込み単位
+_DETECTION_CHUNK_BYTES = 64 * 1024
 
-    Returns:
-        str: エンコーディング名
-    """
-    # BOMチェック
-    if byte_data.startswith(b'\xef\xbb\xbf'):
+# サイドカーのスキーマメタデータに格納するキー
+_SIDECAR_METADATA_KEY = b'ml_service'
+
+# サイドカーへの変換に失敗したCSV（実パス -> (サイズ, 更新時刻)）
+_sidecar_failures = {}
+
+# pyarrow CSVリーダーがそのまま扱えるエンコーディング（それ以外はpandasで読み込む）
+_PYARROW_CSV_ENCODINGS = ('utf-8', 'utf-8-sig')
+
+# 厳密検証を行うエンコーディング（Database Appのエクスポートで使われるもの）
+_VALIDATED_ENCODINGS = ('utf-8', 'cp932')
+
+
+def _detect_bom(head):
+    """BOMからエンコーディングを判定（BOMなしの場合はNone）"""
+    if head.startswith(b'\xef\xbb\xbf'):
         return 'utf-8-sig'
-    elif byte_data.startswith(b'\xff\xfe') or byte_data.startswith(b'\xfe\xff'):
-        return 'utf-16'
-    elif byte_data.startswith(b'\x00\x00\xfe\xff') or byte_data.startswith(b'\xff\xfe\x00\x00'):
+    elif head.startswith(b'\x00\x00\xfe\xff') or head.startswith(b'\xff\xfe\x00\x00'):
         return 'utf-32'
+    elif head.startswith(b'\xff\xfe') or head.startswith(b'\xfe\xff'):
+        return 'utf-16'
+    return None
+
+
+def _detect_stream(stream, sample_size):
+    """
+    ストリームを先頭から逐次読み込んで文字コードを判定
+
+    utf-8/cp932の厳密デコード検証を行い、どちらでもない場合のみchardetで逐次判定する。
+    sample_sizeがNoneの場合はストリーム全体を対象にする。
+    """
+    bom = _detect_bom(stream.read(4))
+    if bom:
+        return bom
+    stream.seek(0)
+
+    decoders = {enc: codecs.getincrementaldecoder(enc)() for enc in _VALIDATED_ENCODINGS}
+    read_bytes = 0
+    eof = False
+
+    while sample_size is None or read_bytes < sample_size:
+        chunk_size = _DETECTION_CHUNK_BYTES
+        if sample_size is not None:
+            chunk_size = min(chunk_size, sample_size - read_bytes)
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            break
+        read_bytes += len(chunk)
 
-    # chardetによる判定
-    result = chardet.detect(byte_data)
-    encoding = result['encoding']
+        for enc, decoder in list(decoders.items()):
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError:
+                del decoders[enc]
+
+    # ファイル末尾まで読んだ場合は末尾の不完全なマルチバイト文字もエラーにする
+    if eof:
+        for enc, decoder in list(decoders.items()):
+            try:
+                decoder.decode(b'', final=True)
+            except UnicodeDecodeError:
+                del decoders[enc]
+
+    # utf-8/cp932として妥当であればchardetを回さない（大半のファイルはここで確定する）
+    for enc in _VALIDATED_ENCODINGS:
+        if enc in decoders:
+            return enc
+
+    # chardetによる判定（確定した時点で打ち切る）
+    detector = UniversalDetector()
+    stream.seek(0)
+    remaining = read_bytes
+    while remaining > 0 and not detector.done:
+        chunk = stream.read(min(_DETECTION_CHUNK_BYTES, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        detector.feed(chunk)
+    detector.close()
+    encoding = detector.result['encoding']
 
     try:
         # asciiはutf-8にフォールバック
@@ -43,10 +126,42 @@ def encoding_detection(byte_data):
     return encoding
 
 
+def encoding_detection(byte_data):
+    """
+    文字コード自動判定（Streamlitコードから移植）
+
+    先頭ENCODING_SAMPLE_BYTESバイトのみを判定対象にする。
+
+    Args:
+        byte_data: バイトデータ
+
+    Returns:
+        str: エンコーディング名
+    """
+    return _detect_stream(BytesIO(byte_data), ENCODING_SAMPLE_BYTES)
+
+
+def detect_file_encoding(file_path, sample_size=ENCODING_SAMPLE_BYTES):
+    """
+    ファイルの文字コードを判定（ファイル全体をメモリに読み込まない）
+
+    Args:
+        file_path: ファイルパス
+        sample_size: 判定に使う先頭バイト数（Noneの場合はファイル全体）
+
+    Returns:
+        str: エンコーディング名
+    """
+    with open(file_path, 'rb') as f:
+        return _detect_stream(f, sample_size)
+
+
 def save_dataframe(df, file_path, encoding='utf-8-sig'):
     """
     DataFrameをCSVとして保存
 
+    データセットディレクトリ配下のファイルは統計プロファイルと列指向サイドカーも同時に作成する。
+
     Args:
         df: pandas DataFrame
         file_path: 保存先パス
@@ -54,15 +169,79 @@ def save_dataframe(df, file_path, encoding='utf-8-sig'):
     """
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     df.to_csv(file_path, index=False, encoding=encoding)
+    if _is_dataset_file(file_path):
+        stat = os.stat(file_path)
+        write_profile(file_path, compute_profile(df), stat)
+        if _use_sidecar(file_path):
+            _write_sidecar(df, file_path, encoding, stat)
     return file_path
 
 
-def load_dataframe(file_path):
+def resolve_dataset_path(dataset_id):
+    """
+    データセットIDからCSVのパスを取得
+
+    Args:
+        dataset_id: データセットID（ファイル名、拡張子は省略可）
+
+    Returns:
+        str: データセットCSVのパス
+
+    Raises:
+        ValueError: データセットディレクトリ外を指す場合
+    """
+    dataset_path = f"{get_dataset_path()}/{dataset_id}"
+    if not dataset_path.endswith('.csv'):
+        dataset_path += '.csv'
+    if not _is_dataset_file(dataset_path):
+        raise ValueError(f"Invalid dataset_id: {dataset_id}")
+    return dataset_path
+
+
+def load_dataset_profile(dataset_id):
+    """
+    データセットの統計プロファイルを取得（未作成・CSV更新時はここで計算して保存）
+
+    Args:
+        dataset_id: データセットID（ファイル名）
+
+    Returns:
+        dict: 統計プロファイル
+    """
+    dataset_path = resolve_dataset_path(dataset_id)
+    if not os.path.exists(dataset_path):
+        raise FileNotFoundError(f"Dataset not found: {dataset_id}")
+
+    profile = read_profile(dataset_path)
+    if profile is None:
+        stat = os.stat(dataset_path)
+        df = load_dataframe(dataset_path)
+        # サイドカー作成時の読み込みでプロファイルも保存されるため、保存されなかった場合のみ計算する
+        profile = read_profile(dataset_path)
+        if profile is None:
+            profile = compute_profile(df)
+            write_profile(dataset_path, profile, stat)
+            profile = dict(profile, source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns)
+    return profile
+
+
+def load_dataframe(file_path, columns=None, dtype=None):
     """
     CSVファイルを読み込み
 
+    データセットディレクトリ配下のファイルは初回読み込み時に列指向サイドカー（Arrow IPC）へ変換し、
+    以降はCSVが更新されない限りサイドカーをメモリマップして必要なカラムのみを読み込む。
+    その場合、欠損のない数値カラムは読み取り専用のゼロコピービューになる。
+
+    読み込み結果は(パス, 更新時刻, サイズ, カラム指定, dtype指定)をキーにプロセス内でキャッシュし、
+    呼び出し元にはキャッシュ本体を共有する浅いコピーを返す。Copy-on-Writeが無効な場合（pandas 2系で
+    app.py以外から呼び出す場合）、返したDataFrameをin-placeで書き換えるとキャッシュ本体も書き換わる。
+
     Args:
         file_path: ファイルパス
+        columns: 読み込むカラムのリスト（Noneの場合は全カラム）
+            ファイルに存在しないカラムは無視する（存在チェックはcoerce_numeric_columnsで行う）
+        dtype: カラムごとのdtype指定（dict）。変換できない値がある場合は型推論で読み直す
 
     Returns:
         pandas DataFrame
@@ -70,49 +249,548 @@ def load_dataframe(file_path):
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
 
-    # バイトデータとして読み込んで文字コード判定
+    stat = os.stat(file_path)
+    real_path = os.path.realpath(file_path)
+    cache_key = (
+        real_path,
+        stat.st_mtime_ns,
+        stat.st_size,
+        tuple(columns) if columns is not None else None,
+        tuple(sorted((col, str(t)) for col, t in dtype.items())) if dtype else None
+    )
+
+    df = dataframe_cache.get(cache_key)
+    if df is None:
+        df = _load_dataframe_uncached(file_path, columns, dtype)
+        # 同じファイルの古い版のエントリは不要なので破棄
+        dataframe_cache.invalidate(
+            lambda key: key[0] == real_path and key[1:3] != cache_key[1:3]
+        )
+        dataframe_cache.put(cache_key, df, int(df.memory_usage(deep=True).sum()))
+        engine = df.attrs.get('load_engine')
+    else:
+        print(f"[INFO] DataFrame cache hit: {file_path}")
+        engine = 'cache'
+
+    view = df.copy(deep=False)
+    view.attrs = {**df.attrs, 'load_engine': engine}
+    return view
+
+
+def iter_dataframe_chunks(file_path, columns=None, chunk_rows=PREDICT_CHUNK_ROWS):
+    """
+    CSVファイルをチャンク単位で読み込み（ファイル全体をメモリに載せない）
+
+    有効なサイドカーがある場合はメモリマップしたサイドカーから、なければCSVから順に読み込む。
+    各チャンクの df.attrs['progress'] に読み込み済みの割合（0〜1）を格納する。
+    カラムの型は先頭チャンクに揃える（欠損が現れた整数カラムは欠損を保持できる整数型にする）。
+
+    Args:
+        file_path: ファイルパス
+        columns: 読み込むカラムのリスト（Noneの場合は全カラム）
+        chunk_rows: 1チャンクの行数
+
+    Yields:
+        pandas DataFrame
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    table = _open_sidecar_table(file_path, columns) if _use_sidecar(file_path) else None
+    if table is not None:
+        print(f"[INFO] Streaming columnar sidecar: {_sidecar_path(file_path)}")
+        done = 0
+        dtypes = None
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            done += batch.num_rows
+            chunk = batch.to_pandas(split_blocks=True)
+            if dtypes is None:
+                dtypes = chunk.dtypes
+            else:
+                # 欠損の有無でバッチごとにint64/float64が変わるため揃える
+                chunk = _pin_chunk_dtypes(chunk, dtypes)
+            chunk.attrs['progress'] = done / table.num_rows
+            yield chunk
+        return
+
+    encoding = detect_file_encoding(file_path)
+    print(f"[INFO] Detected encoding: {encoding}")
+
+    done = 0
+    dtypes = None
+    try:
+        for chunk in _iter_csv_chunks(file_path, encoding, columns, chunk_rows):
+            if dtypes is None:
+                dtypes = chunk.dtypes
+            done += len(chunk)
+            yield chunk
+    except UnicodeDecodeError:
+        # 先頭以降に判定結果と異なる文字が含まれる場合はファイル全体で判定し直し、
+        # 返し済みの行を読み飛ばして続きから返す
+        encoding = detect_file_encoding(file_path, sample_size=None)
+        print(f"[WARN] Re-detected encoding from whole file: {encoding}")
+        yield from _iter_csv_chunks(file_path, encoding, columns, chunk_rows, dtypes=dtypes, skip_rows=done)
+
+
+def _iter_csv_chunks(file_path, encoding, columns, chunk_rows, dtypes=None, skip_rows=0):
+    """
+    指定したエンコーディングでCSVをチャンク単位で読み込み
+
+    Args:
+        dtypes: 揃えるカラムの型（Noneの場合は先頭チャンクの型）
+        skip_rows: 先頭から読み飛ばすデータ行数
+    """
+    usecols = _csv_usecols(file_path, encoding, columns) if columns is not None else None
+    size = os.path.getsize(file_path)
+
+    # 先頭チャンク分で文字列と推論されるカラムは全チャンクを文字列として読む
+    # （後続チャンクで数値のみになっても '05' などの元の表記を保つ）
+    head = pd.read_csv(file_path, encoding=encoding, usecols=usecols, nrows=chunk_rows)
+    text_dtype = {col: str for col in head.columns[head.dtypes == object]} or None
+
     with open(file_path, 'rb') as f:
-        byte_data = f.read()
+        reader = pd.read_csv(f, encoding=encoding, usecols=usecols, chunksize=chunk_rows, dtype=text_dtype)
+        for chunk in reader:
+            if skip_rows:
+                if len(chunk) <= skip_rows:
+                    skip_rows -= len(chunk)
+                    continue
+                chunk = chunk.iloc[skip_rows:].copy()
+                skip_rows = 0
+            if dtypes is None:
+                dtypes = chunk.dtypes
+            else:
+                chunk = _pin_chunk_dtypes(chunk, dtypes)
+            # 先読みバッファ分だけ進んだ位置になるため進捗は概算
+            chunk.attrs['progress'] = min(f.tell() / size, 1.0) if size else 1.0
+            yield chunk
+
+
+def _pin_chunk_dtypes(chunk, dtypes):
+    """
+    後続チャンクの数値・真偽値カラムを先頭チャンクの型に揃える
+
+    整数・真偽値のカラムに欠損が現れた場合は欠損を保持できる型（Int64・boolean）にする。
+    値を失わずに変換できない場合（小数・文字列が現れた場合）はそのままにする。
+    """
+    for col, t in dtypes.items():
+        if col not in chunk.columns or chunk[col].dtype == t or t.kind not in 'iufb':
+            continue
+        if t.kind == 'f':
+            target = t
+        elif t.kind == 'b':
+            target = 'boolean'
+        else:
+            target = 'Int64'
+        try:
+            chunk[col] = chunk[col].astype(target)
+        except (TypeError, ValueError):
+            pass
+    return chunk
+
+
+def _load_dataframe_uncached(file_path, columns, dtype):
+    """キャッシュを介さずにCSV（またはサイドカー）から読み込み"""
+    if not _use_sidecar(file_path):
+        df, _ = _load_csv(file_path, columns, dtype)
+        return df
+
+    df = _read_sidecar(file_path, columns, dtype)
+    if df is not None:
+        print(f"[INFO] Loaded columnar sidecar: {_sidecar_path(file_path)}")
+        df.attrs['load_engine'] = 'sidecar'
+        return df
+
+    stat = os.stat(file_path)
+    if _sidecar_failures.get(os.path.realpath(file_path)) == (stat.st_size, stat.st_mtime_ns):
+        # 同じ版のCSVで変換に失敗済みの場合は全カラムを読まず、要求されたカラムのみ読み込む
+        df, _ = _load_csv(file_path, columns, dtype)
+        return df
+
+    # 初回は全カラムを読み込んでサイドカーに変換し、要求されたカラムを返す
+    df, encoding = _load_csv(file_path, None, None)
+    _write_sidecar(df, file_path, encoding, stat)
+    if read_profile(file_path) is None:
+        write_profile(file_path, compute_profile(df), stat)
+    engine = df.attrs.get('load_engine')
+    df = _project_columns(df, columns, dtype)
+    df.attrs['load_engine'] = engine
+    return df
 
-    encoding = encoding_detection(byte_data)
+
+def _load_csv(file_path, columns, dtype):
+    """
+    文字コード判定してCSVを読み込み、(DataFrame, エンコーディング)を返す
+
+    使用したパースエンジンは df.attrs['load_engine'] に格納する。
+    """
+    # 先頭部分のみで文字コード判定し、ファイルから直接読み込む
+    encoding = detect_file_encoding(file_path)
     print(f"[INFO] Detected encoding: {encoding}")
 
-    # DataFrameとして読み込み
-    return pd.read_csv(BytesIO(byte_data), encoding=encoding)
+    try:
+        df, engine = _read_csv(file_path, encoding, columns, dtype)
+    except UnicodeDecodeError:
+        # 先頭以降に判定結果と異なる文字が含まれる場合はファイル全体で判定し直す
+        encoding = detect_file_encoding(file_path, sample_size=None)
+        print(f"[WARN] Re-detected encoding from whole file: {encoding}")
+        df, engine = _read_csv(file_path, encoding, columns, dtype)
+
+    df.attrs['load_engine'] = engine
+    return df, encoding
 
 
-def validate_columns(df, x_list, target_list):
+def _select_csv_engine(encoding):
+    """設定とエンコーディングからCSVパースエンジンを選択"""
+    if CSV_ENGINE == 'pandas' or pa is None:
+        return 'pandas'
+    if encoding not in _PYARROW_CSV_ENCODINGS:
+        return 'pandas'
+    return 'pyarrow'
+
+
+def _read_csv(file_path, encoding, columns, dtype):
+    """
+    選択したエンジンでCSVを読み込み、(DataFrame, エンジン名)を返す
+
+    pyarrowで読み込めない場合はpandasで読み直す。
     """
-    カラムの存在と型をチェック
+    engine = _select_csv_engine(encoding)
+    if engine == 'pyarrow':
+        try:
+            return _read_csv_pyarrow(file_path, encoding, columns, dtype), engine
+        except pa.ArrowException as e:
+            print(f"[WARN] pyarrow CSV reader failed, falling back to pandas: {e}")
+            engine = 'pandas'
+    return _read_csv_pandas(file_path, encoding, columns, dtype), engine
+
+
+def _csv_usecols(file_path, encoding, columns):
+    """ヘッダーのみ読んで必要なカラムに絞り込む（元の列順を維持）"""
+    header = pd.read_csv(file_path, encoding=encoding, nrows=0).columns
+    wanted = set(columns)
+    return [col for col in header if col in wanted]
+
+
+def _read_csv_pandas(file_path, encoding, columns, dtype):
+    """pandas（Cパーサー）でカラム絞り込み・dtype指定付きでCSVを読み込み"""
+    if columns is None:
+        # DataFrameとして読み込み
+        return pd.read_csv(file_path, encoding=encoding, dtype=dtype)
+
+    usecols = _csv_usecols(file_path, encoding, columns)
+    if dtype:
+        dtype = {col: t for col, t in dtype.items() if col in usecols}
+
+    try:
+        return pd.read_csv(file_path, encoding=encoding, usecols=usecols, dtype=dtype)
+    except UnicodeDecodeError:
+        raise
+    except (ValueError, TypeError) as e:
+        if not dtype:
+            raise
+        # 数値以外の値が混在している場合は型推論で読み直し、coerce_numeric_columnsで変換する
+        print(f"[WARN] dtype指定での読み込みに失敗したため型推論で再読み込みします: {e}")
+        return pd.read_csv(file_path, encoding=encoding, usecols=usecols)
+
+
+def _read_csv_pyarrow(file_path, encoding, columns, dtype):
+    """
+    pyarrowのCSVリーダーでブロック単位にマルチスレッドで読み込み
+
+    pandasのCパーサーと結果を揃えるため、空文字列は欠損扱いにし、
+    日付・時刻・日時として推論されたカラムは文字列として読み直して元の表記を保つ。
+    """
+    include_columns = None
+    if columns is not None:
+        include_columns = _csv_usecols(file_path, encoding, columns)
+
+    column_types = {}
+    if dtype:
+        for col, t in dtype.items():
+            if include_columns is None or col in include_columns:
+                column_types[col] = pa.from_numpy_dtype(np.dtype(t))
+
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE)
+
+    def read(types, include=include_columns):
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=include,
+            column_types=types,
+            strings_can_be_null=True
+        )
+        return pa_csv.read_csv(file_path, read_options=read_options, convert_options=convert_options)
+
+    try:
+        table = read(column_types)
+    except pa.ArrowInvalid as e:
+        if not column_types:
+            raise
+        # 数値以外の値が混在している場合は型推論で読み直し、coerce_numeric_columnsで変換する
+        print(f"[WARN] dtype指定での読み込みに失敗したため型推論で再読み込みします: {e}")
+        table = read({})
+
+    # 不正なUTF-8を含むカラムはエラーにならずバイナリ型になるため、デコードエラーとして文字コードを判定し直す
+    binary_columns = [field.name for field in table.schema
+                      if pa.types.is_binary(field.type) or pa.types.is_large_binary(field.type)]
+    if binary_columns:
+        raise UnicodeDecodeError(encoding, b'', 0, 1, f"invalid byte sequence in columns {binary_columns}")
+
+    if len(set(table.column_names)) != len(table.column_names):
+        # 重複カラム名の扱い（pandasは連番を付与）を揃えるためpandasで読み直す
+        raise pa.ArrowInvalid("Duplicate column names in CSV header")
+
+    # 型推論を無効にするオプションはないため、日付・時刻・日時のカラムのみ文字列指定で読み直す
+    # （castすると '2024-01-02T11:30:00' が '2024-01-02 11:30:00' になるなど表記が変わる）
+    temporal_columns = [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+    if temporal_columns:
+        text = read({col: pa.string() for col in temporal_columns}, include=temporal_columns)
+        for col in temporal_columns:
+            table = table.set_column(table.schema.get_field_index(col), col, text.column(col))
+
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _sidecar_path(file_path):
+    """CSVに対応するサイドカーのパス"""
+    return os.path.splitext(file_path)[0] + '.arrow'
+
+
+def _is_dataset_file(file_path):
+    """データセットディレクトリ配下のファイルか"""
+    dataset_dir = os.path.realpath(get_dataset_path())
+    return os.path.realpath(file_path).startswith(dataset_dir + os.sep)
+
+
+def _use_sidecar(file_path):
+    """サイドカーの対象ファイルか（データセットディレクトリ配下のCSVのみ）"""
+    if pa is None or not DATASET_SIDECAR_ENABLED:
+        return False
+    return _is_dataset_file(file_path)
+
+
+def _read_sidecar(file_path, columns, dtype):
+    """
+    サイドカーから読み込み（存在しない・CSVが更新されている場合はNone）
+
+    記録されているCSVのサイズ・更新時刻が一致しない場合は無効とみなす。
+    数値カラムはメモリマップ上のゼロコピービュー（読み取り専用）として返す。
+    """
+    table = _open_sidecar_table(file_path, columns)
+    if table is None:
+        return None
+
+    # split_blocksにより欠損のない数値カラムはマップ領域を直接参照する読み取り専用のnumpy配列になる
+    df = table.to_pandas(split_blocks=True)
+    return _project_columns(df, columns, dtype, keep_numeric=True)
+
+
+def _open_sidecar_table(file_path, columns):
+    """
+    サイドカーをメモリマップしたArrowテーブルとして開く（存在しない・CSVが更新されている場合はNone）
+    """
+    sidecar_path = _sidecar_path(file_path)
+    if not os.path.exists(sidecar_path):
+        return None
+
+    try:
+        with pa.OSFile(sidecar_path, 'rb') as f:
+            schema = pa.ipc.open_file(f).schema
+        metadata = json.loads(schema.metadata[_SIDECAR_METADATA_KEY])
+
+        stat = os.stat(file_path)
+        if metadata['source_size'] != stat.st_size or metadata['source_mtime_ns'] != stat.st_mtime_ns:
+            print(f"[INFO] Sidecar is stale, re-converting: {sidecar_path}")
+            return None
+
+        read_cols = None
+        if columns is not None:
+            wanted = set(columns)
+            read_cols = [name for name in schema.names if name in wanted]
+        # メモリマップで開き、同一ノード上のジョブ間でページキャッシュを共有する
+        return feather.read_table(sidecar_path, columns=read_cols, memory_map=True)
+    except Exception as e:
+        print(f"[WARN] Failed to read sidecar {sidecar_path}: {e}")
+        return None
+
+
+def _write_sidecar(df, file_path, encoding, stat):
+    """
+    DataFrameをサイドカーとして保存（失敗してもCSV読み込みには影響させない）
+
+    型の混在したカラム（数値と文字列など）はArrowに変換できないため、object型のカラムを文字列にして再試行する。
+    それでも失敗した場合はCSVのサイズ・更新時刻を記録し、同じ版では変換を再試行しない。
+
+    Args:
+        df: 全カラムのDataFrame
+        file_path: 元CSVのパス
+        encoding: 判定したCSVのエンコーディング
+        stat: 読み込み前に取得した元CSVのos.stat結果
+    """
+    sidecar_path = _sidecar_path(file_path)
+    # 同じプロセスの別スレッドが同時に変換しても一時ファイルが衝突しないようスレッドIDも含める
+    tmp_path = f"{sidecar_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            table = pa.Table.from_pandas(_stringify_object_columns(df), preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[_SIDECAR_METADATA_KEY] = json.dumps({
+            'source_size': stat.st_size,
+            'source_mtime_ns': stat.st_mtime_ns,
+            'encoding': encoding,
+            'dtypes': {str(col): str(t) for col, t in df.dtypes.items()},
+        }, ensure_ascii=False)
+        table = table.replace_schema_metadata(metadata)
+
+        # 書き込み途中のファイルを他ジョブに読ませないよう一時ファイルから置き換える
+        # 非圧縮・単一チャンクで書き込み、読み込み時にゼロコピーでnumpy配列化できるようにする
+        feather.write_feather(table, tmp_path, compression='uncompressed', chunksize=max(len(df), 1))
+        os.replace(tmp_path, sidecar_path)
+        _sidecar_failures.pop(os.path.realpath(file_path), None)
+        print(f"[INFO] Wrote columnar sidecar: {sidecar_path}")
+        return True
+    except Exception as e:
+        print(f"[WARN] Failed to write sidecar {sidecar_path}: {e}")
+        _sidecar_failures[os.path.realpath(file_path)] = (stat.st_size, stat.st_mtime_ns)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def _stringify_object_columns(df):
+    """object型のカラムを文字列（欠損は維持）に変換した浅いコピー"""
+    df = df.copy(deep=False)
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].astype('string')
+    return df
+
+
+def _project_columns(df, columns, dtype, keep_numeric=False):
+    """
+    読み込み済みDataFrameにカラム絞り込みとdtype指定を適用
+
+    keep_numeric=Trueの場合、既に数値型のカラムは数値型同士の変換を行わない
+    （メモリマップ上のゼロコピービューをコピーしないため）。
+    """
+    if columns is not None:
+        wanted = set(columns)
+        keep = [col for col in df.columns if col in wanted]
+        if len(keep) != len(df.columns):
+            df = df[keep]
+    if dtype:
+        converted = {}
+        for col, t in dtype.items():
+            if col not in df.columns or df[col].dtype == t:
+                continue
+            if keep_numeric and df[col].dtype.kind in 'iuf' and pd.api.types.is_numeric_dtype(t):
+                continue
+            try:
+                converted[col] = df[col].astype(t)
+            except (ValueError, TypeError):
+                # 変換できない値はcoerce_numeric_columnsで変換する
+                pass
+        if converted:
+            # 浅いコピーに差し替えることで変換しないカラムはコピーせずに共有する
+            df = df.copy(deep=False)
+            for col, values in converted.items():
+                df[col] = values
+    return df
+
+
+# ダウンキャスト候補の整数型（狭い順）
+_INT_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def coerce_numeric_columns(df, columns, fill_value=0, downcast=False):
+    """
+    指定カラムの存在チェック・数値変換・欠損補完をカラム単位で実行
+
+    既に数値型で欠損のないカラムはコピーせずにそのまま返す（サイドカーのゼロコピービューも維持する）。
+    変換・補完が必要なカラムのみコピーするため、DataFrame全体を1つの配列にまとめることはない。
+    元のDataFrameは変更しない。
 
     Args:
         df: pandas DataFrame
-        x_list: 説明変数リスト
-        target_list: 目的変数リスト
+        columns: 数値として扱うカラムのリスト
+        fill_value: 欠損値の補完値
+        downcast: Trueの場合、値を損なわない最小の数値型（整数値のみなら最小の整数型、
+            float32で値が変わらなければfloat32）に変換する。学習・予測では精度を保つためFalseのまま使う
+
+    Returns:
+        tuple: (指定カラムのみのDataFrame, カラムごとの変換レポートdict)
 
     Raises:
-        ValueError: カラムが存在しない、または数値型でない場合
+        ValueError: カラムが存在しない、または数値型に変換できない場合
     """
     # カラム存在チェック
-    all_cols = x_list + target_list
-    missing_cols = [col for col in all_cols if col not in df.columns]
+    columns = list(dict.fromkeys(columns))
+    missing_cols = [col for col in columns if col not in df.columns]
     if missing_cols:
         raise ValueError(f"Missing columns: {missing_cols}")
 
-    # 数値型チェック・変換
-    for col in all_cols:
-        if df[col].dtype.kind not in 'fi':
-            # 文字列を数値に変換を試みる
+    result = {}
+    report = {}
+    non_numeric_cols = []
+    for col in columns:
+        series = df[col]
+        source_dtype = series.dtype
+
+        # 数値型以外のカラムのみ数値に変換（変換できない値は欠損になる）
+        invalid_count = 0
+        if source_dtype.kind not in 'iufb':
             try:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+                numeric = pd.to_numeric(series, errors='coerce')
             except Exception:
-                pass
+                non_numeric_cols.append(col)
+                continue
+            invalid_count = int(numeric.isna().sum() - series.isna().sum())
+            series = numeric
+
+        null_count = int(series.isna().sum())
+        if null_count or isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            # 欠損を補完したnumpy配列に変換（このカラムのみコピーする）
+            if null_count:
+                values = series.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+                values[np.isnan(values)] = fill_value
+            else:
+                values = series.to_numpy(dtype=series.dtype.numpy_dtype)
+            series = pd.Series(values, index=df.index, name=col)
+
+        if downcast and len(series) and series.dtype.kind in 'iuf':
+            target_dtype = _narrowest_dtype(series.to_numpy())
+            if series.dtype != target_dtype:
+                series = series.astype(target_dtype)
+
+        result[col] = series
+        report[col] = {
+            'source_dtype': str(source_dtype),
+            'dtype': series.dtype.name,
+            'filled': null_count,
+            'coerced': invalid_count
+        }
 
-    non_numeric_cols = [col for col in all_cols if df[col].dtype.kind not in 'fi']
     if non_numeric_cols:
         raise ValueError(f"Non-numeric columns: {non_numeric_cols}")
 
-    return True
+    # copy=Falseにより変換していないカラムは元の配列を共有する
+    return pd.DataFrame(result, index=df.index, copy=False), report
+
+
+def _narrowest_dtype(values):
+    """値を損なわない最小の数値型"""
+    col_min, col_max = values.min(), values.max()
+    is_int = values.dtype.kind in 'iu'
+    # 整数型のカラム、またはfloat64で正確に表せる範囲の整数値のみのカラムは整数型にする
+    if is_int or (-2 ** 53 < col_min and col_max < 2 ** 53 and (values == np.trunc(values)).all()):
+        for t in _INT_DTYPES:
+            info = np.iinfo(t)
+            if info.min <= col_min and col_max <= info.max:
+                return t
+    if not is_int and (values.astype(np.float32) == values).all():
+        return np.float32
+    return values.dtype
 
 
 def calculate_metrics(y_true, y_pred):
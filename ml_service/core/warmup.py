@@ -0,0 +1,140 @@
+"""
+Model warmup
+サービス起動時にモデルを事前ロードし、ダミー予測で初回呼び出しのコストを済ませる
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import WARMUP_MODEL_IDS, WARMUP_RECENT_MODELS, WARMUP_WORKER_POOL, PARALLEL_PREDICT_WORKERS
+from core.registry import list_models, load_models
+from core.sharding import warm_workers
+
+_lock = threading.Lock()
+_state = {
+    'status': 'pending',
+    'started_at': None,
+    'finished_at': None,
+    'models': []
+}
+_thread = None
+
+
+def select_warmup_models():
+    """
+    事前ロードするmlflow_idを選択
+
+    ML_WARMUP_MODEL_IDSで指定したIDと、直近に登録されたML_WARMUP_RECENT_MODELS件のモデル（重複除外）。
+    """
+    selected = list(WARMUP_MODEL_IDS)
+    if WARMUP_RECENT_MODELS > 0:
+        selected += [entry['mlflow_id'] for entry in list_models(limit=WARMUP_RECENT_MODELS)]
+    return list(dict.fromkeys(selected))
+
+
+def warmup_models(mlflow_ids=None):
+    """
+    モデルを事前ロードしてダミー予測を実行（完了までブロック）
+
+    個別のモデルで失敗してもサービス全体の準備完了は妨げない（結果はモデルごとに記録する）。
+
+    Args:
+        mlflow_ids: 対象のmlflow_idリスト（Noneの場合は設定から選択）
+
+    Returns:
+        dict: 準備状態
+    """
+    with _lock:
+        _state.update(status='warming', started_at=datetime.now().isoformat(), finished_at=None, models=[])
+
+    try:
+        if mlflow_ids is None:
+            mlflow_ids = select_warmup_models()
+        print(f"[INFO] Warming up {len(mlflow_ids)} model(s)")
+
+        for mlflow_id in mlflow_ids:
+            result = _warmup_model(mlflow_id)
+            with _lock:
+                _state['models'].append(result)
+    except Exception as e:
+        # 対象モデルの選択自体に失敗した場合もサービスは起動させる
+        print(f"[WARN] Model warmup aborted: {e}")
+
+    with _lock:
+        _state.update(status='ready', finished_at=datetime.now().isoformat())
+    print("[INFO] Model warmup complete")
+    return get_readiness()
+
+
+def start_warmup():
+    """
+    バックグラウンドスレッドでウォームアップを開始（開始済みの場合は何もしない）
+
+    起動時と各リクエストの処理前に呼ばれるため、WSGIサーバー経由でも最初のリクエストで開始される。
+
+    Returns:
+        threading.Thread: ウォームアップのスレッド
+    """
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=warmup_models, daemon=True)
+            _thread.start()
+        return _thread
+
+
+def get_readiness():
+    """準備状態（/ready用）"""
+    with _lock:
+        return {**_state, 'models': [dict(m) for m in _state['models']]}
+
+
+def is_ready():
+    with _lock:
+        return _state['status'] == 'ready'
+
+
+def _warmup_model(mlflow_id):
+    """1つのmlflow_idのモデルをロードし、全目的変数でダミー予測する"""
+    result = {'mlflow_id': mlflow_id, 'status': 'ok'}
+    try:
+        started = time.perf_counter()
+        entry, models = load_models(mlflow_id)
+        result['load_ms'] = (time.perf_counter() - started) * 1000
+
+        x_list = entry.get('x_list') or _feature_names(models[0])
+        if not x_list:
+            result['status'] = 'loaded'
+            return result
+
+        # 1行のダミー入力で各ライブラリの初回呼び出し（遅延import・メモリ確保）を済ませる
+        dummy = pd.DataFrame(np.zeros((1, len(x_list))), columns=x_list)
+        started = time.perf_counter()
+        for model in models:
+            model.predict(dummy)
+        result['predict_ms'] = (time.perf_counter() - started) * 1000
+
+        if WARMUP_WORKER_POOL and PARALLEL_PREDICT_WORKERS > 1:
+            # ワーカープロセスの起動と全ワーカーでのモデルロードを済ませる
+            started = time.perf_counter()
+            warm_workers(mlflow_id, x_list)
+            result['worker_pool_ms'] = (time.perf_counter() - started) * 1000
+    except Exception as e:
+        print(f"[WARN] Warmup failed for {mlflow_id}: {e}")
+        result.update(status='failed', error=str(e))
+    return result
+
+
+def _feature_names(model):
+    """索引に説明変数がない場合（索引導入前の学習結果）はモデルから取得"""
+    names = getattr(model, 'feature_names_in_', None)
+    if names is None:
+        # 配列表現に変換したモデル
+        names = getattr(model, 'feature_names', None)
+    return list(names) if names is not None else None
@@ -0,0 +1,64 @@
+"""
+pytest共通設定
+ml_serviceディレクトリをimportパスに追加し、データ・結果の保存先を一時ディレクトリに切り替える
+"""
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    一時ディレクトリを作業ディレクトリにする
+
+    config.pyのローカル保存先（./data/datasets, ./data/results）は相対パスのため、
+    テストごとに独立したディレクトリに保存される。
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / "data" / "datasets")
+    os.makedirs(tmp_path / "data" / "results")
+    return tmp_path
+
+
+@pytest.fixture
+def registered_model(workdir, monkeypatch):
+    """
+    学習済みモデル（目的変数2件の線形回帰）を索引に登録し、(mlflow_id, x_list, モデルのリスト)を返す
+
+    学習処理は実行せず、モデルのpickleを直接登録する。
+    """
+    from sklearn.linear_model import LinearRegression
+
+    from core import registry
+    from core.cache import model_cache, prediction_cache
+
+    monkeypatch.setattr(registry, "_index", {})
+    monkeypatch.setattr(registry, "_index_path", None)
+    monkeypatch.setattr(registry, "_index_offset", 0)
+    model_cache.invalidate()
+    prediction_cache.invalidate()
+
+    x_list = ["a", "b"]
+    X = pd.DataFrame(np.random.default_rng(0).random((50, 2)), columns=x_list)
+    models = []
+    model_infos = []
+    for idx, coef in enumerate(([1.0, 2.0], [-3.0, 0.5])):
+        model = LinearRegression().fit(X, X.to_numpy() @ np.array(coef) + idx)
+        path = os.path.join("data", "results", f"model_{idx}.pkl")
+        with open(path, "wb") as f:
+            pickle.dump(model, f)
+        models.append(model)
+        model_infos.append({"index": idx, "target": f"y{idx}", "local_path": path})
+    registry.register_models("m1", model_infos, x_list=x_list)
+
+    yield "m1", x_list, models
+
+    model_cache.invalidate()
+    prediction_cache.invalidate()
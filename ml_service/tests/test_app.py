@@ -0,0 +1,144 @@
+"""
+Flask APIのテスト
+"""
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client(workdir, monkeypatch):
+    # リクエストごとのウォームアップ開始は test_warmup.py で確認する
+    monkeypatch.setattr(app_module, "start_warmup", lambda: None)
+    app_module.app.config["TESTING"] = True
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def predict_calls(monkeypatch):
+    """バックグラウンドの予測処理の代わりに引数を記録する"""
+    calls = []
+
+    def fake_predict_model(**kwargs):
+        calls.append(kwargs)
+        return {}
+
+    monkeypatch.setattr(app_module, "predict_model", fake_predict_model)
+    return calls
+
+
+def _wait(run_id):
+    app_module.active_tasks[run_id]["thread"].join(timeout=30)
+
+
+def _arrow_body(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def test_predict_accepts_arrow_body(client, predict_calls):
+    df = pd.DataFrame({"a": [0.1, 0.2], "b": [1.0, 2.0], "id": ["p1", "p2"]})
+
+    response = client.post(
+        "/api/ml/predict?mlflow_id=m1&x_list=a,b&shap=" + json.dumps({"rows": [1]}),
+        data=_arrow_body(df),
+        content_type="application/vnd.apache.arrow.stream"
+    )
+
+    assert response.status_code == 200
+    _wait(response.json["run_id"])
+    (call,) = predict_calls
+    assert call["mlflow_id"] == "m1"
+    assert call["x_list"] == ["a", "b"]
+    assert call["shap_options"] == {"rows": [1]}
+    pd.testing.assert_frame_equal(call["input_data"], df)
+
+
+def test_predict_arrow_body_defaults_to_all_columns(client, predict_calls):
+    df = pd.DataFrame({"a": np.arange(3.0), "b": np.arange(3.0)})
+
+    response = client.post(
+        "/api/ml/predict?mlflow_id=m1",
+        data=gzip.compress(_arrow_body(df)),
+        content_type="application/vnd.apache.arrow.stream",
+        headers={"Content-Encoding": "gzip"}
+    )
+
+    assert response.status_code == 200
+    _wait(response.json["run_id"])
+    assert predict_calls[0]["x_list"] == ["a", "b"]
+
+
+@pytest.mark.parametrize("query, body, headers, message", [
+    ("mlflow_id=m1", b"not arrow", {}, "Invalid Arrow IPC body"),
+    ("mlflow_id=m1", None, {"Content-Encoding": "br"}, "Unsupported Content-Encoding"),
+    ("mlflow_id=m1&shap={rows", None, {}, ""),
+    ("x_list=a", None, {}, "Missing required parameter: mlflow_id"),
+])
+def test_predict_rejects_invalid_arrow_request(client, predict_calls, query, body, headers, message):
+    if body is None:
+        body = _arrow_body(pd.DataFrame({"a": [1.0]}))
+
+    response = client.post(
+        f"/api/ml/predict?{query}",
+        data=body,
+        content_type="application/vnd.apache.arrow.stream",
+        headers=headers
+    )
+
+    assert response.status_code == 400
+    assert message in response.json["error"]
+    assert predict_calls == []
+
+
+class InlineThread:
+    """start()時に処理をその場で実行するスレッド（登録前に処理が進む場合を再現する）"""
+
+    def __init__(self, target, daemon=None):
+        self.target = target
+
+    def start(self):
+        self.target()
+
+    def join(self, timeout=None):
+        pass
+
+
+def test_predict_task_is_registered_before_thread_runs(client, monkeypatch):
+    def fake_predict_model(**kwargs):
+        result = {"predictions": [], "num_samples": 0}
+        kwargs["on_predictions"](result)
+        return result
+
+    monkeypatch.setattr(app_module, "predict_model", fake_predict_model)
+    monkeypatch.setattr(app_module.threading, "Thread", InlineThread)
+
+    response = client.post("/api/ml/predict", json={"mlflow_id": "m1", "x_list": ["a"], "input_data": [{"a": 1}]})
+
+    assert response.status_code == 200
+    task = app_module.active_tasks[response.json["run_id"]]
+    assert task["status"] == "completed"
+    assert task["result"]["num_samples"] == 0
+
+
+def test_failed_task_is_recorded_when_thread_runs_immediately(client, monkeypatch):
+    def fail(**kwargs):
+        raise ValueError("No model found for MLflow ID: m1")
+
+    monkeypatch.setattr(app_module, "predict_model", fail)
+    monkeypatch.setattr(app_module.threading, "Thread", InlineThread)
+
+    response = client.post("/api/ml/predict", json={"mlflow_id": "m1", "x_list": ["a"], "input_data": [{"a": 1}]})
+
+    task = app_module.active_tasks[response.json["run_id"]]
+    assert task["status"] == "failed"
+    assert "No model found" in task["error"]
@@ -0,0 +1,99 @@
+"""
+core.batching.MicroBatcher のテスト（まとめた予測結果の各リクエストへの分配）
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.batching import MicroBatcher
+
+
+def _predict(key, df):
+    """モデル2つ分の予測値（入力行が分かる値）"""
+    x = df["x"].to_numpy()
+    return [x * 10, x + 0.5]
+
+
+def _submit_concurrently(batcher, requests):
+    """全スレッドが揃ってから同時にsubmitし、(結果, 例外)をリクエストの順に返す"""
+    barrier = threading.Barrier(len(requests))
+    results = [None] * len(requests)
+    errors = [None] * len(requests)
+
+    def run(i, key, df):
+        barrier.wait()
+        try:
+            results[i] = batcher.submit(key, df)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, key, df)) for i, (key, df) in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results, errors
+
+
+def test_each_caller_gets_its_own_rows():
+    batcher = MicroBatcher(_predict, max_batch_rows=10000, max_wait=0.2)
+    requests = [("m1", pd.DataFrame({"x": np.arange(i * 100, i * 100 + i + 1, dtype=np.float64)})) for i in range(8)]
+
+    results, errors = _submit_concurrently(batcher, requests)
+
+    assert errors == [None] * len(requests)
+    for (_, df), result in zip(requests, results):
+        x = df["x"].to_numpy()
+        np.testing.assert_array_equal(result[0], x * 10)
+        np.testing.assert_array_equal(result[1], x + 0.5)
+    stats = batcher.stats()
+    assert stats["requests"] == len(requests)
+    assert stats["rows"] == sum(len(df) for _, df in requests)
+    assert stats["batches"] < len(requests)
+
+
+def test_keys_are_not_mixed():
+    calls = []
+
+    def predict(key, df):
+        calls.append((key, len(df)))
+        offset = 1000 if key == "m2" else 0
+        return [df["x"].to_numpy() + offset]
+
+    batcher = MicroBatcher(predict, max_batch_rows=10000, max_wait=0.2)
+    requests = [(key, pd.DataFrame({"x": [float(i)]})) for i in range(6) for key in ("m1", "m2")]
+
+    results, errors = _submit_concurrently(batcher, requests)
+
+    assert errors == [None] * len(requests)
+    for (key, df), result in zip(requests, results):
+        expected = df["x"].to_numpy() + (1000 if key == "m2" else 0)
+        np.testing.assert_array_equal(result[0], expected)
+    assert {key for key, _ in calls} == {"m1", "m2"}
+
+
+def test_full_batch_runs_without_waiting():
+    batcher = MicroBatcher(_predict, max_batch_rows=5, max_wait=30)
+    df = pd.DataFrame({"x": np.arange(5, dtype=np.float64)})
+
+    # 最大行数に達したバッチはmax_waitを待たずに実行される
+    result = batcher.submit("m1", df)
+
+    np.testing.assert_array_equal(result[0], df["x"].to_numpy() * 10)
+
+
+def test_error_is_raised_to_all_callers():
+    def predict(key, df):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(predict, max_batch_rows=10000, max_wait=0.2)
+    requests = [("m1", pd.DataFrame({"x": [float(i)]})) for i in range(4)]
+
+    results, errors = _submit_concurrently(batcher, requests)
+
+    assert results == [None] * len(requests)
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    with pytest.raises(RuntimeError):
+        batcher.submit("m1", requests[0][1])
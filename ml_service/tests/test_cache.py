@@ -0,0 +1,126 @@
+"""
+core.cache.LRUCache のテスト
+"""
+import pytest
+
+from core import cache as cache_module
+from core.cache import LRUCache
+
+
+class FakeClock:
+    """time.monotonicの代わりに進める時計"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache("test", max_bytes=30)
+    cache.put("a", 1, 10)
+    cache.put("b", 2, 10)
+    cache.put("c", 3, 10)
+
+    # aを参照するとbが最も古くなる
+    assert cache.get("a") == 1
+    cache.put("d", 4, 10)
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == [1, 3, 4]
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["bytes"] == 30
+    assert stats["evictions"] == 1
+
+
+def test_evicts_until_under_limit():
+    cache = LRUCache("test", max_bytes=30)
+    for key in ("a", "b", "c"):
+        cache.put(key, key, 10)
+    cache.put("big", "big", 25)
+
+    assert cache.get("big") == "big"
+    assert all(cache.get(key) is None for key in ("a", "b", "c"))
+    assert cache.stats()["bytes"] == 25
+
+
+def test_rejects_value_larger_than_limit():
+    cache = LRUCache("test", max_bytes=10)
+    cache.put("a", 1, 5)
+
+    assert cache.put("big", 2, 11) is False
+    assert cache.get("big") is None
+    assert cache.get("a") == 1
+
+
+def test_replacing_key_updates_bytes():
+    cache = LRUCache("test", max_bytes=100)
+    cache.put("a", 1, 40)
+    cache.put("a", 2, 10)
+
+    assert cache.get("a") == 2
+    assert cache.stats()["bytes"] == 10
+
+
+def test_invalidate_by_predicate():
+    cache = LRUCache("test", max_bytes=100)
+    cache.put(("m1", 0), "x", 10)
+    cache.put(("m1", 1), "y", 10)
+    cache.put(("m2", 0), "z", 10)
+
+    assert cache.invalidate(lambda key: key[0] == "m1") == 2
+    assert cache.get(("m2", 0)) == "z"
+    assert cache.stats()["bytes"] == 10
+
+
+def test_hit_rate():
+    cache = LRUCache("test", max_bytes=100)
+    assert cache.stats()["hit_rate"] is None
+
+    cache.put("a", 1, 10)
+    cache.get("a")
+    cache.get("missing")
+
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LRUCache("test", max_bytes=100, ttl=60)
+    cache.put("a", 1, 10)
+
+    clock.now += 59
+    assert cache.get("a") == 1
+
+    clock.now += 1
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["entries"] == 0
+    assert stats["bytes"] == 0
+
+
+def test_ttl_counts_from_put_not_from_get(clock):
+    cache = LRUCache("test", max_bytes=100, ttl=60)
+    cache.put("a", 1, 10)
+    clock.now += 50
+    cache.get("a")
+    clock.now += 10
+
+    assert cache.get("a") is None
+
+
+def test_no_ttl_never_expires(clock):
+    cache = LRUCache("test", max_bytes=100, ttl=0)
+    cache.put("a", 1, 10)
+    clock.now += 10 ** 9
+
+    assert cache.get("a") == 1
@@ -0,0 +1,152 @@
+"""
+core.compiled のテスト（配列表現と元のモデルの予測値の一致）
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+
+from core import compiled as compiled_module
+from core.compiled import CompiledEnsemble, compile_model, maybe_compile, verify_compiled
+
+FEATURES = ["a", "b", "c", "d"]
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(400, len(FEATURES))), columns=FEATURES)
+    # 0ちょうどの値を多く含め、LightGBMの0ビンの分岐を作る
+    X.loc[rng.random(len(X)) < 0.3, "a"] = 0.0
+    X.loc[rng.random(len(X)) < 0.3, "b"] = 0.0
+    y = X["a"] * 3 + np.sin(X["b"] * 2) + X["c"] * X["d"] + rng.normal(scale=0.1, size=len(X))
+    return X, y
+
+
+def _lightgbm(**params):
+    lightgbm = pytest.importorskip("lightgbm")
+    return lightgbm.LGBMRegressor(n_estimators=50, verbose=-1, **params)
+
+
+def _xgboost():
+    xgboost = pytest.importorskip("xgboost")
+    return xgboost.XGBRegressor(n_estimators=50, max_depth=4)
+
+
+def _catboost():
+    catboost = pytest.importorskip("catboost")
+    return catboost.CatBoostRegressor(iterations=50, depth=4, verbose=False, allow_writing_files=False)
+
+
+MODEL_FACTORIES = {
+    "gbr": lambda: GradientBoostingRegressor(n_estimators=50, random_state=0),
+    "rf": lambda: RandomForestRegressor(n_estimators=20, max_depth=6, random_state=0),
+    "lightgbm": _lightgbm,
+    "lightgbm_zero_as_missing": lambda: _lightgbm(zero_as_missing=True),
+    "xgboost": _xgboost,
+    "catboost": _catboost,
+}
+
+
+def assert_close_to_model(compiled, model, X):
+    expected = np.asarray(model.predict(X), dtype=np.float64)
+    atol = 1e-6 * max(1.0, float(np.abs(expected).max()))
+    np.testing.assert_allclose(compiled.predict(X), expected, rtol=1e-5, atol=atol)
+
+
+@pytest.mark.parametrize("name", list(MODEL_FACTORIES))
+def test_compiled_matches_original(name, data):
+    X, y = data
+    model = MODEL_FACTORIES[name]().fit(X, y)
+
+    compiled = compile_model(model)
+
+    assert isinstance(compiled, CompiledEnsemble)
+    assert compiled.feature_names == FEATURES
+    assert_close_to_model(compiled, model, X)
+    assert verify_compiled(compiled, model)
+
+
+@pytest.mark.parametrize("name", list(MODEL_FACTORIES))
+def test_compiled_reorders_dataframe_columns(name, data):
+    X, y = data
+    model = MODEL_FACTORIES[name]().fit(X, y)
+    compiled = compile_model(model)
+
+    shuffled = X[FEATURES[::-1]]
+
+    np.testing.assert_array_equal(compiled.predict(shuffled), compiled.predict(X))
+
+
+@pytest.mark.parametrize("name", list(MODEL_FACTORIES))
+def test_compiled_ndarray_model_uses_positional_columns(name, data):
+    X, y = data
+    model = MODEL_FACTORIES[name]().fit(X.to_numpy(), y.to_numpy())
+
+    compiled = compile_model(model)
+
+    # 自動生成された特徴量名（Column_0、'0'など）でカラムを探さない
+    assert compiled.feature_names is None
+    assert_close_to_model(compiled, model, X.to_numpy())
+
+
+@pytest.mark.parametrize("zero_as_missing", [False, True])
+def test_lightgbm_inputs_near_zero_threshold(zero_as_missing, data):
+    X, y = data
+    model = _lightgbm(zero_as_missing=zero_as_missing).fit(X, y)
+    compiled = compile_model(model)
+
+    # LightGBMはkZeroThreshold（1e-35f）以下の絶対値を0として扱う
+    k_zero = float(np.float32(1e-35))
+    values = [0.0, -0.0, k_zero, -k_zero, 1e-36, -1e-36, 2e-35, -2e-35, np.nan]
+    probe = pd.DataFrame(
+        [[v, w, 0.5, -0.5] for v in values for w in values], columns=FEATURES
+    )
+
+    assert_close_to_model(compiled, model, probe)
+
+
+@pytest.mark.parametrize("name", list(MODEL_FACTORIES))
+def test_prediction_does_not_depend_on_batch(name, data):
+    X, y = data
+    model = MODEL_FACTORIES[name]().fit(X, y)
+    compiled = compile_model(model)
+
+    batch = compiled.predict(X.iloc[:100])
+    rows = np.array([compiled.predict(X.iloc[i:i + 1])[0] for i in range(100)])
+
+    # 予測結果キャッシュのヒット・ミスで値が変わらないよう、末尾の桁まで一致すること
+    np.testing.assert_array_equal(batch, rows)
+    np.testing.assert_array_equal(compiled.predict(X.iloc[50:100]), batch[50:])
+
+
+def test_maybe_compile_disabled_returns_original(monkeypatch, data):
+    X, y = data
+    model = GradientBoostingRegressor(n_estimators=10, random_state=0).fit(X, y)
+    monkeypatch.setattr(compiled_module, "COMPILE_TREE_MODELS", False)
+
+    assert maybe_compile(model) is model
+
+
+def test_maybe_compile_falls_back_above_max_rows(monkeypatch, data):
+    X, y = data
+    model = GradientBoostingRegressor(n_estimators=10, random_state=0).fit(X, y)
+    monkeypatch.setattr(compiled_module, "COMPILE_TREE_MODELS", True)
+    monkeypatch.setattr(compiled_module, "COMPILE_MAX_ROWS", 10)
+
+    compiled = maybe_compile(model)
+
+    assert isinstance(compiled, CompiledEnsemble)
+    assert compiled.model is model
+    np.testing.assert_array_equal(compiled.predict(X.iloc[:11]), model.predict(X.iloc[:11]))
+    assert_close_to_model(compiled, model, X.iloc[:10])
+
+
+def test_maybe_compile_unsupported_model_returns_original(monkeypatch, data):
+    from sklearn.linear_model import LinearRegression
+
+    X, y = data
+    model = LinearRegression().fit(X, y)
+    monkeypatch.setattr(compiled_module, "COMPILE_TREE_MODELS", True)
+
+    assert maybe_compile(model) is model
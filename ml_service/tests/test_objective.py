@@ -0,0 +1,220 @@
+"""
+core.objective のテスト（探索空間・スコア計算プラン・パレート判定・候補の順位付け）
+"""
+import numpy as np
+import pytest
+from optuna.distributions import CategoricalDistribution, FloatDistribution, IntDistribution
+
+import app as app_module
+from core.objective import compile_scoring_plan, compile_search_space, pareto_mask, rank_candidates
+from core.optimize import compile_objective
+
+
+def test_search_space_orders_params_by_model_features():
+    space = compile_search_space(
+        [{"name": "b", "type": "int", "low": 0, "high": 3}, {"name": "a", "low": 0.0, "high": 1.0}],
+        x_list=["a", "b"],
+    )
+
+    assert space.names == ["a", "b"]
+    assert space.to_matrix([{"b": 2, "a": 0.5}]).tolist() == [[0.5, 2.0]]
+    assert list(space.to_frame(np.zeros((1, 2))).columns) == ["a", "b"]
+
+
+def test_search_space_maps_unit_points_to_params():
+    space = compile_search_space(
+        [{"name": "b", "type": "int", "low": 0, "high": 3}, {"name": "a", "low": 0.0, "high": 1.0}],
+        x_list=["a", "b"],
+    )
+
+    matrix = space.from_unit(np.array([[0.5, 0.99], [0.0, 0.0]]))
+    assert matrix.tolist() == [[0.5, 3.0], [0.0, 0.0]]
+    assert space.to_params(matrix[0]) == {"a": 0.5, "b": 3}
+
+
+def test_from_unit_splits_int_and_categorical_ranges_evenly():
+    space = compile_search_space([
+        {"name": "n", "type": "int", "low": 1, "high": 4},
+        {"name": "c", "type": "category", "choices": [10, 20, 30]},
+    ])
+    unit = np.column_stack([np.linspace(0, 1, 12, endpoint=False)] * 2)
+
+    matrix = space.from_unit(unit)
+
+    assert np.unique(matrix[:, 0], return_counts=True)[1].tolist() == [3, 3, 3, 3]
+    assert np.unique(matrix[:, 1], return_counts=True)[1].tolist() == [4, 4, 4]
+    assert set(matrix[:, 1]) == {10.0, 20.0, 30.0}
+    # 境界値（1.0）も範囲内に収める
+    assert space.from_unit(np.ones((1, 2))).tolist() == [[4.0, 30.0]]
+
+
+def test_search_space_accepts_type_aliases_and_min_max():
+    space = compile_search_space([
+        {"name": "t", "type": "整数", "min": 800, "max": 1000},
+        {"name": "r", "type": "小数", "min": 0.5, "max": 1.5},
+        {"name": "c", "type": "カテゴリ", "choices": ["1", 2, 3.5]},
+        {"name": "d"},
+    ])
+
+    assert space.names == ["t", "r", "c", "d"]
+    assert space.distributions["t"] == IntDistribution(800, 1000)
+    assert space.distributions["r"] == FloatDistribution(0.5, 1.5)
+    assert space.distributions["c"] == CategoricalDistribution((1.0, 2.0, 3.5))
+    # 範囲・型の指定がない場合は0〜100の小数
+    assert space.distributions["d"] == FloatDistribution(0, 100)
+
+
+@pytest.mark.parametrize("param_configs, x_list, message", [
+    ([{"name": "z", "low": 0, "high": 1}], ["a"], "Params not used by the model"),
+    ([{"name": "a", "low": 0, "high": 1}], ["a", "b"], r"Missing param configs for model features: \['b'\]"),
+    ([], None, "must not be empty"),
+    ([{"low": 0, "high": 1}], None, "requires a name"),
+    ([{"name": "a"}, {"name": "a"}], None, "Duplicate param config"),
+    ([{"name": "a", "low": 2, "high": 1}], None, "low .* > high"),
+    ([{"name": "a", "low": "x"}], None, "Invalid range"),
+    ([{"name": "a", "type": "category"}], None, "requires choices"),
+    ([{"name": "a", "type": "category", "choices": ["low", "high"]}], None, "numeric choices"),
+])
+def test_search_space_rejects_invalid_configs(param_configs, x_list, message):
+    with pytest.raises(ValueError, match=message):
+        compile_search_space(param_configs, x_list=x_list)
+
+
+def test_scoring_plan_matches_targets_by_name():
+    plan = compile_scoring_plan(
+        [{"name": "y1", "type": "maximize"}, {"name": "y0", "type": "target", "value": 5}],
+        ["y0", "y1"],
+    )
+
+    assert plan.model_indices == [1, 0]
+    assert plan.directions == ["maximize", "minimize"]
+    assert plan.required_models == [0, 1]
+    scores = plan.score({0: np.array([4.0, 7.0]), 1: np.array([1.0, 2.0])})
+    # 目標値指定は目標値との差（絶対値）を最小化する
+    np.testing.assert_array_equal(scores, [[1.0, 1.0], [2.0, 2.0]])
+    # 最大化の目的変数は符号を反転して小さいほど良い値にする
+    np.testing.assert_array_equal(plan.to_costs(scores), [[-1.0, 1.0], [-2.0, 2.0]])
+
+
+def test_scoring_plan_uses_model_order_without_names():
+    plan = compile_scoring_plan(
+        [{"type": "最小化"}, {"type": "目標値", "value": "0.5"}],
+        [None, None],
+    )
+
+    assert plan.model_indices == [0, 1]
+    assert plan.directions == ["minimize", "minimize"]
+    np.testing.assert_array_equal(plan.score({0: [3.0], 1: np.array([[1.0]])}), [[3.0, 0.5]])
+
+
+def test_scoring_plan_reuses_one_model_for_several_objectives():
+    plan = compile_scoring_plan(
+        [{"name": "y0", "type": "最大化"}, {"name": "y0", "type": "目標値", "value": 1}],
+        ["y0", "y1"],
+    )
+
+    assert plan.required_models == [0]
+    np.testing.assert_array_equal(plan.score({0: np.array([3.0])}), [[3.0, 2.0]])
+
+
+@pytest.mark.parametrize("targets, message", [
+    ([], "must not be empty"),
+    ([{"name": "y0"}, {"name": "y1"}, {"name": "y2"}], "3 target configs for 2 model"),
+    ([{"name": "hardness"}], "Unknown target: hardness"),
+    ([{"name": "y0", "type": "目標値"}], "Target value is required"),
+    ([{"name": "y0", "type": "target", "value": "high"}], "Invalid target value"),
+    ([{"name": "y0", "type": "best"}], "Unknown target type"),
+])
+def test_scoring_plan_rejects_invalid_targets(targets, message):
+    with pytest.raises(ValueError, match=message):
+        compile_scoring_plan(targets, ["y0", "y1"])
+
+
+def test_compile_objective_checks_registry_entry(registered_model):
+    mlflow_id, _, _ = registered_model
+    params = [{"name": "a", "low": 0, "high": 1}, {"name": "b", "low": 0, "high": 1}]
+
+    search_space, scoring_plan = compile_objective(mlflow_id, params, [{"name": "y1", "type": "最小化"}])
+
+    assert search_space.names == ["a", "b"]
+    assert scoring_plan.model_indices == [1]
+    with pytest.raises(ValueError, match="No model found"):
+        compile_objective("missing", params, [{"name": "y1"}])
+
+
+def test_optimize_route_rejects_mismatched_configs(registered_model, monkeypatch):
+    mlflow_id, _, _ = registered_model
+    monkeypatch.setattr(app_module, "start_warmup", lambda: None)
+    started = []
+    monkeypatch.setattr(app_module, "optimize_model", lambda **kwargs: started.append(kwargs))
+
+    response = app_module.app.test_client().post("/api/ml/optimize", json={
+        "mlflow_id": mlflow_id,
+        "param_configs": [{"name": "a", "low": 0, "high": 1}],
+        "target_param_configs": [{"name": "y0", "type": "最大化"}],
+    })
+
+    assert response.status_code == 400
+    assert "Missing param configs" in response.json["error"]
+    assert started == []
+
+
+def brute_force_pareto_mask(costs):
+    """全ペア比較によるパレート判定（値が一致する行は先頭のみ）"""
+    mask = np.zeros(len(costs), dtype=bool)
+    for i, row in enumerate(costs):
+        if np.isnan(row).any():
+            continue
+        dominated = False
+        for j, other in enumerate(costs):
+            if i == j or np.isnan(other).any():
+                continue
+            if np.all(other <= row) and (np.any(other < row) or j < i):
+                dominated = True
+                break
+        mask[i] = not dominated
+    return mask
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("n_objectives", [2, 3])
+def test_pareto_mask_matches_brute_force(seed, n_objectives):
+    rng = np.random.default_rng(seed)
+    # 離散値にして一致・部分一致する行を含める
+    costs = rng.integers(0, 6, size=(60, n_objectives)).astype(np.float64)
+    costs[rng.random(60) < 0.1, 0] = np.nan
+
+    np.testing.assert_array_equal(pareto_mask(costs), brute_force_pareto_mask(costs))
+
+
+def test_pareto_mask_keeps_first_of_duplicates():
+    costs = np.array([[1.0, 2.0], [1.0, 2.0], [2.0, 1.0], [3.0, 3.0]])
+
+    assert pareto_mask(costs).tolist() == [True, False, True, False]
+
+
+def test_pareto_mask_excludes_nan_rows():
+    costs = np.array([[np.nan, 0.0], [1.0, 1.0]])
+
+    assert pareto_mask(costs).tolist() == [False, True]
+
+
+def test_rank_single_objective_ascending_without_nan():
+    costs = np.array([[3.0], [np.nan], [1.0], [2.0], [1.0]])
+
+    assert rank_candidates(costs, 3).tolist() == [2, 4, 3]
+    assert rank_candidates(costs, 10).tolist() == [2, 4, 3, 0]
+
+
+def test_rank_multi_objective_peels_fronts():
+    costs = np.array([
+        [3.0, 1.0],  # 第1フロント
+        [1.0, 3.0],  # 第1フロント
+        [2.0, 2.0],  # 第1フロント
+        [3.0, 3.0],  # 第2フロント
+        [4.0, 4.0],  # 第3フロント
+    ])
+
+    # 同じフロント内は第1目的変数の昇順
+    assert rank_candidates(costs, 5).tolist() == [1, 2, 0, 3, 4]
+    assert rank_candidates(costs, 2).tolist() == [1, 2]
@@ -0,0 +1,262 @@
+"""
+core.optimize のテスト（ask/tellによるバッチ評価・網羅評価）
+"""
+import numpy as np
+import optuna
+import pandas as pd
+import pytest
+from optuna.trial import TrialState
+
+import app as app_module
+from core import optimize
+from core.objective import ScoringPlan
+
+PARAM_CONFIGS = [
+    {"name": "a", "type": "float", "low": 0, "high": 1},
+    {"name": "b", "type": "int", "low": 0, "high": 10},
+]
+TARGETS = [{"name": "y0", "type": "最大化"}]
+
+
+@pytest.fixture
+def counted_models(registered_model, monkeypatch):
+    """モデルごとのpredict呼び出しの入力行数を記録する"""
+    mlflow_id, _, _ = registered_model
+    calls = []
+
+    class CountingModel:
+        def __init__(self, model, idx):
+            self.model = model
+            self.idx = idx
+
+        def predict(self, df):
+            calls.append((self.idx, len(df)))
+            return self.model.predict(df)
+
+    load_models = optimize.load_models
+
+    def load_counting_models(mid):
+        entry, models = load_models(mid)
+        return entry, [CountingModel(model, idx) for idx, model in enumerate(models)]
+
+    monkeypatch.setattr(optimize, "load_models", load_counting_models)
+    return mlflow_id, calls
+
+
+@pytest.fixture
+def studies(monkeypatch):
+    """作成したstudyを記録する"""
+    created = []
+    create_study = optuna.create_study
+
+    def record(**kwargs):
+        study = create_study(**kwargs)
+        created.append(study)
+        return study
+
+    monkeypatch.setattr(optimize.optuna, "create_study", record)
+    return created
+
+
+def test_batches_candidates_into_one_predict_call(counted_models, studies):
+    mlflow_id, calls = counted_models
+
+    result = optimize.optimize_model(mlflow_id, PARAM_CONFIGS, TARGETS, n_trials=10, batch_size=4)
+
+    # 使用する目的変数のモデルのみ、4件・4件・2件の3回で予測する
+    assert calls == [(0, 4), (0, 4), (0, 2)]
+    assert result["batch_size"] == 4
+    (study,) = studies
+    assert len(study.trials) == 10
+    assert all(trial.state == TrialState.COMPLETE for trial in study.trials)
+    assert result["best_value"] == max(trial.value for trial in study.trials)
+    assert isinstance(result["best_params"]["b"], int)
+
+
+def test_batch_size_defaults_to_config(counted_models, monkeypatch):
+    mlflow_id, calls = counted_models
+    monkeypatch.setattr(optimize, "OPTIMIZE_BATCH_SIZE", 3)
+
+    result = optimize.optimize_model(mlflow_id, PARAM_CONFIGS, TARGETS, n_trials=5)
+
+    assert result["batch_size"] == 3
+    assert [rows for _, rows in calls] == [3, 2]
+
+
+def test_multi_objective_batch_scores_every_target(counted_models):
+    mlflow_id, calls = counted_models
+    targets = [{"name": "y0", "type": "最大化"}, {"name": "y1", "type": "目標値", "value": 0.5}]
+
+    result = optimize.optimize_model(mlflow_id, PARAM_CONFIGS, targets, n_trials=6, batch_size=6)
+
+    assert sorted(calls) == [(0, 6), (1, 6)]
+    assert all(len(values) == 2 for values in result["best_value"])
+
+
+def test_failed_batch_leaves_no_running_trials(counted_models, studies, monkeypatch):
+    mlflow_id, _ = counted_models
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("scoring failed")
+
+    monkeypatch.setattr(ScoringPlan, "score", fail)
+
+    with pytest.raises(RuntimeError, match="scoring failed"):
+        optimize.optimize_model(mlflow_id, PARAM_CONFIGS, TARGETS, n_trials=4, batch_size=4)
+
+    (study,) = studies
+    assert [trial.state for trial in study.trials] == [TrialState.FAIL] * 4
+
+
+@pytest.mark.parametrize("batch_size", [0, -1, 2.5, "4", True])
+def test_resolve_batch_size_rejects_invalid_values(batch_size):
+    with pytest.raises(ValueError, match="batch_size must be a positive integer"):
+        optimize.resolve_batch_size(batch_size)
+
+
+def test_resolve_batch_size(monkeypatch):
+    monkeypatch.setattr(optimize, "OPTIMIZE_BATCH_SIZE", 0)
+
+    assert optimize.resolve_batch_size(None) == 1
+    assert optimize.resolve_batch_size(16) == 16
+
+
+@pytest.mark.parametrize("options, error", [
+    ({"batch_size": 0}, "batch_size"),
+    ({"sweep": {"method": "grid"}}, "Unknown sweep method"),
+    ({"sweep": {"n_samples": 0}}, "n_samples"),
+])
+def test_optimize_route_rejects_invalid_options(registered_model, monkeypatch, options, error):
+    mlflow_id, _, _ = registered_model
+    monkeypatch.setattr(app_module, "start_warmup", lambda: None)
+    started = []
+    monkeypatch.setattr(app_module, "optimize_model", lambda **kwargs: started.append(kwargs))
+
+    response = app_module.app.test_client().post("/api/ml/optimize", json={
+        "mlflow_id": mlflow_id, "param_configs": PARAM_CONFIGS, "target_param_configs": TARGETS, **options
+    })
+
+    assert response.status_code == 400
+    assert error in response.json["error"]
+    assert started == []
+
+
+def test_resolve_sweep_options_defaults(monkeypatch):
+    monkeypatch.setattr(optimize, "OPTIMIZE_SWEEP_SAMPLES", 256)
+    monkeypatch.setattr(optimize, "OPTIMIZE_SWEEP_SEED_TRIALS", 8)
+
+    assert optimize.resolve_sweep_options(None) is None
+    assert optimize.resolve_sweep_options(False) is None
+    assert optimize.resolve_sweep_options(True) == {"method": "sobol", "n_samples": 256, "seed_trials": 8}
+    assert optimize.resolve_sweep_options({"method": "LHS", "n_samples": "100", "seed_trials": 0}) == {
+        "method": "lhs", "n_samples": 100, "seed_trials": 0
+    }
+
+
+@pytest.mark.parametrize("sweep, message", [
+    ("sobol", "sweep must be true or an object"),
+    ({"method": "grid"}, "Unknown sweep method: grid"),
+    ({"n_samples": "many"}, "must be integers"),
+    ({"seed_trials": None}, "must be integers"),
+    ({"n_samples": 0}, "between 1 and 1000"),
+    ({"n_samples": 1001}, "between 1 and 1000"),
+    ({"n_samples": 10, "seed_trials": -1}, "must not be negative"),
+])
+def test_resolve_sweep_options_rejects_invalid_values(monkeypatch, sweep, message):
+    monkeypatch.setattr(optimize, "OPTIMIZE_SWEEP_MAX_SAMPLES", 1000)
+
+    with pytest.raises(ValueError, match=message):
+        optimize.resolve_sweep_options(sweep)
+
+
+def test_run_sweep_scores_candidates_in_batches(counted_models, monkeypatch):
+    mlflow_id, calls = counted_models
+    targets = [{"name": "y1", "type": "最小化"}, {"name": "y0", "type": "目標値", "value": 1.0}]
+    search_space, scoring_plan = optimize.compile_objective(mlflow_id, PARAM_CONFIGS, targets)
+    _, loaded_models = optimize.load_models(mlflow_id)
+    monkeypatch.setattr(optimize, "OPTIMIZE_SWEEP_BATCH_ROWS", 50)
+
+    matrix, scores = optimize._run_sweep(
+        search_space, scoring_plan, loaded_models, {"method": "sobol", "n_samples": 100, "seed_trials": 0}
+    )
+
+    # Sobol列は2のべき乗に切り上げる
+    assert matrix.shape == (128, 2)
+    assert scores.shape == (128, 2)
+    assert sorted(calls) == [(0, 28), (0, 50), (0, 50), (1, 28), (1, 50), (1, 50)]
+    assert ((matrix[:, 0] >= 0) & (matrix[:, 0] <= 1)).all()
+    assert set(matrix[:, 1]) <= set(range(11))
+    expected = scoring_plan.score({
+        idx: loaded_models[idx].model.predict(pd.DataFrame(matrix, columns=["a", "b"])) for idx in (0, 1)
+    })
+    np.testing.assert_allclose(scores, expected)
+
+
+def test_run_sweep_latin_hypercube_keeps_sample_count(counted_models):
+    mlflow_id, _ = counted_models
+    search_space, scoring_plan = optimize.compile_objective(mlflow_id, PARAM_CONFIGS, TARGETS)
+    _, loaded_models = optimize.load_models(mlflow_id)
+
+    matrix, scores = optimize._run_sweep(
+        search_space, scoring_plan, loaded_models, {"method": "lhs", "n_samples": 100, "seed_trials": 0}
+    )
+
+    assert matrix.shape == (100, 2)
+    assert scores.shape == (100, 1)
+    # ラテン超方格は各区間に1点ずつ配置する
+    assert sorted(np.floor(matrix[:, 0] * 100).astype(int).tolist()) == list(range(100))
+
+
+def test_select_seed_rows_adds_random_contrast_rows():
+    costs = np.array([[5.0], [np.nan], [1.0], [4.0], [2.0], [6.0], [3.0], [np.nan], [7.0], [0.5]])
+
+    rows = optimize._select_seed_rows(costs, 3)
+
+    assert rows.dtype == np.int64
+    # 良い順の3件の後に、それ以外（NaNを除く）から同数を重複なしで選ぶ
+    assert rows[:3].tolist() == [9, 2, 4]
+    assert len(rows) == 6
+    assert len(set(rows.tolist())) == 6
+    assert set(rows[3:].tolist()) <= {0, 3, 5, 6, 8}
+
+
+def test_select_seed_rows_limits_contrast_to_remaining_rows():
+    costs = np.array([[3.0], [1.0], [2.0], [np.nan]])
+
+    assert sorted(optimize._select_seed_rows(costs, 2).tolist()) == [0, 1, 2]
+    assert optimize._select_seed_rows(costs, 10).tolist() == [1, 2, 0]
+    assert optimize._select_seed_rows(costs, 0).tolist() == []
+
+
+def test_sweep_seeds_tpe_and_picks_best_from_all_candidates(counted_models, studies):
+    mlflow_id, _ = counted_models
+
+    result = optimize.optimize_model(
+        mlflow_id, PARAM_CONFIGS, TARGETS, n_trials=8, batch_size=4,
+        sweep={"method": "sobol", "n_samples": 60, "seed_trials": 5}
+    )
+
+    assert result["sweep"] == {"method": "sobol", "n_samples": 64, "seed_trials": 5, "seeded_trials": 10}
+    (study,) = studies
+    assert len(study.trials) == 18
+    assert result["best_value"] >= max(trial.value for trial in study.trials)
+
+
+def test_multi_objective_sweep_returns_pareto_front(counted_models, workdir):
+    mlflow_id, _ = counted_models
+    targets = [{"name": "y0", "type": "最大化"}, {"name": "y1", "type": "最小化"}]
+
+    result = optimize.optimize_model(
+        mlflow_id, PARAM_CONFIGS, targets, n_trials=4, batch_size=4, run_id="run1",
+        sweep={"method": "lhs", "n_samples": 32, "seed_trials": 4}
+    )
+
+    front = result["pareto_front"]
+    assert front
+    assert result["best_value"] == [p["values"] for p in front[:5]]
+    # フロントは第1目的変数（最大化）のコストの昇順
+    first = [p["values"][0] for p in front]
+    assert first == sorted(first, reverse=True)
+    sweep_result = pd.read_csv(f"{result['result_path']}/sweep_result.csv")
+    assert list(sweep_result.columns) == ["a", "b", "values_0", "values_1"]
+    assert len(sweep_result) == 32
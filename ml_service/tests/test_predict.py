@@ -0,0 +1,270 @@
+"""
+core.predict のテスト
+"""
+import os
+import pickle
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import pytest
+import shap
+from sklearn.tree import DecisionTreeRegressor
+
+from core import predict, registry
+from core.train import create_explainer
+
+
+@pytest.fixture
+def latencies(monkeypatch):
+    """同期予測の処理時間の記録をリセット"""
+    window = deque(maxlen=100)
+    monkeypatch.setattr(predict, "_sync_latencies", window)
+    return window
+
+
+def test_predict_sync_returns_predictions(registered_model, latencies):
+    mlflow_id, x_list, models = registered_model
+    rows = [{"a": 0.1, "b": 0.2}, {"a": 0.5, "b": None, "extra": "x"}]
+
+    result = predict.predict_sync(mlflow_id, x_list, rows)
+
+    X = pd.DataFrame({"a": [0.1, 0.5], "b": [0.2, 0.0]})
+    assert result["num_models"] == 2
+    assert result["num_samples"] == 2
+    for idx, model in enumerate(models):
+        expected = model.predict(X)
+        np.testing.assert_allclose([r[f"predicted_target_{idx}"] for r in result["predictions"]], expected)
+    # 説明変数以外のカラムは返さない
+    assert set(result["predictions"][0]) == {"a", "b", "predicted_target_0", "predicted_target_1"}
+    assert list(latencies) == [result["latency_ms"]]
+
+
+def test_predict_sync_accepts_single_row_dict(registered_model, latencies):
+    mlflow_id, x_list, models = registered_model
+
+    result = predict.predict_sync(mlflow_id, x_list, {"a": 1.0, "b": 2.0})
+
+    assert result["num_samples"] == 1
+    assert result["predictions"][0]["predicted_target_0"] == pytest.approx(models[0].predict(
+        pd.DataFrame({"a": [1.0], "b": [2.0]}))[0])
+
+
+def test_predict_sync_does_not_wait_for_batch(registered_model, latencies, monkeypatch):
+    mlflow_id, x_list, _ = registered_model
+
+    def fail(*args, **kwargs):
+        raise AssertionError("synchronous prediction should not be batched")
+
+    monkeypatch.setattr(predict._batcher, "submit", fail)
+    result = predict.predict_sync(mlflow_id, x_list, [{"a": 0.3, "b": 0.4}])
+
+    assert result["num_samples"] == 1
+
+
+def test_predict_sync_batches_when_enabled(registered_model, latencies, monkeypatch):
+    mlflow_id, x_list, models = registered_model
+    submitted = []
+
+    def submit(key, df):
+        submitted.append(key)
+        return [model.predict(df) for model in models]
+
+    monkeypatch.setattr(predict, "SYNC_PREDICT_MICRO_BATCH", True)
+    monkeypatch.setattr(predict, "MICRO_BATCH_MAX_WAIT_MS", 2)
+    monkeypatch.setattr(predict._batcher, "submit", submit)
+    predict.predict_sync(mlflow_id, x_list, [{"a": 0.3, "b": 0.4}])
+
+    assert submitted == [(mlflow_id, tuple(x_list))]
+
+
+def test_predict_sync_rejects_invalid_input(registered_model, latencies, monkeypatch):
+    mlflow_id, x_list, _ = registered_model
+    monkeypatch.setattr(predict, "SYNC_PREDICT_MAX_ROWS", 2)
+
+    with pytest.raises(ValueError, match="Too many rows"):
+        predict.predict_sync(mlflow_id, x_list, [{"a": 1, "b": 2}] * 3)
+    with pytest.raises(ValueError, match="must be a dict or a list"):
+        predict.predict_sync(mlflow_id, x_list, "data/datasets/input.csv")
+    with pytest.raises(ValueError, match="Missing columns"):
+        predict.predict_sync(mlflow_id, x_list, [{"a": 1}])
+    assert len(latencies) == 0
+
+
+def test_sync_latency_stats(latencies):
+    assert predict.get_sync_latency_stats() == {
+        "count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None
+    }
+
+    latencies.extend(float(ms) for ms in range(1, 101))
+    stats = predict.get_sync_latency_stats()
+
+    assert stats["count"] == 100
+    assert stats["p50_ms"] == pytest.approx(50.5)
+    assert stats["p99_ms"] == pytest.approx(99.01)
+    assert stats["max_ms"] == 100.0
+
+
+def test_sync_latency_window_keeps_recent_calls(registered_model, latencies, monkeypatch):
+    mlflow_id, x_list, _ = registered_model
+    window = deque([1000.0] * 3, maxlen=3)
+    monkeypatch.setattr(predict, "_sync_latencies", window)
+
+    for _ in range(3):
+        predict.predict_sync(mlflow_id, x_list, {"a": 0.1, "b": 0.2})
+
+    assert predict.get_sync_latency_stats()["max_ms"] < 1000.0
+
+
+@pytest.mark.parametrize("options, expected", [
+    ({"rows": [5, 0, 5, 2]}, [0, 2, 5]),
+    ({"rows": []}, []),
+    ({"rows": [np.int64(3)]}, [3]),
+    ({"sample_size": 20}, list(range(10))),
+])
+def test_select_shap_rows(options, expected):
+    assert predict._select_shap_rows(options, 10).tolist() == expected
+
+
+def test_select_shap_rows_samples_reproducibly():
+    rows = predict._select_shap_rows({"sample_size": 3, "seed": 1}, 100)
+
+    assert len(rows) == 3
+    assert rows.tolist() == sorted(rows.tolist())
+    assert rows.tolist() == predict._select_shap_rows({"sample_size": 3, "seed": 1}, 100).tolist()
+    assert len(predict._select_shap_rows(True, 1000)) == predict.SHAP_DEFAULT_SAMPLE_SIZE
+
+
+@pytest.mark.parametrize("options, message", [
+    ({"rows": [1.5]}, "integer row indices"),
+    ({"rows": [1.0]}, "integer row indices"),
+    ({"rows": ["1"]}, "integer row indices"),
+    ({"rows": [True]}, "integer row indices"),
+    ({"rows": 3}, "integer row indices"),
+    ({"rows": [10]}, "out of range"),
+    ({"rows": [-1]}, "out of range"),
+    ([0, 1], "shap must be true or an object"),
+])
+def test_select_shap_rows_rejects_invalid_rows(options, message):
+    with pytest.raises(ValueError, match=message):
+        predict._select_shap_rows(options, 10)
+
+
+def test_explain_rows_builds_explainer_from_input(registered_model):
+    _, x_list, models = registered_model
+    df = pd.DataFrame(np.random.default_rng(1).random((30, 2)), columns=x_list)
+
+    shap_values = predict._explain_rows(models, df, np.array([0, 4]))
+
+    assert sorted(shap_values) == ["target_0", "target_1"]
+    for idx, model in enumerate(models):
+        explanation = shap_values[f"target_{idx}"]
+        assert explanation.values.shape == (2, 2)
+        # SHAP値の合計と基準値の和は予測値に一致する
+        np.testing.assert_allclose(
+            explanation.values.sum(axis=1) + explanation.base_values,
+            model.predict(df.iloc[[0, 4]]),
+            atol=1e-6
+        )
+
+
+def test_explain_rows_uses_saved_explainers_and_skips_failures(registered_model):
+    _, x_list, models = registered_model
+    df = pd.DataFrame(np.random.default_rng(1).random((30, 2)), columns=x_list)
+    tree = DecisionTreeRegressor(max_depth=3, random_state=0).fit(df, df["a"] * 2)
+
+    class BrokenExplainer:
+        def __call__(self, rows):
+            raise RuntimeError("broken")
+
+    shap_values = predict._explain_rows(
+        [tree, models[1]], df, np.array([1, 2, 3]), [shap.TreeExplainer(tree), BrokenExplainer()]
+    )
+
+    # 失敗した目的変数のみ結果に含めない
+    assert list(shap_values) == ["target_0"]
+    assert shap_values["target_0"].values.shape == (3, 2)
+
+
+@pytest.fixture
+def tree_model(registered_model):
+    """学習時と同じ形式でExplainerを保存した決定木モデルを登録し、(mlflow_id, x_list, モデル)を返す"""
+    _, x_list, _ = registered_model
+    X = pd.DataFrame(np.random.default_rng(3).random((40, 2)), columns=x_list)
+    model = DecisionTreeRegressor(max_depth=3, random_state=0).fit(X, X["a"] * 3 - X["b"])
+    model_path = os.path.join("data", "results", "tree.pkl")
+    explainer_path = os.path.join("data", "results", "explainer_0.pkl")
+    with open(model_path, "wb") as f:
+        pickle.dump(model, f)
+    with open(explainer_path, "wb") as f:
+        pickle.dump(create_explainer(model, X), f)
+    registry.register_models("tree", [{
+        "index": 0, "target": "y", "local_path": model_path, "explainer_path": os.path.abspath(explainer_path)
+    }], x_list=x_list)
+    return "tree", x_list, model
+
+
+def test_create_explainer_pickles_tree_and_fallback_explainers(registered_model):
+    _, x_list, models = registered_model
+    X = pd.DataFrame(np.random.default_rng(4).random((500, 2)), columns=x_list)
+
+    tree = DecisionTreeRegressor(max_depth=3, random_state=0).fit(X, X["a"])
+    assert isinstance(pickle.loads(pickle.dumps(create_explainer(tree, X))), shap.TreeExplainer)
+
+    # 決定木以外は学習データからサンプリングした背景データを使う
+    linear = pickle.loads(pickle.dumps(create_explainer(models[0], X)))
+
+    assert not isinstance(linear, shap.TreeExplainer)
+    assert len(linear.masker.data) == predict.SHAP_BACKGROUND_SIZE
+    np.testing.assert_allclose(
+        linear(X.iloc[:2]).values.sum(axis=1) + linear(X.iloc[:2]).base_values,
+        models[0].predict(X.iloc[:2]),
+        atol=1e-6
+    )
+
+
+def test_predict_uses_saved_explainer_and_writes_rows(tree_model, monkeypatch):
+    mlflow_id, x_list, model = tree_model
+    rows = [{"a": i / 10, "b": 1 - i / 10} for i in range(10)]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("saved explainer should be used")
+
+    monkeypatch.setattr(predict.shap, "Explainer", fail)
+    result = predict.predict_model(mlflow_id, x_list, rows, run_id="pred1", shap_options={"rows": [7, 2]})
+
+    assert result["shap"]["rows"] == [2, 7]
+    assert result["shap"]["targets"] == ["target_0"]
+    with open(result["shap"]["path"], "rb") as f:
+        saved = pickle.load(f)
+    # 対象行の行番号とSHAP値を目的変数ごとに保存する
+    assert list(saved) == ["rows", "target_0"]
+    assert saved["rows"] == [2, 7]
+    explanation = saved["target_0"]
+    X = pd.DataFrame(rows).iloc[[2, 7]]
+    np.testing.assert_allclose(explanation.values.sum(axis=1) + explanation.base_values, model.predict(X))
+
+
+def test_saved_explainer_is_cached(tree_model, monkeypatch):
+    mlflow_id, x_list, _ = tree_model
+    rows = [{"a": 0.1, "b": 0.2}, {"a": 0.3, "b": 0.4}]
+    predict.predict_model(mlflow_id, x_list, rows, shap_options={"rows": [0]})
+
+    monkeypatch.setattr(registry, "load_explainer", lambda info: pytest.fail("explainer should be cached"))
+    result = predict.predict_model(mlflow_id, x_list, rows, shap_options={"rows": [1]})
+
+    assert result["shap"]["targets"] == ["target_0"]
+    # 保存先のない（run_id未指定の）予測ではファイルに書き込まない
+    assert result["shap"]["path"] is None
+
+
+def test_predict_without_saved_explainer_builds_one(registered_model):
+    mlflow_id, x_list, _ = registered_model
+
+    result = predict.predict_model(
+        mlflow_id, x_list, [{"a": 0.1, "b": 0.2}, {"a": 0.5, "b": 0.6}], run_id="pred2", shap_options=True
+    )
+
+    assert result["shap"]["rows"] == [0, 1]
+    assert result["shap"]["targets"] == ["target_0", "target_1"]
+    assert result["shap"]["path"].endswith("shap_values_dict.pkl")
@@ -0,0 +1,135 @@
+"""
+core.profile のテスト（データセットの統計プロファイル）
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import profile as profile_module
+from core import utils
+from core.cache import dataframe_cache
+from core.profile import compute_profile, profile_path, read_profile, write_profile
+
+
+@pytest.fixture(autouse=True)
+def clear_dataframe_cache(monkeypatch):
+    monkeypatch.setattr(utils, "_sidecar_failures", {})
+    dataframe_cache.invalidate()
+    yield
+    dataframe_cache.invalidate()
+
+
+def test_compute_profile_classifies_columns():
+    df = pd.DataFrame({
+        "x": [1.0, 2.0, np.nan, 4.0, 5.0],
+        "mostly_numeric": ["1", "2", "3", "4", "n/a"],
+        "label": ["a", "b", "a", None, "a"],
+    })
+
+    profile = compute_profile(df)
+
+    assert profile["rows"] == 5
+    assert profile["num_columns"] == 3
+    # 非欠損値の8割を超えて数値に変換できるカラムのみ数値カラムとみなす
+    assert profile["numeric_columns"] == ["x"]
+    assert profile["categorical_columns"] == ["mostly_numeric", "label"]
+
+    x = profile["columns"]["x"]
+    assert (x["count"], x["nulls"]) == (4, 1)
+    assert (x["min"], x["max"], x["mean"], x["median"]) == (1.0, 5.0, 3.0, 3.0)
+    assert x["quantiles"]["0.5"] == 3.0
+    assert sum(x["histogram"]["counts"]) == 4
+    assert len(x["histogram"]["bin_edges"]) == len(x["histogram"]["counts"]) + 1
+
+    label = profile["columns"]["label"]
+    assert label["unique"] == 2
+    assert label["top_values"][0] == {"value": "a", "count": 3}
+    assert "min" not in label
+
+
+def test_compute_profile_handles_empty_and_infinite_columns():
+    df = pd.DataFrame({"empty": [np.nan, np.nan], "inf": [np.inf, 1.0]})
+
+    profile = compute_profile(df)
+
+    assert profile["columns"]["empty"]["count"] == 0
+    assert "min" not in profile["columns"]["empty"]
+    # 有限値のみ集計し、JSONに出力できない値は含めない
+    assert profile["columns"]["inf"]["max"] == 1.0
+    assert profile["columns"]["inf"]["std"] is None
+
+
+def test_written_profile_is_invalidated_by_csv_update(workdir):
+    path = os.path.join("data", "datasets", "p.csv")
+    pd.DataFrame({"x": [1, 2]}).to_csv(path, index=False)
+    write_profile(path, compute_profile(pd.read_csv(path)), os.stat(path))
+
+    assert read_profile(path)["rows"] == 2
+
+    pd.DataFrame({"x": [1, 2, 3]}).to_csv(path, index=False)
+    assert read_profile(path) is None
+
+
+def test_concurrent_profile_writes_do_not_collide(workdir, monkeypatch):
+    path = os.path.join("data", "datasets", "p.csv")
+    pd.DataFrame({"x": [1, 2]}).to_csv(path, index=False)
+    profile = compute_profile(pd.read_csv(path))
+    stat = os.stat(path)
+    barrier = threading.Barrier(4)
+    replace = os.replace
+    replaced = []
+
+    def synchronized_replace(src, dst):
+        # 全スレッドが一時ファイルに書き込んでから置き換える
+        barrier.wait(timeout=10)
+        replace(src, dst)
+        replaced.append(src)
+
+    monkeypatch.setattr(profile_module.os, "replace", synchronized_replace)
+    threads = [threading.Thread(target=write_profile, args=(path, profile, stat)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert len(set(replaced)) == 4
+    assert read_profile(path)["rows"] == 2
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith(".tmp")]
+
+
+def test_load_dataset_profile_computes_once(workdir, monkeypatch):
+    path = os.path.join("data", "datasets", "sample.csv")
+    pd.DataFrame({"x": [1.5, 2.5, 3.5], "label": ["a", "b", "b"]}).to_csv(path, index=False)
+
+    profile = utils.load_dataset_profile("sample")
+
+    assert profile["rows"] == 3
+    assert profile["numeric_columns"] == ["x"]
+    assert os.path.exists(profile_path(path))
+    assert profile["source_size"] == os.stat(path).st_size
+
+    def fail(*args, **kwargs):
+        raise AssertionError("profile should be read from disk")
+
+    monkeypatch.setattr(utils, "compute_profile", fail)
+    monkeypatch.setattr(utils, "load_dataframe", fail)
+    assert utils.load_dataset_profile("sample.csv")["rows"] == 3
+
+
+def test_load_dataset_profile_without_sidecar(workdir, monkeypatch):
+    monkeypatch.setattr(utils, "DATASET_SIDECAR_ENABLED", False)
+    path = os.path.join("data", "datasets", "sample.csv")
+    pd.DataFrame({"x": [1, 2]}).to_csv(path, index=False)
+
+    assert utils.load_dataset_profile("sample")["rows"] == 2
+    assert read_profile(path)["rows"] == 2
+
+
+def test_load_dataset_profile_errors(workdir):
+    with pytest.raises(FileNotFoundError):
+        utils.load_dataset_profile("missing")
+    with pytest.raises(ValueError, match="Invalid dataset_id"):
+        utils.load_dataset_profile("../results/input")
@@ -0,0 +1,135 @@
+"""
+core.registry のテスト（索引ファイルの追記分のみの読み込み）
+"""
+import json
+import os
+import pickle
+
+import pytest
+
+from core import registry
+from core.cache import model_cache
+
+
+@pytest.fixture
+def index_path(workdir, monkeypatch):
+    """メモリ上の索引をリセットし、一時ディレクトリの索引ファイルのパスを返す"""
+    monkeypatch.setattr(registry, "_index", {})
+    monkeypatch.setattr(registry, "_index_path", None)
+    monkeypatch.setattr(registry, "_index_offset", 0)
+    return os.path.join("data", "results", registry.REGISTRY_FILENAME)
+
+
+def _entry(mlflow_id, **fields):
+    entry = {"mlflow_id": mlflow_id, "models": [], "registered_at": "2024-01-01T00:00:00"}
+    entry.update(fields)
+    return entry
+
+
+def _append(path, data):
+    """他プロセスによる追記"""
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def _line(entry):
+    return (json.dumps(entry) + "\n").encode("utf-8")
+
+
+def test_register_and_lookup(index_path):
+    entry = registry.register_models("m1", [{"index": 1, "target": "y1"}, {"index": 0, "target": "y0"}], run_id="r1")
+
+    assert registry.lookup_models("m1") == entry
+    assert [m["index"] for m in entry["models"]] == [0, 1]
+    assert registry._index_offset == os.path.getsize(index_path)
+
+
+def test_reads_only_appended_lines(index_path):
+    registry.register_models("m1", [])
+    offset = registry._index_offset
+
+    _append(index_path, _line(_entry("m2", run_id="other-process")))
+
+    assert registry.lookup_models("m2")["run_id"] == "other-process"
+    assert registry._index_offset == offset + len(_line(_entry("m2", run_id="other-process")))
+    assert registry.lookup_models("m1") is not None
+
+
+def test_partial_line_is_read_after_completion(index_path):
+    registry.register_models("m1", [])
+    line = _line(_entry("m2"))
+    offset = registry._index_offset
+
+    # 書き込み途中の行は読まず、オフセットも進めない
+    _append(index_path, line[:10])
+    assert "m2" not in [e["mlflow_id"] for e in registry.list_models()]
+    assert registry._index_offset == offset
+
+    _append(index_path, line[10:])
+    assert registry.lookup_models("m2") is not None
+    assert registry._index_offset == offset + len(line)
+
+
+def test_later_registration_wins(index_path):
+    registry.register_models("m1", [], run_id="first")
+    _append(index_path, _line(_entry("m1", run_id="second")))
+
+    assert registry.lookup_models("m1")["run_id"] == "second"
+
+
+def test_replaced_file_is_read_from_start(index_path):
+    registry.register_models("m1", [], run_id="long-run-id-" * 5)
+    registry.register_models("m2", [])
+
+    # 小さいファイルに置き換えられた場合は先頭から読み直す
+    with open(index_path, "wb") as f:
+        f.write(_line(_entry("m3")))
+
+    assert [e["mlflow_id"] for e in registry.list_models()] == ["m3"]
+    assert registry._index_offset == os.path.getsize(index_path)
+
+
+def test_skips_broken_lines(index_path):
+    registry.register_models("m1", [])
+    _append(index_path, b"{not json\n" + _line(_entry("m2")))
+
+    assert registry.lookup_models("m2") is not None
+    assert registry.lookup_models("m1") is not None
+
+
+def test_register_invalidates_loaded_models(index_path):
+    model_cache.put(("m1", 0), object(), 1)
+    model_cache.put(("m2", 0), object(), 1)
+
+    registry.register_models("m1", [])
+
+    assert model_cache.get(("m1", 0)) is None
+    assert model_cache.get(("m2", 0)) is not None
+    model_cache.invalidate()
+
+
+def test_load_models_reuses_cached_models(index_path, monkeypatch):
+    path = os.path.join("data", "results", "model.pkl")
+    with open(path, "wb") as f:
+        pickle.dump({"coef": 1.0}, f)
+    registry.register_models("m1", [{"index": 0, "target": "y", "local_path": path}])
+    model_cache.invalidate()
+
+    _, first = registry.load_models("m1")
+    loads = []
+    monkeypatch.setattr(registry, "load_model", lambda info: loads.append(info) or {"coef": 2.0})
+    _, second = registry.load_models("m1")
+
+    assert second[0] is first[0]
+    assert loads == []
+
+    assert registry.invalidate_models("m1") == 1
+    _, reloaded = registry.load_models("m1")
+    assert reloaded == [{"coef": 2.0}]
+    assert len(loads) == 1
+    model_cache.invalidate()
+
+
+def test_load_models_unknown_id(index_path):
+    with pytest.raises(ValueError, match="No model found"):
+        registry.load_models("missing")
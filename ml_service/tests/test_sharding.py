@@ -0,0 +1,82 @@
+"""
+core.sharding のテスト（プロセスプールでの分割予測）
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import registry, sharding
+
+
+@pytest.fixture
+def pool(registered_model, monkeypatch):
+    """2プロセスのワーカープールを使い、テスト後に停止する"""
+    monkeypatch.setattr(sharding, "PARALLEL_PREDICT_WORKERS", 2)
+    sharding.shutdown_pool()
+    submitted = []
+    get_pool = sharding._get_pool
+
+    class CountingPool:
+        def __init__(self, pool):
+            self.pool = pool
+
+        def submit(self, fn, *args):
+            submitted.append(args)
+            return self.pool.submit(fn, *args)
+
+    monkeypatch.setattr(sharding, "_get_pool", lambda: CountingPool(get_pool()))
+    yield submitted
+    sharding.shutdown_pool()
+
+
+def _input(x_list, n):
+    return pd.DataFrame(np.random.default_rng(2).random((n, len(x_list))), columns=x_list)
+
+
+def test_predict_sharded_matches_in_process_prediction(registered_model, pool):
+    mlflow_id, x_list, models = registered_model
+    df = _input(x_list, 101)
+
+    predictions = sharding.predict_sharded(mlflow_id, df)
+
+    assert len(predictions) == len(models)
+    for values, model in zip(predictions, models):
+        np.testing.assert_allclose(values, model.predict(df))
+    # シャードは目的変数の数によらず1回だけワーカーに送る
+    assert [len(args[2]) for args in pool] == [50, 51]
+
+
+def test_predict_sharded_skips_empty_shards(registered_model, pool):
+    mlflow_id, x_list, models = registered_model
+    df = _input(x_list, 1)
+
+    predictions = sharding.predict_sharded(mlflow_id, df)
+
+    assert len(pool) == 1
+    np.testing.assert_allclose(predictions[1], models[1].predict(df))
+
+
+def test_predict_sharded_unknown_model(registered_model, pool):
+    with pytest.raises(ValueError, match="No model found"):
+        sharding.predict_sharded("missing", _input(["a", "b"], 4))
+    assert pool == []
+
+
+def test_predict_shard_reloads_reregistered_models(registered_model, monkeypatch):
+    mlflow_id, x_list, models = registered_model
+    monkeypatch.setattr(sharding, "_worker_versions", {})
+    df = _input(x_list, 5)
+
+    first = sharding._predict_shard(mlflow_id, "v1", df)
+    np.testing.assert_allclose(first[0], models[0].predict(df))
+
+    # 同じ版ではワーカー内のキャッシュを使う
+    monkeypatch.setattr(registry, "load_model", lambda info: pytest.fail("model should be cached"))
+    sharding._predict_shard(mlflow_id, "v1", df)
+
+    reloaded = []
+    monkeypatch.setattr(registry, "load_model", lambda info: reloaded.append(info["index"]) or models[0])
+    second = sharding._predict_shard(mlflow_id, "v2", df)
+
+    assert reloaded == [0, 1]
+    np.testing.assert_allclose(second[1], models[0].predict(df))
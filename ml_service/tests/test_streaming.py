@@ -0,0 +1,136 @@
+"""
+core.streaming のテスト（NDJSON / Arrow IPCストリーム）
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from core import streaming
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("application/vnd.apache.arrow.stream", "arrow"),
+    ("application/x-ndjson", "ndjson"),
+    ("application/jsonl", "ndjson"),
+    ("application/json", "json"),
+    ("Application/X-NDJSON; q=1.0, application/json; q=0.5", "ndjson"),
+    ("text/html", "ndjson"),
+    (None, "ndjson"),
+])
+def test_negotiate_format(accept, expected):
+    assert streaming.negotiate_format(accept) == expected
+
+
+def test_negotiate_format_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(streaming, "pa", None)
+
+    assert streaming.negotiate_format("application/vnd.apache.arrow.stream", default="json") == "json"
+
+
+def _chunks():
+    return [
+        pd.DataFrame({"id": ["p1", "p2"], "x": [0.1, 1 / 3], "n": [1, 2]}),
+        pd.DataFrame({"id": ["p3"], "x": [np.nan], "n": [3]}),
+    ]
+
+
+def test_iter_ndjson_roundtrips_values():
+    body = b"".join(streaming.iter_ndjson(_chunks() + [pd.DataFrame({"id": [], "x": [], "n": []})]))
+
+    records = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+
+    assert records == [
+        {"id": "p1", "x": 0.1, "n": 1},
+        {"id": "p2", "x": 1 / 3, "n": 2},
+        {"id": "p3", "x": None, "n": 3},
+    ]
+
+
+def test_iter_ndjson_yields_one_block_per_chunk():
+    blocks = list(streaming.iter_ndjson(_chunks()))
+
+    assert [block.count(b"\n") for block in blocks] == [2, 1]
+    assert "鋼材" in b"".join(streaming.iter_ndjson([pd.DataFrame({"s": ["鋼材"]})])).decode("utf-8")
+
+
+def test_iter_arrow_stream_unifies_chunk_types():
+    chunks = _chunks()
+    # 2チャンク目のみ全欠損（object型）のカラム
+    chunks[0]["note"] = ["a", "b"]
+    chunks[1]["note"] = [None]
+
+    body = b"".join(streaming.iter_arrow_stream(chunks))
+    table = pa.ipc.open_stream(body).read_all()
+
+    assert table.schema.field("x").type == pa.float64()
+    assert table.schema.field("n").type == pa.float64()
+    assert table.schema.field("note").type == pa.string()
+    assert table.column("id").to_pylist() == ["p1", "p2", "p3"]
+    assert table.column("note").to_pylist() == ["a", "b", None]
+    assert table.column("x").to_pylist()[:2] == [0.1, 1 / 3]
+
+
+def test_iter_arrow_stream_writes_batches_as_they_arrive():
+    blocks = list(streaming.iter_arrow_stream(_chunks()))
+
+    # スキーマ+1チャンク目、2チャンク目、終端
+    assert len(blocks) == 3
+    assert all(blocks)
+    assert list(streaming.iter_arrow_stream([])) == []
+
+
+def _ipc(df, file_format=False, compression=None):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    new = pa.ipc.new_file if file_format else pa.ipc.new_stream
+    with new(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({"a": np.linspace(0, 1, 8), "b": np.arange(8), "id": [f"p{i}" for i in range(8)]})
+
+
+@pytest.mark.parametrize("file_format", [False, True])
+@pytest.mark.parametrize("compression", [None, "zstd", "lz4"])
+def test_read_arrow_frame_formats(frame, file_format, compression):
+    body = _ipc(frame, file_format=file_format, compression=compression)
+
+    pd.testing.assert_frame_equal(streaming.read_arrow_frame(body), frame)
+
+
+@pytest.mark.parametrize("content_encoding", ["gzip", "x-gzip", "zstd", "bz2", "identity", " GZIP "])
+def test_read_arrow_frame_content_encoding(frame, content_encoding):
+    body = _ipc(frame)
+    codec = content_encoding.strip().lower()
+    if codec != "identity":
+        sink = pa.BufferOutputStream()
+        with pa.CompressedOutputStream(sink, {"x-gzip": "gzip"}.get(codec, codec)) as stream:
+            stream.write(body)
+        body = sink.getvalue().to_pybytes()
+
+    pd.testing.assert_frame_equal(streaming.read_arrow_frame(body, content_encoding), frame)
+
+
+def test_read_arrow_frame_does_not_copy_numeric_columns(frame):
+    body = _ipc(frame)
+
+    df = streaming.read_arrow_frame(body)
+
+    assert np.shares_memory(df["a"].to_numpy(), np.frombuffer(body, dtype=np.uint8))
+
+
+@pytest.mark.parametrize("body, content_encoding, message", [
+    (b"not arrow", None, "Invalid Arrow IPC body"),
+    (b"ARROW1 truncated", None, "Invalid Arrow IPC body"),
+    (b"", "br", "Unsupported Content-Encoding"),
+])
+def test_read_arrow_frame_rejects_invalid_body(body, content_encoding, message):
+    with pytest.raises(ValueError, match=message):
+        streaming.read_arrow_frame(body, content_encoding)
@@ -0,0 +1,516 @@
+"""
+core.utils のテスト（データセットの読み込み）
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import utils
+from core.cache import dataframe_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_dataframe_cache():
+    dataframe_cache.invalidate()
+    yield
+    dataframe_cache.invalidate()
+
+
+@pytest.fixture(params=["pandas", "auto"])
+def csv_engine(request, monkeypatch):
+    """pandas・pyarrowの両方のCSVパースエンジンで実行する"""
+    monkeypatch.setattr(utils, "CSV_ENGINE", request.param)
+    return request.param
+
+
+@pytest.fixture
+def result_csv(workdir):
+    """データセットディレクトリ外（サイドカーを作らない）のCSV"""
+    path = os.path.join("data", "results", "input.csv")
+    pd.DataFrame({
+        "id": ["p1", "p2", "p3"],
+        "x1": [1, 2, 3],
+        "x2": [0.5, 1.5, 2.5],
+        "note": ["a", "b", "c"],
+    }).to_csv(path, index=False)
+    return path
+
+
+def test_load_projects_columns_in_file_order(result_csv, csv_engine):
+    df = utils.load_dataframe(result_csv, columns=["x2", "x1", "not_in_file"])
+
+    # ファイルにないカラムは無視し、存在チェックは呼び出し側で行う
+    assert df.columns.tolist() == ["x1", "x2"]
+    assert df["x1"].tolist() == [1, 2, 3]
+
+
+def test_load_applies_dtype(result_csv, csv_engine):
+    df = utils.load_dataframe(result_csv, columns=["x1", "x2"], dtype={"x1": "float64", "x2": "float64"})
+
+    assert df.dtypes.tolist() == [np.float64, np.float64]
+
+
+def test_load_falls_back_to_inference_on_text_values(workdir, csv_engine):
+    path = os.path.join("data", "results", "mixed.csv")
+    with open(path, "w") as f:
+        f.write("x1,x2\n1,0.5\nn/a-text,1.5\n")
+
+    df = utils.load_dataframe(path, columns=["x1", "x2"], dtype={"x1": "float64", "x2": "float64"})
+
+    # 数値に変換できない値はcoerce_numeric_columnsで変換するため、型推論で読み直した値を返す
+    assert df["x1"].tolist() == ["1", "n/a-text"]
+    assert df["x2"].tolist() == [0.5, 1.5]
+
+
+def test_load_without_columns_reads_all(result_csv, csv_engine):
+    df = utils.load_dataframe(result_csv)
+
+    assert df.columns.tolist() == ["id", "x1", "x2", "note"]
+
+
+class FakeDetector:
+    """chardetの代わりに固定の判定結果を返す検出器"""
+
+    encoding = None
+    fed = 0
+
+    def __init__(self):
+        self.done = False
+        self.result = {}
+
+    def feed(self, chunk):
+        FakeDetector.fed += len(chunk)
+
+    def close(self):
+        self.result = {"encoding": FakeDetector.encoding}
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    """chardetを呼んだかどうかと、渡したバイト数を記録する"""
+    FakeDetector.encoding = None
+    FakeDetector.fed = 0
+    monkeypatch.setattr(utils, "UniversalDetector", FakeDetector)
+    return FakeDetector
+
+
+def _write_bytes(workdir, data, name="enc.csv"):
+    path = os.path.join("data", "results", name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+@pytest.mark.parametrize("data, expected", [
+    ("x,名前\n1,あ\n".encode("utf-8-sig"), "utf-8-sig"),
+    ("x,名前\n1,あ\n".encode("utf-16"), "utf-16"),
+])
+def test_detects_bom(workdir, detector, data, expected):
+    assert utils.detect_file_encoding(_write_bytes(workdir, data)) == expected
+    assert detector.fed == 0
+
+
+@pytest.mark.parametrize("text, encoding", [
+    ("x,名前\n1,鋼材\n", "utf-8"),
+    ("x,名前\n1,鋼材\n", "cp932"),
+    ("x,y\n1,2\n", "utf-8"),
+])
+def test_strict_prefix_check_skips_chardet(workdir, detector, text, encoding):
+    path = _write_bytes(workdir, text.encode(encoding))
+
+    assert utils.detect_file_encoding(path) == encoding
+    assert detector.fed == 0
+
+
+def test_multibyte_char_across_read_chunks_is_utf8(workdir, detector):
+    # 逐次デコードの区切り（_DETECTION_CHUNK_BYTES）をまたぐマルチバイト文字
+    prefix = b"a" * (utils._DETECTION_CHUNK_BYTES - 1)
+    path = _write_bytes(workdir, prefix + "鋼材\n".encode("utf-8"))
+
+    assert utils.detect_file_encoding(path) == "utf-8"
+
+
+def test_sample_ending_mid_character_is_not_rejected(workdir, detector):
+    data = "鋼材".encode("utf-8") * 100
+    path = _write_bytes(workdir, data)
+
+    # 判定範囲の末尾で途切れた文字は、ファイル末尾でなければエラーにしない
+    assert utils.detect_file_encoding(path, sample_size=len(data) - 1) == "utf-8"
+
+
+def test_only_prefix_is_checked(workdir, detector):
+    data = b"x,y\n" * 1000 + "1,鋼材\n".encode("cp932")
+    path = _write_bytes(workdir, data)
+
+    assert utils.detect_file_encoding(path, sample_size=1024) == "utf-8"
+    assert utils.detect_file_encoding(path, sample_size=None) == "cp932"
+
+
+@pytest.mark.parametrize("detected, expected", [
+    ("ascii", "utf-8"),
+    ("Windows-1252", "cp932"),
+    ("MacRoman", "cp932"),
+    ("ISO-8859-1", "ISO-8859-1"),
+])
+def test_falls_back_to_chardet(workdir, detector, detected, expected):
+    # utf-8・cp932のどちらとしても不正なバイト列（0xFFはcp932で未定義）
+    data = b"x,name\n1,caf\xe9\xff\n" * 10
+    path = _write_bytes(workdir, data)
+    detector.encoding = detected
+
+    assert utils.detect_file_encoding(path, sample_size=64) == expected
+    # 判定範囲のみをchardetに渡す
+    assert detector.fed == 64
+
+
+def test_encoding_detection_from_bytes(detector):
+    assert utils.encoding_detection("名前\n".encode("cp932")) == "cp932"
+
+
+@pytest.fixture
+def dataset(workdir, monkeypatch):
+    """データセットディレクトリ配下のCSVを作成し、変換失敗の記録をリセット"""
+    monkeypatch.setattr(utils, "_sidecar_failures", {})
+    path = os.path.join("data", "datasets", "sample.csv")
+    pd.DataFrame({
+        "x": np.arange(20, dtype=np.int64),
+        "y": np.linspace(0, 1, 20),
+        "label": [f"r{i}" for i in range(20)],
+    }).to_csv(path, index=False)
+    return path
+
+
+def _load_uncached(path, columns=None, dtype=None):
+    dataframe_cache.invalidate()
+    return utils.load_dataframe(path, columns=columns, dtype=dtype)
+
+
+def _touch(path):
+    """内容を変えずに更新時刻のみ進める"""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_first_load_writes_sidecar(dataset):
+    df = _load_uncached(dataset)
+
+    assert os.path.exists(utils._sidecar_path(dataset))
+    assert df.columns.tolist() == ["x", "y", "label"]
+    assert df.attrs["load_engine"] != "sidecar"
+
+
+def test_second_load_reads_sidecar_columns(dataset):
+    expected = pd.read_csv(dataset)
+    _load_uncached(dataset)
+
+    df = _load_uncached(dataset, columns=["y", "x"])
+
+    assert df.attrs["load_engine"] == "sidecar"
+    assert df.columns.tolist() == ["x", "y"]
+    pd.testing.assert_frame_equal(df, expected[["x", "y"]], check_dtype=False)
+
+
+def test_stale_sidecar_is_rebuilt(dataset):
+    _load_uncached(dataset)
+    pd.DataFrame({"x": [1, 2], "y": [0.5, 0.25], "label": ["a", "b"]}).to_csv(dataset, index=False)
+    _touch(dataset)
+
+    df = _load_uncached(dataset)
+
+    assert df.attrs["load_engine"] != "sidecar"
+    assert df["x"].tolist() == [1, 2]
+    assert _load_uncached(dataset).attrs["load_engine"] == "sidecar"
+
+
+def test_mixed_type_column_is_stored_as_text(dataset):
+    pd.DataFrame({"x": [1, 2, 3], "mixed": ["1", "a", "2"]}).to_csv(dataset, index=False)
+    _touch(dataset)
+    # 数値と文字列が混在するobject型のカラム（cp932のCSVをpandasで読んだ場合など）
+    df = pd.DataFrame({"x": [1, 2, 3], "mixed": [1, "a", 2]})
+
+    assert utils._write_sidecar(df, dataset, "utf-8", os.stat(dataset))
+
+    loaded = _load_uncached(dataset)
+    assert loaded.attrs["load_engine"] == "sidecar"
+    assert loaded["mixed"].tolist() == ["1", "a", "2"]
+
+
+def test_failed_sidecar_keeps_column_projection(dataset, monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError("read-only file system")
+
+    monkeypatch.setattr(utils.feather, "write_feather", fail)
+    calls = []
+    load_csv = utils._load_csv
+
+    def spy(file_path, columns, dtype):
+        calls.append(columns)
+        return load_csv(file_path, columns, dtype)
+
+    monkeypatch.setattr(utils, "_load_csv", spy)
+
+    df = _load_uncached(dataset, columns=["x"])
+    assert df.columns.tolist() == ["x"]
+    assert calls == [None]
+    assert not os.path.exists(utils._sidecar_path(dataset))
+    assert not [name for name in os.listdir(os.path.dirname(dataset)) if name.endswith(".tmp")]
+    stat = os.stat(dataset)
+    assert utils._sidecar_failures[os.path.realpath(dataset)] == (stat.st_size, stat.st_mtime_ns)
+
+    # 同じ版のCSVでは全カラムを読み直さず、要求されたカラムのみ読み込む
+    df = _load_uncached(dataset, columns=["x"])
+    assert df["x"].tolist() == list(range(20))
+    assert calls == [None, ["x"]]
+
+    # CSVが更新された場合は変換を再試行する
+    _touch(dataset)
+    _load_uncached(dataset, columns=["x"])
+    assert calls == [None, ["x"], None]
+
+
+def test_concurrent_writes_in_one_process_do_not_collide(dataset, monkeypatch):
+    df = pd.read_csv(dataset)
+    stat = os.stat(dataset)
+    barrier = threading.Barrier(4)
+    write_feather = utils.feather.write_feather
+
+    def synchronized_write(*args, **kwargs):
+        # 全スレッドが一時ファイルに書き込んでから置き換える
+        write_feather(*args, **kwargs)
+        barrier.wait(timeout=10)
+
+    monkeypatch.setattr(utils.feather, "write_feather", synchronized_write)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(utils._write_sidecar(df, dataset, "utf-8", stat)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert results == [True] * 4
+    assert utils._sidecar_failures == {}
+    assert _load_uncached(dataset).attrs["load_engine"] == "sidecar"
+
+
+def test_sidecar_disabled_outside_dataset_dir(result_csv):
+    utils.load_dataframe(result_csv)
+
+    assert not os.path.exists(utils._sidecar_path(result_csv))
+
+
+@pytest.fixture
+def pyarrow_engine(monkeypatch):
+    if utils.pa is None:
+        pytest.skip("pyarrow is not installed")
+    monkeypatch.setattr(utils, "CSV_ENGINE", "auto")
+
+
+def _write_text(name, text, encoding="utf-8"):
+    path = os.path.join("data", "results", name)
+    with open(path, "w", encoding=encoding, newline="") as f:
+        f.write(text)
+    return path
+
+
+@pytest.mark.parametrize("columns, dtype", [
+    (None, None),
+    (["x", "y", "name"], None),
+    (["x", "y"], {"x": "float64", "y": "float64"}),
+])
+def test_pyarrow_matches_pandas(workdir, pyarrow_engine, columns, dtype):
+    path = _write_text("parity.csv", (
+        "x,y,name,flag,when\n"
+        "1,0.5,鋼材,true,2024-01-02\n"
+        "2,,アルミ,false,2024-01-03\n"
+        "3,1.25,,true,2024-01-04\n"
+    ))
+
+    df, _ = utils._load_csv(path, columns, dtype)
+    expected = pd.read_csv(path, usecols=columns, dtype=dtype)
+
+    assert df.attrs["load_engine"] == "pyarrow"
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+    assert df.dtypes.map(lambda t: t.kind).tolist() == expected.dtypes.map(lambda t: t.kind).tolist()
+
+
+def test_pyarrow_falls_back_to_pandas_on_arrow_invalid(workdir, pyarrow_engine):
+    path = _write_text("dup.csv", "x,x,y\n1,2,3\n4,5,6\n")
+
+    df, _ = utils._load_csv(path, None, None)
+
+    # 重複カラム名はpandasと同じく連番を付与した名前で読み込む
+    assert df.attrs["load_engine"] == "pandas"
+    assert df.columns.tolist() == ["x", "x.1", "y"]
+
+
+def test_pyarrow_error_falls_back_to_pandas(workdir, pyarrow_engine, monkeypatch):
+    path = _write_text("plain.csv", "x,y\n1,2\n")
+
+    def fail(*args, **kwargs):
+        raise utils.pa.ArrowInvalid("CSV parse error")
+
+    monkeypatch.setattr(utils.pa_csv, "read_csv", fail)
+    df, _ = utils._load_csv(path, None, None)
+
+    assert df.attrs["load_engine"] == "pandas"
+    assert df["y"].tolist() == [2]
+
+
+def test_pyarrow_keeps_temporal_columns_as_written(workdir, pyarrow_engine):
+    path = _write_text("temporal.csv", (
+        "x,day,time,stamp\n"
+        "1,2024-01-02,11:30:00,2024-01-02T11:30:00\n"
+        "2,2024-01-03,12:00:00,2024-01-03T08:15:00\n"
+    ))
+
+    df, _ = utils._load_csv(path, None, None)
+
+    assert df.attrs["load_engine"] == "pyarrow"
+    assert df["day"].tolist() == ["2024-01-02", "2024-01-03"]
+    assert df["time"].tolist() == ["11:30:00", "12:00:00"]
+    assert df["stamp"].tolist() == ["2024-01-02T11:30:00", "2024-01-03T08:15:00"]
+    assert df["x"].tolist() == [1, 2]
+
+
+def test_pyarrow_is_not_used_for_cp932(workdir, pyarrow_engine):
+    path = _write_text("sjis.csv", "x,名前\n1,鋼材\n", encoding="cp932")
+
+    df, encoding = utils._load_csv(path, None, None)
+
+    assert encoding == "cp932"
+    assert df.attrs["load_engine"] == "pandas"
+    assert df["名前"].tolist() == ["鋼材"]
+
+
+def test_coerce_returns_clean_numeric_columns_without_copy():
+    x = np.arange(5, dtype=np.float64)
+    n = np.arange(5, dtype=np.int64)
+    df = pd.DataFrame({"x": x, "n": n, "label": list("abcde")}, copy=False)
+
+    result, report = utils.coerce_numeric_columns(df, ["n", "x"])
+
+    assert result.columns.tolist() == ["n", "x"]
+    assert np.shares_memory(result["x"].to_numpy(), x)
+    assert np.shares_memory(result["n"].to_numpy(), n)
+    assert report["x"] == {"source_dtype": "float64", "dtype": "float64", "filled": 0, "coerced": 0}
+
+
+def test_coerce_keeps_sidecar_views(dataset):
+    _load_uncached(dataset)
+    df = _load_uncached(dataset, columns=["x", "y"])
+    assert df.attrs["load_engine"] == "sidecar"
+
+    result, _ = utils.coerce_numeric_columns(df, ["x", "y"])
+
+    for col in ("x", "y"):
+        values = result[col].to_numpy()
+        assert not values.flags.writeable
+        assert np.shares_memory(values, df[col].to_numpy())
+
+
+def test_coerce_fills_and_converts_only_affected_columns():
+    clean = np.linspace(0, 1, 4)
+    df = pd.DataFrame({
+        "clean": clean,
+        "gaps": [1.5, np.nan, 2.5, np.nan],
+        "text": ["1", "x", None, "4"],
+        "nullable": pd.array([1, None, 3, 4], dtype="Int64"),
+    }, copy=False)
+    before = df.copy()
+
+    result, report = utils.coerce_numeric_columns(df, df.columns, fill_value=-1)
+
+    assert np.shares_memory(result["clean"].to_numpy(), clean)
+    assert result["gaps"].tolist() == [1.5, -1, 2.5, -1]
+    assert result["text"].tolist() == [1, -1, -1, 4]
+    assert result["nullable"].tolist() == [1, -1, 3, 4]
+    # 学習・予測に渡す精度を保つため、補完したカラムはfloat64にする
+    assert result.dtypes.tolist() == [np.float64] * 4
+    assert report["gaps"]["filled"] == 2
+    assert report["text"] == {"source_dtype": "object", "dtype": "float64", "filled": 2, "coerced": 1}
+    # 元のDataFrameは変更しない
+    pd.testing.assert_frame_equal(df, before)
+
+
+def test_coerce_does_not_downcast_by_default():
+    df = pd.DataFrame({"small": [1.0, 2.0], "half": [0.5, 0.25], "n": np.array([1, 2], dtype=np.int64)})
+
+    result, _ = utils.coerce_numeric_columns(df, df.columns)
+
+    assert result.dtypes.tolist() == [np.float64, np.float64, np.int64]
+
+
+def test_coerce_downcasts_to_narrowest_safe_dtype():
+    df = pd.DataFrame({
+        "int8": [1.0, -2.0, np.nan],
+        "int32": [70000, 1, 2],
+        "float32": [0.5, 0.25, 1.0],
+        "float64": [0.1, 0.2, 0.3],
+        "huge": [2.0 ** 60, 1.0, 2.0],
+        "flag": [True, False, True],
+    })
+
+    result, report = utils.coerce_numeric_columns(df, df.columns, downcast=True)
+
+    assert [report[col]["dtype"] for col in df.columns] == [
+        "int8", "int32", "float32", "float64", "float32", "bool"
+    ]
+    assert result["int8"].tolist() == [1, -2, 0]
+    assert result["float64"].tolist() == [0.1, 0.2, 0.3]
+
+
+def test_coerce_rejects_missing_columns():
+    df = pd.DataFrame({"x": [1, 2]})
+
+    with pytest.raises(ValueError, match=r"Missing columns: \['y'\]"):
+        utils.coerce_numeric_columns(df, ["x", "y"])
+
+
+def test_chunks_keep_first_chunk_dtypes(workdir):
+    path = os.path.join("data", "results", "chunks.csv")
+    with open(path, "w") as f:
+        f.write("i,f,s\n1,1.5,a\n2,2.0,05\n3,3,07\n,4,08\n5,,09\n")
+
+    chunks = list(utils.iter_dataframe_chunks(path, chunk_rows=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert all(chunk["f"].dtype == np.float64 for chunk in chunks)
+    assert all(chunk["i"].dtype.kind == "i" for chunk in chunks)
+    assert pd.concat(chunks)["s"].tolist() == ["a", "05", "07", "08", "09"]
+
+
+def _write_late_cp932(name, n=3000):
+    """先頭の判定範囲にはASCII文字しか含まれないcp932のCSV"""
+    path = os.path.join("data", "results", name)
+    pd.DataFrame({
+        "x": np.arange(n),
+        "s": ["abc"] * (n - 10) + ["日本語テキスト"] * 10,
+    }).to_csv(path, index=False, encoding="cp932")
+    return path
+
+
+def test_chunks_redetect_encoding_after_first_sample(workdir, monkeypatch):
+    path = _write_late_cp932("late_cp932.csv")
+    monkeypatch.setattr(utils.detect_file_encoding, "__defaults__", (2000,))
+
+    df = pd.concat(utils.iter_dataframe_chunks(path, chunk_rows=500))
+
+    assert len(df) == 3000
+    assert df.index.is_unique
+    assert df["x"].tolist() == list(range(3000))
+    assert df["s"].iloc[-1] == "日本語テキスト"
+
+
+def test_load_redetects_encoding_over_whole_file(workdir, monkeypatch, csv_engine):
+    path = _write_late_cp932("late_cp932_full.csv")
+    monkeypatch.setattr(utils.detect_file_encoding, "__defaults__", (2000,))
+
+    df = utils.load_dataframe(path, columns=["s"])
+
+    assert df["s"].iloc[-1] == "日本語テキスト"
@@ -0,0 +1,114 @@
+"""
+core.warmup のテスト（起動時のモデル事前ロードと /ready）
+"""
+import threading
+
+import pytest
+
+import app as app_module
+from core import sharding, warmup
+from core.cache import model_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """準備状態を起動直後に戻す"""
+    monkeypatch.setattr(warmup, "_state", {
+        "status": "pending", "started_at": None, "finished_at": None, "models": []
+    })
+    monkeypatch.setattr(warmup, "_thread", None)
+
+
+@pytest.fixture
+def blocked_warmup(monkeypatch):
+    """イベントがセットされるまで完了しないウォームアップ"""
+    release = threading.Event()
+    calls = []
+    run = warmup.warmup_models
+
+    def slow_warmup():
+        calls.append(threading.current_thread())
+        release.wait(timeout=30)
+        return run(mlflow_ids=[])
+
+    monkeypatch.setattr(warmup, "warmup_models", slow_warmup)
+    yield release, calls
+    release.set()
+
+
+def test_start_warmup_runs_once(blocked_warmup):
+    release, calls = blocked_warmup
+
+    thread = warmup.start_warmup()
+    assert warmup.start_warmup() is thread
+    release.set()
+    thread.join(timeout=30)
+
+    assert len(calls) == 1
+    assert warmup.start_warmup() is thread
+    assert warmup.is_ready()
+
+
+def test_first_request_starts_warmup_and_ready_waits_for_it(workdir, blocked_warmup):
+    release, calls = blocked_warmup
+    client = app_module.app.test_client()
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json["status"] in ("pending", "warming")
+    assert len(calls) == 1
+
+    release.set()
+    warmup.start_warmup().join(timeout=30)
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json["status"] == "ready"
+    assert client.get("/health").json["ready"] is True
+    assert len(calls) == 1
+
+
+def test_warmup_models_records_each_model(registered_model):
+    mlflow_id, _, _ = registered_model
+
+    readiness = warmup.warmup_models([mlflow_id, "missing"])
+
+    assert readiness["status"] == "ready"
+    ok, failed = readiness["models"]
+    assert ok["status"] == "ok"
+    assert ok["load_ms"] >= 0 and ok["predict_ms"] >= 0
+    assert failed["status"] == "failed"
+    assert "No model found" in failed["error"]
+    assert model_cache.get((mlflow_id, 0)) is not None
+
+
+def test_select_warmup_models(registered_model, monkeypatch):
+    mlflow_id, _, _ = registered_model
+    monkeypatch.setattr(warmup, "WARMUP_MODEL_IDS", ["pinned", mlflow_id])
+
+    assert warmup.select_warmup_models() == ["pinned", mlflow_id]
+
+    monkeypatch.setattr(warmup, "WARMUP_RECENT_MODELS", 0)
+    monkeypatch.setattr(warmup, "WARMUP_MODEL_IDS", [])
+    assert warmup.select_warmup_models() == []
+
+
+def test_warmup_loads_models_in_every_worker(registered_model, monkeypatch):
+    mlflow_id, _, _ = registered_model
+    monkeypatch.setattr(warmup, "WARMUP_WORKER_POOL", True)
+    monkeypatch.setattr(warmup, "PARALLEL_PREDICT_WORKERS", 2)
+    monkeypatch.setattr(sharding, "PARALLEL_PREDICT_WORKERS", 2)
+    sharding.shutdown_pool()
+    pids = []
+    warm_workers = sharding.warm_workers
+    monkeypatch.setattr(warmup, "warm_workers", lambda *args: pids.extend(warm_workers(*args)))
+
+    try:
+        readiness = warmup.warmup_models([mlflow_id])
+    finally:
+        sharding.shutdown_pool()
+
+    assert readiness["models"][0]["status"] == "ok"
+    assert "worker_pool_ms" in readiness["models"][0]
+    # 全ワーカーが1タスクずつ処理してモデルをロードする
+    assert len(set(pids)) == 2